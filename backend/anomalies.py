@@ -0,0 +1,315 @@
+"""
+Streaming anomaly detection on cost ingestion
+
+Each (service, project) keeps an exponentially weighted mean and variance
+of its daily totals in `anomaly_states`. Ingested rows are added to the
+running total of their day; when a later day arrives the finished day is
+folded into the statistics, so every update is O(1) per series and no
+history is rescanned. While a day accumulates it is checked against:
+
+- the per-series daily limit (`AlertThreshold.series_daily_amount`, if set)
+- its running average: a spike is a day more than ANOMALY_SPIKE_Z
+  standard deviations above the EWMA once ANOMALY_MIN_DAYS are known
+
+Each day written to is also checked against the account-wide threshold
+(`AlertThreshold.amount`): its total across every series is read from the
+rollup, and a breach is kept as a `daily_total` alert without a service or
+project.
+
+Breaches are kept in `cost_alerts` and cleared again if a correction
+brings the day back under the limit. Rows for days before the series'
+current day replay the series from the rollup and re-evaluate every day
+from the earliest one changed, so the outcome does not depend on the
+order rows arrive in.
+"""
+import os
+from datetime import date, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import models
+from .rollup import _get
+
+ANOMALY_DETECTION = os.environ.get("ANOMALY_DETECTION", "true").lower() in ("1", "true", "yes")
+EWMA_ALPHA = float(os.environ.get("ANOMALY_EWMA_ALPHA", 0.2))
+SPIKE_Z = float(os.environ.get("ANOMALY_SPIKE_Z", 3))
+MIN_DAYS = int(os.environ.get("ANOMALY_MIN_DAYS", 7))
+ACTIVE_ALERT_DAYS = int(os.environ.get("ACTIVE_ALERT_DAYS", 7))
+# Days of rollup history the statistics are built from
+HISTORY_DAYS = 60
+# Kind of the alerts for days whose account-wide total breached `amount`
+DAILY_TOTAL_KIND = "daily_total"
+
+
+def close_day(state):
+    """
+    Fold the finished day's total into the EWMA mean and variance
+    """
+    total = state.day_total or 0
+    if not state.days:
+        state.mean = total
+        state.variance = 0.0
+    else:
+        diff = total - state.mean
+        increment = EWMA_ALPHA * diff
+        state.mean += increment
+        state.variance = (1 - EWMA_ALPHA) * (state.variance + diff * increment)
+    state.days = (state.days or 0) + 1
+    state.day_total = 0.0
+
+
+def evaluate(state, threshold):
+    """
+    Return {kind: (expected, score)} for the breaches of the state's current day
+    """
+    breaches = {}
+    total = state.day_total or 0
+    if threshold and total > threshold:
+        breaches["threshold"] = (threshold, None)
+    if (state.days or 0) >= MIN_DAYS:
+        std = state.variance ** 0.5
+        if std > 0 and total > state.mean + SPIKE_Z * std:
+            breaches["spike"] = (state.mean, (total - state.mean) / std)
+    return breaches
+
+
+def observe_entries(db: Session, entries):
+    """
+    Update the running statistics and alerts with newly written cost
+    entries (dicts or objects; cost may be a correction delta). The caller
+    commits, so detection is part of the ingest transaction.
+    """
+    if not ANOMALY_DETECTION:
+        return
+
+    daily = {}
+    for entry in entries:
+        key = (_get(entry, "service"), _get(entry, "project"))
+        days = daily.setdefault(key, {})
+        entry_date = _get(entry, "date")
+        days[entry_date] = days.get(entry_date, 0) + (_get(entry, "cost") or 0)
+    if not daily:
+        return
+
+    amount, threshold = db.query(
+        models.AlertThreshold.amount, models.AlertThreshold.series_daily_amount
+    ).first() or (None, None)
+    services = {service for service, _ in daily}
+    projects = {project for _, project in daily}
+    states = {
+        (state.service, state.project): state
+        for state in db.query(models.AnomalyState).filter(
+            models.AnomalyState.service.in_(services),
+            models.AnomalyState.project.in_(projects)
+        )
+        if (state.service, state.project) in daily
+    }
+
+    # {(service, project, date): {kind: (amount, expected, score)}} for evaluated days
+    evaluated = {}
+    replays = {}
+    for (service, project), days in daily.items():
+        state = states.get((service, project))
+        if state is not None and min(days) < state.last_date:
+            # A past day changed: the rollup already holds it, replay from there
+            replays[(service, project)] = (state, min(days))
+            continue
+        if state is None:
+            state = models.AnomalyState(
+                service=service, project=project, last_date=min(days),
+                day_total=0.0, mean=0.0, variance=0.0, days=0
+            )
+            db.add(state)
+
+        for entry_date in sorted(days):
+            if entry_date < state.last_date:
+                continue
+            if entry_date > state.last_date:
+                close_day(state)
+                state.last_date = entry_date
+            state.day_total = (state.day_total or 0) + days[entry_date]
+            evaluated[(service, project, entry_date)] = _breaches(state, threshold)
+
+    if replays:
+        evaluated.update(_replay_series(db, replays, threshold))
+    _store_alerts(db, evaluated)
+    _check_daily_totals(db, {entry_date for days in daily.values() for entry_date in days}, amount)
+
+
+def _breaches(state, threshold):
+    return {
+        kind: (state.day_total, expected, score)
+        for kind, (expected, score) in evaluate(state, threshold).items()
+    }
+
+
+def _daily_totals(db: Session, since, services=None, projects=None):
+    """
+    Rollup totals per (service, project, date) from `since`, ordered by series and date
+    """
+    query = db.query(
+        models.CostRollup.service,
+        models.CostRollup.project,
+        models.CostRollup.date,
+        func.sum(models.CostRollup.cost)
+    ).filter(models.CostRollup.date >= since)
+    if services is not None:
+        query = query.filter(models.CostRollup.service.in_(services), models.CostRollup.project.in_(projects))
+    return query.group_by(
+        models.CostRollup.service,
+        models.CostRollup.project,
+        models.CostRollup.date
+    ).order_by(
+        models.CostRollup.service,
+        models.CostRollup.project,
+        models.CostRollup.date
+    ).all()
+
+
+def _replay_series(db: Session, replays, threshold):
+    """
+    Rebuild the statistics of each series in `replays` ({(service, project):
+    (state, earliest changed date)}) from the rollup, evaluating every day
+    from the earliest changed one. Returns the evaluated days.
+    """
+    starts = {
+        key: min(earliest, state.last_date - timedelta(days=HISTORY_DAYS))
+        for key, (state, earliest) in replays.items()
+    }
+    rows = _daily_totals(
+        db, min(starts.values()), {service for service, _ in replays}, {project for _, project in replays}
+    )
+
+    for state, earliest in replays.values():
+        state.last_date = None
+        state.day_total = 0.0
+        state.mean = 0.0
+        state.variance = 0.0
+        state.days = 0
+
+    evaluated = {}
+    for service, project, entry_date, total in rows:
+        key = (service, project)
+        if key not in replays or entry_date < starts[key]:
+            continue
+        state, earliest = replays[key]
+        if state.last_date is None:
+            state.last_date = entry_date
+        elif entry_date > state.last_date:
+            close_day(state)
+            state.last_date = entry_date
+        state.day_total += total or 0
+        if entry_date >= earliest:
+            evaluated[(service, project, entry_date)] = _breaches(state, threshold)
+
+    for state, earliest in replays.values():
+        if state.last_date is None:
+            state.last_date = earliest
+    return evaluated
+
+
+def _store_alerts(db: Session, evaluated):
+    """
+    Insert or refresh alerts for breached days and clear those that no
+    longer breach
+    """
+    existing = {
+        (alert.service, alert.project, alert.date, alert.kind): alert
+        for alert in db.query(models.CostAlert).filter(
+            models.CostAlert.date.in_({entry_date for _, _, entry_date in evaluated}),
+            models.CostAlert.service.in_({service for service, _, _ in evaluated})
+        )
+    }
+
+    for (service, project, entry_date), breaches in evaluated.items():
+        for kind in ("threshold", "spike"):
+            alert = existing.get((service, project, entry_date, kind))
+            if kind not in breaches:
+                if alert is not None:
+                    db.delete(alert)
+                continue
+            amount, expected, score = breaches[kind]
+            if alert is None:
+                db.add(models.CostAlert(
+                    service=service, project=project, date=entry_date, kind=kind,
+                    amount=amount, expected=expected, score=score
+                ))
+            else:
+                alert.amount = amount
+                alert.expected = expected
+                alert.score = score
+
+
+def _check_daily_totals(db: Session, dates, amount):
+    """
+    Raise or clear the account-wide alert of each of `dates` from its total
+    across every series in the rollup, which the caller has already updated
+    """
+    totals = dict(db.query(
+        models.CostRollup.date, func.sum(models.CostRollup.cost)
+    ).filter(models.CostRollup.date.in_(dates)).group_by(models.CostRollup.date))
+    existing = {
+        alert.date: alert
+        for alert in db.query(models.CostAlert).filter(
+            models.CostAlert.kind == DAILY_TOTAL_KIND,
+            models.CostAlert.date.in_(dates)
+        )
+    }
+
+    for entry_date in dates:
+        total = totals.get(entry_date) or 0
+        alert = existing.get(entry_date)
+        if not amount or total <= amount:
+            if alert is not None:
+                db.delete(alert)
+        elif alert is None:
+            db.add(models.CostAlert(
+                service=None, project=None, date=entry_date, kind=DAILY_TOTAL_KIND,
+                amount=total, expected=amount
+            ))
+        else:
+            alert.amount = total
+            alert.expected = amount
+
+
+def active_alerts(db: Session, days=ACTIVE_ALERT_DAYS, today=None):
+    """
+    Alerts for the last `days` days, newest and largest first
+    """
+    since = (today or date.today()) - timedelta(days=days - 1)
+    return db.query(models.CostAlert).filter(
+        models.CostAlert.date >= since
+    ).order_by(
+        models.CostAlert.date.desc(),
+        models.CostAlert.amount.desc()
+    ).all()
+
+
+def rebuild_anomaly_states(db: Session, days=HISTORY_DAYS):
+    """
+    Seed the running statistics from the last `days` days of the rollup,
+    for databases with cost history from before detection existed
+    """
+    rows = _daily_totals(db, date.today() - timedelta(days=days))
+
+    db.query(models.AnomalyState).delete(synchronize_session=False)
+    state = None
+    for service, project, entry_date, total in rows:
+        if state is None or (state.service, state.project) != (service, project):
+            state = models.AnomalyState(
+                service=service, project=project, last_date=entry_date,
+                day_total=0.0, mean=0.0, variance=0.0, days=0
+            )
+            db.add(state)
+        elif entry_date > state.last_date:
+            close_day(state)
+            state.last_date = entry_date
+        state.day_total += total or 0
+    db.commit()
+
+
+def ensure_anomaly_states(db: Session):
+    """
+    Build the running statistics for databases created before they existed
+    """
+    if db.query(models.AnomalyState.id).first() is None and db.query(models.CostRollup.id).first() is not None:
+        rebuild_anomaly_states(db)
@@ -0,0 +1,912 @@
+"""
+Benchmarks for the Cloud Cost Insight API
+
+Each benchmark runs against a throwaway SQLite database so the development
+database is never touched. Run with:
+
+    python -m backend.benchmark budget --rows 1000 10000 100000
+    python -m backend.benchmark ingest --rows 100000
+    python -m backend.benchmark recommendations --rows 100000 1000000
+    python -m backend.benchmark load --url http://localhost:8000 http://localhost:8001
+    python -m backend.benchmark plans
+    python -m backend.benchmark budget-history --budgets 10 100 500
+    python -m backend.benchmark forecast --series 1000 10000
+    python -m backend.benchmark anomalies --rows 100000
+    python -m backend.benchmark fanout --clients 1000
+    python -m backend.benchmark breakdown --rows 100000 1000000
+    python -m backend.benchmark serialization --rows 10000 100000
+    python -m backend.benchmark suite --rows 10000 1000000 10000000 --baseline previous.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+from .database import Base, create_db_engine
+from . import models, schemas
+from .routers import budget, optimization
+from .seed import load_synthetic, synthetic_cost_chunks
+from .ingest import ingest_entries
+from .forecasting import forecast_cache
+from .generate_recommendations import create_recommendations_in_db, generate_recommendations, mark_groups_dirty
+
+def make_session(directory):
+    """
+    Create a fresh SQLite database in `directory` and return a session
+    """
+    engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def generate_rows(rows, days=30, seed=42):
+    """
+    Yield `rows` synthetic cost entry dicts spread over the last `days` days
+    """
+    for chunk in synthetic_cost_chunks(rows, days, seed=seed):
+        yield from chunk
+
+
+def seed_rows(db, rows, days=30):
+    """
+    Bulk insert `rows` synthetic cost entries spread over the last `days` days
+    """
+    load_synthetic(db, rows, days=days)
+
+
+def cpu_call(fn, repeat=5):
+    """
+    Call `fn` `repeat` times and return the median CPU time in milliseconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        durations.append((time.process_time() - start) * 1000)
+    return statistics.median(durations)
+
+
+def time_call(fn, repeat=5):
+    """
+    Call `fn` `repeat` times and return the median duration in milliseconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def bench_budget(args):
+    print(f"{'rows':>12} {'GET /budget (ms)':>18}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            db = make_session(directory)
+            seed_rows(db, rows)
+
+            def uncached():
+                # Time the forecast itself, not a cache hit
+                forecast_cache.invalidate()
+                return budget.compute_budget(db)
+
+            elapsed = time_call(uncached, args.repeat)
+            print(f"{rows:>12} {elapsed:>18.2f}")
+            db.close()
+
+
+def bench_ingest(args):
+    from .routers import costs
+
+    print(f"{'mode':>8} {'rows':>10} {'seconds':>10} {'rows/sec':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_session(directory)
+        rows = list(generate_rows(args.single_rows))
+        start = time.perf_counter()
+        for row in rows:
+            costs.save_cost(db, schemas.CostEntryCreate(**row))
+        elapsed = time.perf_counter() - start
+        print(f"{'single':>8} {len(rows):>10} {elapsed:>10.2f} {len(rows) / elapsed:>12.0f}")
+        db.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_session(directory)
+        rows = list(generate_rows(args.rows))
+        start = time.perf_counter()
+        validated = (schemas.CostEntryCreate.model_validate(row).model_dump() for row in rows)
+        inserted = ingest_entries(db, validated, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"{'bulk':>8} {inserted:>10} {elapsed:>10.2f} {inserted / elapsed:>12.0f}")
+        db.close()
+
+
+def legacy_generate_recommendations(db):
+    """
+    The original row-at-a-time analysis, kept as a baseline: loads every
+    CostEntry from the last 30 days and groups it in Python
+    """
+    thirty_days_ago = date.today() - timedelta(days=30)
+    costs = db.query(models.CostEntry).filter(models.CostEntry.date >= thirty_days_ago).all()
+
+    service_costs = {}
+    for cost in costs:
+        service_costs.setdefault((cost.service, cost.provider), []).append(cost.cost)
+
+    recommendations = []
+    for (service, provider), cost_list in service_costs.items():
+        avg_cost = sum(cost_list) / len(cost_list)
+        total_cost = sum(cost_list)
+        if avg_cost < 5 and total_cost > 0:
+            recommendations.append((service, provider, total_cost * 0.8))
+        elif 5 <= avg_cost < 50:
+            recommendations.append((service, provider, total_cost * 0.3))
+        elif avg_cost >= 50 and len(cost_list) >= 25:
+            recommendations.append((service, provider, total_cost * 0.4))
+
+    if len(set(cost.provider for cost in costs)) > 1:
+        recommendations.append(("Multi-Cloud", "All", sum(cost.cost for cost in costs) * 0.15))
+    dev_costs = [cost for cost in costs if cost.environment == 'Development']
+    if dev_costs:
+        recommendations.append(("Development", "All", sum(cost.cost for cost in dev_costs) * 0.5))
+    return recommendations
+
+
+def regenerate_one_group(db):
+    """
+    Mark a single (service, provider) group as changed and regenerate
+    """
+    mark_groups_dirty(db, [{"service": "EC2", "provider": "AWS"}])
+    create_recommendations_in_db(db)
+
+
+def bench_recommendations(args):
+    print(f"{'rows':>12} {'legacy (ms)':>14} {'rollup (ms)':>14} {'speedup':>9} {'1 dirty group (ms)':>20}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            db = make_session(directory)
+            seed_rows(db, rows)
+            legacy = time_call(lambda: legacy_generate_recommendations(db), args.repeat)
+            current = time_call(lambda: generate_recommendations(db), args.repeat)
+            create_recommendations_in_db(db, full=True)
+            incremental = time_call(lambda: regenerate_one_group(db), args.repeat)
+            print(f"{rows:>12} {legacy:>14.2f} {current:>14.2f} {legacy / current:>8.0f}x {incremental:>20.2f}")
+            db.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load(url, paths, concurrency, duration):
+    """
+    Hit `url` from `concurrency` threads for `duration` seconds, cycling
+    through `paths`; returns latencies (ms) and error counts per path
+    """
+    latencies = {path: [] for path in paths}
+    errors = {path: 0 for path in paths}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url.rstrip("/") + path, timeout=30) as response:
+                    response.read()
+                ok = True
+            except (urllib.error.URLError, OSError):
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    latencies[path].append(elapsed)
+                else:
+                    errors[path] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def bench_load(args):
+    """
+    Load each server in --url in turn and report requests/sec and p50/p99
+    per path. Start servers with different settings to compare them, e.g.
+    DATABASE_URL=sqlite:///... vs DATABASE_URL=postgresql://..., or
+    DB_ASYNC=true vs DB_ASYNC=false.
+    """
+    for url in args.url:
+        latencies, errors = run_load(url, args.paths, args.concurrency, args.duration)
+        total = sum(len(values) for values in latencies.values())
+        print(f"{url} - {args.concurrency} clients, {args.duration}s")
+        print(f"{'path':<20} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        for path, values in latencies.items():
+            if values:
+                print(f"{path:<20} {len(values):>9} {errors[path]:>7} {len(values) / args.duration:>9.1f} "
+                      f"{percentile(values, 0.5):>9.2f} {percentile(values, 0.99):>9.2f}")
+            else:
+                print(f"{path:<20} {0:>9} {errors[path]:>7}")
+        print(f"{'total':<20} {total:>9} {sum(errors.values()):>7} {total / args.duration:>9.1f}")
+        print()
+
+
+def captured_selects(db, fn):
+    """
+    Run fn(db) and return the aggregate SELECT statements it executed
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "sum(" in statement.lower():
+            statements.append((statement, parameters))
+
+    bind = db.get_bind()
+    event.listen(bind, "before_cursor_execute", capture)
+    try:
+        fn(db)
+    finally:
+        event.remove(bind, "before_cursor_execute", capture)
+    return statements
+
+
+def plan_checks():
+    """
+    (name, fn) pairs for the aggregates that must be answered from a
+    covering index
+    """
+    from .routers import costs
+
+    return [
+        ("GET /budget", budget.compute_budget),
+        ("GET /optimization", optimization.compute_optimizations),
+        ("generate_recommendations", generate_recommendations),
+        ("GET /budget/history", lambda session: budget.compute_budget_history(
+            session, budget.add_months(date.today().replace(day=1), -11), 12, (None, None, None)
+        )),
+        ("GET /costs/breakdown", lambda session: costs.compute_breakdown(
+            session, ("project", "environment", "provider"), "week",
+            costs.cost_filters(start_date=date.today() - timedelta(days=90))
+        )),
+    ]
+
+
+def query_plans(db, fn):
+    """
+    Run fn(db) and return the EXPLAIN QUERY PLAN details of each aggregate
+    SELECT it executed
+    """
+    # Each check reads the month forecast itself rather than the cached one
+    forecast_cache.invalidate()
+    plans = []
+    for statement, parameters in captured_selects(db, fn):
+        plan = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        plans.append([row[-1] for row in plan])
+    return plans
+
+
+def bench_plans(args):
+    """
+    Check that the budget and recommendation aggregates are answered from a
+    covering index (an index-only scan) rather than the table
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_session(directory)
+        seed_rows(db, args.rows)
+        db.add(models.Budget(amount=1000.0, project="Alpha"))
+        db.commit()
+        db.execute(text("ANALYZE"))
+
+        for name, fn in plan_checks():
+            for details in query_plans(db, fn):
+                index_only = any("COVERING INDEX" in detail for detail in details)
+                failures += not index_only
+                print(f"{'ok  ' if index_only else 'FAIL'} {name}")
+                for detail in details:
+                    print(f"       {detail}")
+        db.close()
+
+    if failures:
+        sys.exit(1)
+
+
+def bench_budget_history(args):
+    """
+    GET /budget/history for many scoped budgets over a year, with the
+    number of statements it runs
+    """
+    from .seed import DEFAULT_PROVIDERS, ENVIRONMENTS, project_names
+
+    print(f"{'budgets':>10} {'months':>8} {'entries':>9} {'queries':>8} {'ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        db = make_session(directory)
+        load_synthetic(db, args.rows, days=args.months * 31, projects=project_names(args.projects))
+        scopes = [
+            (project, environment, provider)
+            for project in [None, *project_names(args.projects)]
+            for environment in [None, *ENVIRONMENTS]
+            for provider in [None, *DEFAULT_PROVIDERS]
+        ]
+        start = budget.add_months(date.today().replace(day=1), 1 - args.months)
+        for count in args.budgets:
+            db.query(models.Budget).delete()
+            for i in range(count):
+                project, environment, provider = scopes[i % len(scopes)]
+                # Past the first pass over the scopes, add month-specific overrides
+                period = budget.add_months(start, i // len(scopes) - 1).strftime('%Y-%m') if i >= len(scopes) else None
+                db.add(models.Budget(
+                    amount=1000.0, project=project, environment=environment, provider=provider, period=period
+                ))
+            db.commit()
+
+            statements = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(db.get_bind(), "before_cursor_execute", capture)
+            history = budget.compute_budget_history(db, start, args.months, (None, None, None))
+            event.remove(db.get_bind(), "before_cursor_execute", capture)
+            elapsed = time_call(
+                lambda: budget.compute_budget_history(db, start, args.months, (None, None, None)), args.repeat
+            )
+            print(f"{count:>10} {args.months:>8} {len(history.entries):>9} {len(statements):>8} {elapsed:>10.2f}")
+        db.close()
+
+
+def bench_forecast(args):
+    """
+    Fit synthetic (service, project) series in one batch solve, against
+    fitting them one at a time
+    """
+    import numpy as np
+    from .forecasting import fit_series
+
+    rng = np.random.default_rng(42)
+    history_start = date.today() - timedelta(days=args.days)
+    future_dates = [date.today() + timedelta(days=offset) for offset in range(1, 31)]
+    weekly = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 0.6, 0.5])
+    weekdays = np.array([(history_start + timedelta(days=offset)).weekday() for offset in range(args.days)])
+
+    print(f"{'series':>10} {'batch (ms)':>12} {'per series (ms)':>16}")
+    for series in args.series:
+        level = rng.uniform(1, 500, size=(series, 1))
+        trend = rng.normal(0, 0.5, size=(series, 1))
+        history = np.clip(
+            (level + trend * np.arange(args.days)) * weekly[weekdays] + rng.normal(0, 5, size=(series, args.days)),
+            0, None
+        )
+        batch = time_call(lambda: fit_series(history, history_start, future_dates), args.repeat)
+        sample = history[:min(series, 1000)]
+        single = time_call(lambda: [fit_series(row[None, :], history_start, future_dates) for row in sample], 1)
+        print(f"{series:>10} {batch:>12.2f} {single * series / len(sample):>16.2f}")
+
+
+def bench_anomalies(args):
+    """
+    Per-row cost of anomaly detection on bulk ingest, and the latency from
+    writing a spike to it showing up in the active alerts
+    """
+    from . import anomalies
+
+    print(f"{'detection':>10} {'rows':>10} {'seconds':>10} {'us/row':>10}")
+    timings = {}
+    for enabled in (False, True):
+        anomalies.ANOMALY_DETECTION = enabled
+        with tempfile.TemporaryDirectory() as directory:
+            db = make_session(directory)
+            rows = sorted(generate_rows(args.rows, days=args.days), key=lambda row: row["date"])
+            start = time.perf_counter()
+            ingest_entries(db, rows, chunk_size=args.chunk_size)
+            timings[enabled] = time.perf_counter() - start
+            label = "on" if enabled else "off"
+            print(f"{label:>10} {args.rows:>10} {timings[enabled]:>10.2f} {timings[enabled] / args.rows * 1e6:>10.2f}")
+
+            if enabled:
+                latest = rows[-1]
+                spike = dict(latest, cost=latest["cost"] * 1000)
+                start = time.perf_counter()
+                ingest_entries(db, [spike])
+                alerts = anomalies.active_alerts(db)
+                latency = (time.perf_counter() - start) * 1000
+                detected = any(alert.kind == "spike" for alert in alerts)
+                print(f"overhead: {(timings[True] - timings[False]) / args.rows * 1e6:.2f} us/row")
+                print(f"spike detection latency: {latency:.2f} ms ({'detected' if detected else 'not detected'})")
+            db.close()
+    anomalies.ANOMALY_DETECTION = True
+
+
+def bench_fanout(args):
+    """
+    Broadcast events to simulated SSE clients and measure how long each
+    event takes to reach all of them
+    """
+    import asyncio
+    from .events import EventBroadcaster, cost_changes
+
+    broadcaster = EventBroadcaster(queue_size=max(256, args.events + 1))
+    rows = list(generate_rows(args.rows_per_event, days=1))
+
+    async def client(ready, received, done):
+        stream = broadcaster.stream()
+        await stream.__anext__()  # retry hint, sent once the client is subscribed
+        ready.release()
+        count = 0
+        async for frame in stream:
+            if frame.startswith(b"id:"):
+                event_id = int(frame.split(b"\n", 1)[0][4:])
+                received.setdefault(event_id, []).append(time.perf_counter())
+                count += 1
+                if count == args.events:
+                    done.release()
+                    break
+        await stream.aclose()
+
+    async def run():
+        ready = asyncio.Semaphore(0)
+        done = asyncio.Semaphore(0)
+        received = {}
+        tasks = [asyncio.create_task(client(ready, received, done)) for _ in range(args.clients)]
+        for _ in range(args.clients):
+            await ready.acquire()
+
+        published = {}
+
+        def publisher():
+            for _ in range(args.events):
+                start = time.perf_counter()
+                event_id = broadcaster.publish("costs", cost_changes(rows))
+                published[event_id] = start
+                time.sleep(args.interval)
+
+        start = time.perf_counter()
+        await asyncio.to_thread(publisher)
+        for _ in range(args.clients):
+            await done.acquire()
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*tasks)
+        return published, received, elapsed
+
+    published, received, elapsed = asyncio.run(run())
+    fanout = [(max(received[event_id]) - sent) * 1000 for event_id, sent in published.items()]
+    deliveries = sum(len(times) for times in received.values())
+    print(f"{'clients':>8} {'events':>8} {'deliveries':>11} {'p50 (ms)':>10} {'p99 (ms)':>10} {'max (ms)':>10}")
+    print(
+        f"{args.clients:>8} {args.events:>8} {deliveries:>11} {percentile(fanout, 0.5):>10.2f} "
+        f"{percentile(fanout, 0.99):>10.2f} {max(fanout):>10.2f}"
+    )
+    print(f"time until every client saw every event: {elapsed:.2f}s")
+
+
+def bench_breakdown(args):
+    """
+    GET /costs/breakdown against paging GET /costs and aggregating the rows
+    client-side, as the dashboards did
+    """
+    from .routers import costs
+
+    dimensions = ("project", "environment", "provider")
+    print(f"{'rows':>12} {'breakdown (ms)':>16} {'paged rows (ms)':>16}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            db = make_session(directory)
+            seed_rows(db, rows, days=args.days)
+            filters = costs.cost_filters()
+
+            def paged():
+                totals = {}
+                cursor = None
+                while True:
+                    page = costs.list_costs(db, filters, cursor, limit=1000)
+                    for entry in page:
+                        key = (entry.date.isocalendar()[:2], *(getattr(entry, field) for field in dimensions))
+                        totals[key] = totals.get(key, 0) + entry.cost
+                    if len(page) < 1000:
+                        return totals
+                    cursor = (page[-1].date, page[-1].id)
+
+            breakdown = time_call(lambda: costs.compute_breakdown(db, dimensions, "week", filters), args.repeat)
+            client_side = time_call(paged, 1)
+            print(f"{rows:>12} {breakdown:>16.2f} {client_side:>16.2f}")
+            db.close()
+
+
+def bench_serialization(args):
+    """
+    CPU per 10k rows to build the GET /costs and GET /optimization bodies:
+    ORM objects validated through the response model, as FastAPI does,
+    against column tuples encoded directly
+    """
+    from pydantic import TypeAdapter
+    from sqlalchemy import insert
+    from .routers import costs
+    from . import serialization
+
+    cost_list = TypeAdapter(list[schemas.CostEntry])
+    print(f"encoder: {'orjson' if serialization.orjson else 'json (install orjson for the fast encoder)'}")
+    print(f"{'rows':>10} {'costs before':>14} {'costs after':>13} {'optimizations before':>22} {'optimizations after':>21}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            db = make_session(directory)
+            seed_rows(db, rows)
+            db.execute(insert(models.Optimization), [
+                {
+                    "rule": "rightsize",
+                    "title": f"Right-size Service {i} Instances",
+                    "description": f"Your Service {i} service on AWS appears underutilized.",
+                    "estimated_savings": 10.0 + i % 100,
+                    "status": ("pending", "applied", "ignored")[i % 3],
+                    "service": f"Service {i}",
+                    "provider": "AWS",
+                }
+                for i in range(rows)
+            ])
+            db.commit()
+
+            filters = costs.cost_filters()
+            columns = serialization.model_columns(models.CostEntry, schemas.CostEntry)
+            timings = [
+                lambda: cost_list.dump_json(cost_list.validate_python(costs.list_costs(db, filters, limit=rows))),
+                lambda: serialization.dumps(serialization.rows_to_dicts(
+                    schemas.CostEntry, costs.list_costs(db, filters, limit=rows, columns=columns)
+                )),
+                lambda: optimization.compute_optimizations(db, 1.0).model_dump_json(),
+                lambda: optimization.encode_optimizations(db, 1.0),
+            ]
+            per_10k = [cpu_call(fn, args.repeat) * 10000 / rows for fn in timings]
+            print(f"{rows:>10} {per_10k[0]:>11.1f} ms {per_10k[1]:>10.1f} ms {per_10k[2]:>19.1f} ms {per_10k[3]:>18.1f} ms")
+            db.close()
+
+
+# Endpoints exercised by the suite; {week_ago} and {today} are filled in per run
+SUITE_ENDPOINTS = [
+    "/costs/?limit=100",
+    "/costs/?limit=1000&start_date={week_ago}",
+    "/costs/breakdown?group_by=service",
+    "/costs/breakdown?group_by=project,environment,provider&granularity=week",
+    "/costs/export?format=ndjson&start_date={today}",
+    "/budget/",
+    "/optimization/",
+    "/alerts/",
+    "/alerts/active",
+    "/jobs/",
+    "/jobs/stats",
+    "/events/stats",
+    "/cache/stats",
+]
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb(pid="self"):
+    """
+    High-water resident memory of a process in MB, from /proc on Linux.
+    Returns None where it isn't available.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss(pid):
+    """
+    Reset a process's memory high-water mark so the next reading covers
+    only what follows (Linux only; a no-op elsewhere)
+    """
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def start_server(database_url):
+    """
+    Run the API against `database_url` in a child process with the
+    scheduler and caches disabled, and return (process, base url)
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    env = dict(
+        os.environ, DATABASE_URL=database_url, SCHEDULER_ENABLED="false",
+        RESPONSE_CACHE_TTL="0", FORECAST_CACHE_TTL="0"
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            with urllib.request.urlopen(url + "/", timeout=5):
+                return process, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("API server did not start")
+
+
+def request_ms(url):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=600) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def suite_endpoint(process, url, path, args):
+    """
+    Sequential latency, concurrent throughput and server peak memory for one path
+    """
+    request_ms(url + path)  # warm up
+    reset_peak_rss(process.pid)
+    latencies = [request_ms(url + path) for _ in range(args.repeat)]
+    peak = peak_rss_mb(process.pid)
+    loaded, errors = run_load(url, [path], args.concurrency, args.duration)
+    return {
+        "name": f"GET {path}",
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "requests_per_sec": round(len(loaded[path]) / args.duration, 1),
+        "errors": errors[path],
+        "peak_rss_mb": peak,
+    }
+
+
+def suite_size(rows, directory, args):
+    """
+    Load `rows` synthetic entries and measure the load, generate_recommendations
+    and every endpoint in SUITE_ENDPOINTS against them
+    """
+    results = []
+    db = make_session(directory)
+    start = time.perf_counter()
+    load_synthetic(db, rows, days=args.days, skew=args.skew, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    results.append({
+        "name": "load",
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows / elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    db.add(models.AlertThreshold(amount=1000.0))
+    db.add(models.Budget(amount=rows * 10.0))
+    db.commit()
+    create_recommendations_in_db(db, full=True)
+
+    latency = time_call(lambda: generate_recommendations(db), args.repeat)
+    tracemalloc.start()
+    generate_recommendations(db)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results.append({
+        "name": "generate_recommendations",
+        "p50_ms": round(latency, 2),
+        "peak_alloc_mb": round(peak / 2 ** 20, 2),
+    })
+    db.close()
+
+    today = date.today()
+    paths = [
+        path.format(today=today.isoformat(), week_ago=(today - timedelta(days=7)).isoformat())
+        for path in SUITE_ENDPOINTS
+    ]
+    process, url = start_server(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    try:
+        for path in paths:
+            results.append(suite_endpoint(process, url, path, args))
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline, results, tolerance):
+    """
+    Print changes against a baseline run and return the regressions: any
+    latency or peak memory that grew by more than `tolerance`
+    """
+    previous = {(result["rows"], result["name"]): result for result in baseline["results"]}
+    regressions = []
+    print(f"{'rows':>10} {'name':<72} {'metric':<14} {'baseline':>10} {'current':>10} {'change':>8}")
+    for result in results:
+        before = previous.get((result["rows"], result["name"]))
+        if before is None:
+            continue
+        for metric in ("p50_ms", "peak_rss_mb", "peak_alloc_mb"):
+            if not before.get(metric) or result.get(metric) is None:
+                continue
+            change = result[metric] / before[metric] - 1
+            flag = " !" if change > tolerance else ""
+            print(f"{result['rows']:>10} {result['name']:<72} {metric:<14} {before[metric]:>10.2f} "
+                  f"{result[metric]:>10.2f} {change:>+7.0%}{flag}")
+            if flag:
+                regressions.append((result["rows"], result["name"], metric))
+    return regressions
+
+
+def bench_suite(args):
+    """
+    Load synthetic datasets of each size in --rows and record load
+    throughput, generate_recommendations and every dashboard endpoint's
+    latency, throughput and peak memory to a JSON file. With --baseline,
+    compare against an earlier run and exit non-zero on regressions.
+    """
+    results = []
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"{rows} rows...", flush=True)
+            for result in suite_size(rows, directory, args):
+                results.append(dict(result, rows=rows))
+
+    print(f"{'rows':>10} {'name':<72} {'p50 (ms)':>9} {'p95 (ms)':>9} {'req/s':>8} {'peak MB':>8}")
+    for result in results:
+        p50 = result.get("p50_ms", result.get("seconds", 0) * 1000)
+        p95 = result.get("p95_ms")
+        throughput = result.get("requests_per_sec", result.get("rows_per_sec"))
+        peak = result.get("peak_rss_mb", result.get("peak_alloc_mb"))
+        print(f"{result['rows']:>10} {result['name']:<72} {p50:>9.2f} "
+              f"{p95 if p95 is not None else '':>9} {throughput if throughput is not None else '':>8} "
+              f"{peak if peak is not None else '':>8}")
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "days": args.days, "skew": args.skew, "seed": args.seed, "repeat": args.repeat,
+            "concurrency": args.concurrency, "duration": args.duration,
+        },
+        "results": results,
+    }
+    output = args.output or f"bench-suite-{datetime.utcnow():%Y%m%d-%H%M%S}.json"
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare_results(json.load(file), results, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloud Cost Insight benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    budget_parser = subparsers.add_parser("budget", help="GET /budget response time by row count")
+    budget_parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    budget_parser.add_argument("--repeat", type=int, default=5)
+    budget_parser.set_defaults(func=bench_budget)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Single-row vs bulk ingestion throughput")
+    ingest_parser.add_argument("--rows", type=int, default=100000)
+    ingest_parser.add_argument("--single-rows", type=int, default=2000)
+    ingest_parser.add_argument("--chunk-size", type=int, default=5000)
+    ingest_parser.set_defaults(func=bench_ingest)
+
+    recommendations_parser = subparsers.add_parser(
+        "recommendations",
+        help="generate_recommendations vs the original row-at-a-time analysis, and incremental regeneration"
+    )
+    recommendations_parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    recommendations_parser.add_argument("--repeat", type=int, default=3)
+    recommendations_parser.set_defaults(func=bench_recommendations)
+
+    load_parser = subparsers.add_parser("load", help="Requests/sec and latency against a running server")
+    load_parser.add_argument("--url", nargs="+", default=["http://localhost:8000"])
+    load_parser.add_argument("--paths", nargs="+", default=["/budget/", "/optimization/", "/alerts/", "/costs/"])
+    load_parser.add_argument("--concurrency", type=int, default=32)
+    load_parser.add_argument("--duration", type=float, default=10)
+    load_parser.set_defaults(func=bench_load)
+
+    plans_parser = subparsers.add_parser("plans", help="Verify aggregate queries use index-only scans")
+    plans_parser.add_argument("--rows", type=int, default=20000)
+    plans_parser.set_defaults(func=bench_plans)
+
+    history_parser = subparsers.add_parser(
+        "budget-history", help="GET /budget/history time and query count by number of budgets"
+    )
+    history_parser.add_argument("--rows", type=int, default=100000)
+    history_parser.add_argument("--budgets", type=int, nargs="+", default=[10, 100, 500])
+    history_parser.add_argument("--months", type=int, default=12)
+    history_parser.add_argument("--projects", type=int, default=20)
+    history_parser.add_argument("--repeat", type=int, default=5)
+    history_parser.set_defaults(func=bench_budget_history)
+
+    forecast_parser = subparsers.add_parser("forecast", help="Batch month-end forecast fit by series count")
+    forecast_parser.add_argument("--series", type=int, nargs="+", default=[1000, 10000])
+    forecast_parser.add_argument("--days", type=int, default=56)
+    forecast_parser.add_argument("--repeat", type=int, default=5)
+    forecast_parser.set_defaults(func=bench_forecast)
+
+    anomalies_parser = subparsers.add_parser("anomalies", help="Anomaly detection overhead and latency on ingest")
+    anomalies_parser.add_argument("--rows", type=int, default=100000)
+    anomalies_parser.add_argument("--days", type=int, default=30)
+    anomalies_parser.add_argument("--chunk-size", type=int, default=5000)
+    anomalies_parser.set_defaults(func=bench_anomalies)
+
+    fanout_parser = subparsers.add_parser("fanout", help="SSE broadcast latency to many simulated clients")
+    fanout_parser.add_argument("--clients", type=int, default=1000)
+    fanout_parser.add_argument("--events", type=int, default=100)
+    fanout_parser.add_argument("--rows-per-event", type=int, default=5000)
+    fanout_parser.add_argument("--interval", type=float, default=0.05)
+    fanout_parser.set_defaults(func=bench_fanout)
+
+    breakdown_parser = subparsers.add_parser("breakdown", help="Grouped breakdown vs client-side aggregation of pages")
+    breakdown_parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    breakdown_parser.add_argument("--days", type=int, default=90)
+    breakdown_parser.add_argument("--repeat", type=int, default=5)
+    breakdown_parser.set_defaults(func=bench_breakdown)
+
+    serialization_parser = subparsers.add_parser(
+        "serialization", help="CPU per 10k rows of list responses with and without the fast JSON path"
+    )
+    serialization_parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    serialization_parser.add_argument("--repeat", type=int, default=5)
+    serialization_parser.set_defaults(func=bench_serialization)
+
+    suite_parser = subparsers.add_parser(
+        "suite", help="Load synthetic data and record every endpoint's latency, throughput and memory to JSON"
+    )
+    suite_parser.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000, 10000000])
+    suite_parser.add_argument("--days", type=int, default=90)
+    suite_parser.add_argument("--skew", type=float, default=1.0)
+    suite_parser.add_argument("--seed", type=int, default=42)
+    suite_parser.add_argument("--repeat", type=int, default=5)
+    suite_parser.add_argument("--concurrency", type=int, default=4)
+    suite_parser.add_argument("--duration", type=float, default=3)
+    suite_parser.add_argument("--output", help="Results file (default bench-suite-<timestamp>.json)")
+    suite_parser.add_argument("--baseline", help="Earlier results file to compare against")
+    suite_parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging, e.g. 0.25")
+    suite_parser.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+In-process response cache for dashboard endpoints
+
+Entries expire after a TTL and the least recently used entry is evicted
+when the cache is full. Any write that changes the underlying data calls
+`response_cache.invalidate()`. Cached responses carry an ETag so clients
+can revalidate with If-None-Match and get a 304 when nothing changed.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Request, Response
+from .instrumentation import serialization_timer
+
+DEFAULT_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 60))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 256))
+
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body, etag, expires_at):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, generation=None):
+        """
+        Store a response body. When `generation` is given and a write has
+        invalidated the cache since, the entry is returned but not stored.
+        """
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        entry = CacheEntry(body, etag, time.monotonic() + self.ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+                "invalidations": self.invalidations,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def cache_key(request: Request, *parts):
+    """
+    Key a response by route, the given parts (e.g. month) and its query string
+    """
+    return (request.url.path, *parts, tuple(sorted(request.query_params.multi_items())))
+
+
+async def cached_json_response(request: Request, key, compute):
+    """
+    Serve `await compute()` (a Pydantic model or already encoded JSON bytes)
+    from the cache, revalidating with ETags
+    """
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        body = await compute()
+        if not isinstance(body, bytes):
+            with serialization_timer():
+                body = body.model_dump_json().encode()
+        entry = response_cache.set(key, body, generation)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,178 @@
+"""
+Columnar (Parquet / Arrow IPC) exchange of cost entries
+
+Exports turn each keyset page read from the database into an Arrow record
+batch and stream the encoded bytes as they are produced. Imports read a
+Parquet file batch by batch, cast it to the cost entry schema with Arrow
+compute and insert it through the bulk ingest path, so rows never pass
+through Pydantic.
+
+pyarrow is imported lazily; without it these formats raise
+`ColumnarUnavailable` and the rest of the API is unaffected.
+"""
+from functools import reduce
+from sqlalchemy.orm import Session
+from . import schemas
+from .ingest import insert_chunk, DEFAULT_CHUNK_SIZE
+
+REQUIRED_IMPORT_COLUMNS = ("service", "provider", "cost", "date")
+# Filled with the cost entry defaults when absent or null, as on POST /costs
+IMPORT_DEFAULTS = {
+    column: schemas.CostEntryBase.model_fields[column].default for column in ("project", "environment")
+}
+IMPORT_COLUMNS = REQUIRED_IMPORT_COLUMNS + tuple(IMPORT_DEFAULTS)
+
+
+class ColumnarUnavailable(RuntimeError):
+    pass
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ColumnarUnavailable("Parquet and Arrow support requires the pyarrow package")
+    return pyarrow
+
+
+def arrow_schema(columns):
+    pa = require_pyarrow()
+    types = {
+        "id": pa.int64(),
+        "service": pa.string(),
+        "provider": pa.string(),
+        "cost": pa.float64(),
+        "date": pa.date32(),
+        "project": pa.string(),
+        "environment": pa.string(),
+        "created_at": pa.timestamp("us"),
+    }
+    return pa.schema([(column, types[column]) for column in columns])
+
+
+class _ChunkSink:
+    """
+    Write-only file object that hands back whatever has been written since
+    the last `drain()`
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _record_batches(pages, columns):
+    pa = require_pyarrow()
+    schema = arrow_schema(columns)
+    for page in pages:
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*page), schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def parquet_stream(pages, columns):
+    """
+    Encode pages of row tuples as a Parquet file, one row group per page
+    """
+    pa = require_pyarrow()
+    sink = _ChunkSink()
+    with pa.parquet.ParquetWriter(sink, arrow_schema(columns), compression="zstd") as writer:
+        for batch in _record_batches(pages, columns):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def arrow_stream(pages, columns):
+    """
+    Encode pages of row tuples in the Arrow IPC streaming format
+    """
+    pa = require_pyarrow()
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, arrow_schema(columns)) as writer:
+        yield sink.drain()
+        for batch in _record_batches(pages, columns):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _import_batches(parquet_file, chunk_size):
+    """
+    Yield the file's batches cast to the cost entry schema, with missing
+    optional columns and null optional values filled with their defaults
+    """
+    pa = require_pyarrow()
+    pc = pa.compute
+    schema = arrow_schema(IMPORT_COLUMNS)
+    present = [column for column in IMPORT_COLUMNS if column in parquet_file.schema_arrow.names]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=present):
+        arrays = []
+        for field in schema:
+            if field.name in present:
+                array = batch.column(field.name).cast(field.type)
+            else:
+                array = pa.nulls(batch.num_rows, field.type)
+            if field.name in IMPORT_DEFAULTS:
+                array = pc.fill_null(array, IMPORT_DEFAULTS[field.name])
+            arrays.append(array)
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def import_parquet(db: Session, source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Load a Parquet file (path or seekable binary file object) into
+    cost_entries. Every batch is cast before any is written, so a file
+    with a value that does not fit the schema is rejected as a whole.
+    Returns (received, inserted, failures) where failures lists
+    (row index, error) for rows with missing required values.
+    """
+    pa = require_pyarrow()
+    pc = pa.compute
+    parquet_file = pa.parquet.ParquetFile(source)
+
+    missing = [column for column in REQUIRED_IMPORT_COLUMNS if column not in parquet_file.schema_arrow.names]
+    if missing:
+        raise ValueError(f"Parquet file is missing columns: {', '.join(missing)}")
+
+    try:
+        for _ in _import_batches(parquet_file, chunk_size):
+            pass
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"Parquet columns do not match the cost entry schema: {e}")
+
+    received = 0
+    inserted = 0
+    failures = []
+    for batch in _import_batches(parquet_file, chunk_size):
+        valid = reduce(pc.and_, [pc.is_valid(column) for column in batch.columns])
+        for index in pc.indices_nonzero(pc.invert(valid)).to_pylist():
+            failures.append((received + index, "Missing required value"))
+
+        received += batch.num_rows
+        inserted += insert_chunk(db, batch.filter(valid).to_pylist())
+
+    return received, inserted, failures
@@ -0,0 +1,149 @@
+"""
+Server-Sent Events broadcast of data changes
+
+Writers call `broadcaster.publish(event, data)` after committing. Each
+event is serialized once into an SSE frame and the same bytes are handed
+to every connected dashboard, so N clients cost one computation per change
+rather than N polling recomputations. `publish` is thread-safe and can be
+called from request handlers, threadpool work and scheduler jobs.
+
+Recent frames are kept so a reconnecting client sending Last-Event-ID
+receives what it missed. A client that falls too far behind gets a
+`resync` event and should refetch the full state.
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import date
+from .serialization import json_default
+
+EVENT_HISTORY = int(os.environ.get("EVENT_HISTORY", 256))
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", 256))
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get("EVENT_HEARTBEAT_SECONDS", 15))
+
+HEARTBEAT = b": keepalive\n\n"
+
+
+def encode_event(event_id, event, data):
+    payload = json.dumps(data, default=json_default, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+class EventBroadcaster:
+    def __init__(self, history=EVENT_HISTORY, queue_size=EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # queue -> event loop it belongs to
+        self._history = deque(maxlen=history)
+        self._next_id = 1
+        self.published = 0
+        self.resyncs = 0
+
+    def publish(self, event, data):
+        """
+        Encode an event once and queue it for every subscriber
+        """
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            frame = encode_event(event_id, event, data)
+            self._history.append((event_id, frame))
+            self.published += 1
+            by_loop = {}
+            for queue, loop in self._subscribers.items():
+                by_loop.setdefault(loop, []).append(queue)
+
+        # One callback per event loop, not per client
+        for loop, queues in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, queues, (event_id, frame))
+            except RuntimeError:
+                # Loop already closed; its subscribers are gone
+                pass
+        return event_id
+
+    def _deliver(self, queues, item):
+        for queue in queues:
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Too far behind to catch up with deltas: drop the backlog and ask for a refetch
+                while not queue.empty():
+                    queue.get_nowait()
+                self.resyncs += 1
+                queue.put_nowait((item[0], encode_event(item[0], "resync", {})))
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    async def stream(self, last_event_id=None, heartbeat=EVENT_HEARTBEAT_SECONDS):
+        """
+        Yield SSE frames for one client until it disconnects, starting with
+        any retained events after `last_event_id`
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+            backlog = [
+                (event_id, frame) for event_id, frame in self._history
+                if last_event_id is not None and event_id > last_event_id
+            ]
+        try:
+            yield b"retry: 3000\n\n"
+            for _, frame in backlog:
+                yield frame
+            while True:
+                try:
+                    _, frame = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                yield frame
+        finally:
+            with self._lock:
+                self._subscribers.pop(queue, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "resyncs": self.resyncs,
+                "last_event_id": self._next_id - 1,
+            }
+
+
+broadcaster = EventBroadcaster()
+
+
+def cost_changes(rows):
+    """
+    Summarize written cost rows (dicts; cost may be a correction delta) as
+    the change to the current month's spend, in total and per service
+    """
+    month_start = date.today().replace(day=1)
+    total = 0.0
+    services = {}
+    for row in rows:
+        if row["date"] < month_start:
+            continue
+        cost = row["cost"] or 0
+        total += cost
+        services[row["service"]] = services.get(row["service"], 0.0) + cost
+    return {
+        "rows": len(rows),
+        "current_month": {
+            "month": month_start.strftime('%Y-%m'),
+            "total": round(total, 6),
+            "services": {service: round(cost, 6) for service, cost in services.items()},
+        },
+    }
+
+
+def publish_cost_changes(rows):
+    if rows:
+        broadcaster.publish("costs", cost_changes(rows))
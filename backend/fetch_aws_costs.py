@@ -1,45 +1,128 @@
-import boto3
-import argparse
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
 
-def fetch_aws_costs(days=30):
-    client = boto3.client('ce', region_name='us-east-1')
+logger = logging.getLogger(__name__)
 
-    end_date = date.today()
-    start_date = end_date - timedelta(days=days)
+THROTTLING_ERRORS = {
+    'ThrottlingException',
+    'Throttling',
+    'LimitExceededException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+}
 
-    # Convert to string format YYYY-MM-DD
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
+def _date_chunks(start_date, end_date, chunk_days):
+    """
+    Split [start_date, end_date) into consecutive windows of at most chunk_days
+    """
+    chunks = []
+    chunk_start = start_date
+    while chunk_start < end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
 
-    print(f"Fetching costs from {start_str} to {end_str}...")
+def _call_with_backoff(fn, max_retries=5, base_delay=1.0, **kwargs):
+    """
+    Call fn, retrying throttled requests with exponential backoff and jitter
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(**kwargs)
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            code = response.get('Error', {}).get('Code') if isinstance(response, dict) else None
+            if code not in THROTTLING_ERRORS or attempt == max_retries:
+                raise
+            time.sleep(base_delay * (2 ** attempt) + random.uniform(0, base_delay))
 
-    try:
-        response = client.get_cost_and_usage(
-            TimePeriod={
-                'Start': start_str,
-                'End': end_str
-            },
-            Granularity='DAILY',
-            Metrics=['UnblendedCost'],
-            GroupBy=[
-                {'Type': 'DIMENSION', 'Key': 'SERVICE'}
-            ]
-        )
+def _fetch_window(client, start_date, end_date, max_retries):
+    """
+    Fetch one date window, following NextPageToken until every page is read
+    """
+    rows = []
+    request = {
+        'TimePeriod': {
+            'Start': start_date.strftime('%Y-%m-%d'),
+            'End': end_date.strftime('%Y-%m-%d')
+        },
+        'Granularity': 'DAILY',
+        'Metrics': ['UnblendedCost'],
+        'GroupBy': [
+            {'Type': 'DIMENSION', 'Key': 'SERVICE'}
+        ]
+    }
+
+    while True:
+        response = _call_with_backoff(client.get_cost_and_usage, max_retries=max_retries, **request)
 
         for result in response['ResultsByTime']:
             date_str = result['TimePeriod']['Start']
             for group in result['Groups']:
-                service_name = group['Keys'][0]
-                amount = group['Metrics']['UnblendedCost']['Amount']
-                unit = group['Metrics']['UnblendedCost']['Unit']
-                print(f"Date: {date_str}, Service: {service_name}, Cost: {amount} {unit}")
+                rows.append({
+                    'date': date_str,
+                    'service': group['Keys'][0],
+                    'cost': float(group['Metrics']['UnblendedCost']['Amount']),
+                    'currency': group['Metrics']['UnblendedCost']['Unit'],
+                })
 
-    except Exception as e:
-        print(f"Error fetching costs: {e}")
+        token = response.get('NextPageToken')
+        if not token:
+            return rows
+        request['NextPageToken'] = token
+
+def fetch_aws_costs(days=30, client=None, start_date=None, chunk_days=7, max_workers=4, max_retries=5):
+    """
+    Yield daily AWS costs per service as dicts with date, service, cost and currency.
+    Fetches from `start_date` when given, otherwise the last `days` days.
+
+    The range is split into `chunk_days` windows fetched by up to
+    `max_workers` threads; each window follows pagination and retries
+    throttled calls. Rows are yielded as each window completes.
+    Set AWS_CE_ENDPOINT_URL to point the default client at a local stub.
+    """
+    if client is None:
+        import boto3
+        client = boto3.client(
+            'ce',
+            region_name='us-east-1',
+            endpoint_url=os.environ.get('AWS_CE_ENDPOINT_URL')
+        )
+
+    end_date = date.today()
+    if start_date is None:
+        start_date = end_date - timedelta(days=days)
+
+    logger.info("Fetching AWS costs from %s to %s", start_date, end_date)
+
+    chunks = _date_chunks(start_date, end_date, max(1, chunk_days))
+    if not chunks:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        futures = [
+            executor.submit(_fetch_window, client, chunk_start, chunk_end, max_retries)
+            for chunk_start, chunk_end in chunks
+        ]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     # Ensure you have AWS credentials set up in your environment
     # export AWS_ACCESS_KEY_ID=...
     # export AWS_SECRET_ACCESS_KEY=...
-    fetch_aws_costs()
+    try:
+        for row in fetch_aws_costs():
+            print(f"Date: {row['date']}, Service: {row['service']}, Cost: {row['cost']} {row['currency']}")
+    except Exception as e:
+        print(f"Error fetching costs: {e}")
@@ -1,22 +1,30 @@
+import logging
 import os
 from datetime import date, timedelta
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.costmanagement import CostManagementClient
 from azure.mgmt.costmanagement.models import QueryDefinition, QueryTimePeriod, QueryDataset, QueryAggregation, QueryGrouping
 
-def fetch_azure_costs(days=30):
+logger = logging.getLogger(__name__)
+
+def fetch_azure_costs(days=30, client=None, start_date=None):
+    """
+    Yield daily Azure costs per service as dicts with date, service, cost and currency.
+    Fetches from `start_date` when given, otherwise the last `days` days.
+    Raises RuntimeError when AZURE_SUBSCRIPTION_ID is not set.
+    """
     # Ensure environment variables are set:
     # AZURE_SUBSCRIPTION_ID, AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET
     subscription_id = os.environ.get("AZURE_SUBSCRIPTION_ID")
     if not subscription_id:
-        print("AZURE_SUBSCRIPTION_ID not set.")
-        return
+        raise RuntimeError("AZURE_SUBSCRIPTION_ID not set.")
 
-    credential = DefaultAzureCredential()
-    client = CostManagementClient(credential)
+    if client is None:
+        from azure.identity import DefaultAzureCredential
+        from azure.mgmt.costmanagement import CostManagementClient
+        client = CostManagementClient(DefaultAzureCredential())
 
     end_date = date.today()
-    start_date = end_date - timedelta(days=days)
+    if start_date is None:
+        start_date = end_date - timedelta(days=days)
 
     scope = f"/subscriptions/{subscription_id}"
 
@@ -31,20 +39,24 @@ def fetch_azure_costs(days=30):
         )
     )
 
-    print(f"Fetching Azure costs from {start_date} to {end_date}...")
+    logger.info("Fetching Azure costs from %s to %s", start_date, end_date)
 
-    try:
-        result = client.query.usage(scope, query)
-        for row in result.rows:
-            # Row structure depends on query. Usually [Cost, Date, ServiceName, Currency]
-            cost = row[0]
-            date_val = row[1]
-            service = row[2]
-            currency = row[3]
-            print(f"Date: {date_val}, Service: {service}, Cost: {cost} {currency}")
+    result = client.query.usage(scope, query)
+    for row in result.rows:
+        # Row structure depends on query. Usually [Cost, Date, ServiceName, Currency]
+        # Daily dates come back as an integer like 20240131
+        date_val = str(row[1])
+        yield {
+            'date': f"{date_val[:4]}-{date_val[4:6]}-{date_val[6:8]}" if date_val.isdigit() else date_val[:10],
+            'service': row[2],
+            'cost': float(row[0]),
+            'currency': row[3],
+        }
 
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        for row in fetch_azure_costs():
+            print(f"Date: {row['date']}, Service: {row['service']}, Cost: {row['cost']} {row['currency']}")
     except Exception as e:
         print(f"Error fetching Azure costs: {e}")
-
-if __name__ == "__main__":
-    fetch_azure_costs()
@@ -1,31 +1,215 @@
+"""
+Fetch cloud costs from every configured provider and store them in the database
+
+Providers are fetched concurrently, one thread each. Their rows are
+normalized into `CostEntryCreate` records and written in batches by a
+single writer, so total ingest time is bounded by the slowest provider.
+
+Each provider keeps a watermark in `sync_states`, so a run only fetches
+the days since the last successful sync plus a short restatement window
+for late-arriving charges. Rows are upserted on
+(provider, service, date, project, environment), so re-fetched days
+replace their previous values instead of duplicating them.
+
+    python -m backend.fetch_cloud_costs --days 30 --restatement-days 3
+"""
 import os
 import argparse
-from fetch_aws_costs import fetch_aws_costs
-from fetch_azure_costs import fetch_azure_costs
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from . import models, schemas
+from .database import SessionLocal
+from .migrations import init_db
+from .ingest import upsert_chunk, DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESTATEMENT_DAYS = int(os.environ.get("COST_RESTATEMENT_DAYS", 3))
+
+# Environment variables each provider's fetcher needs
+REQUIRED_SETTINGS = {
+    "AWS": ("AWS_ACCESS_KEY_ID",),
+    "Azure": ("AZURE_SUBSCRIPTION_ID",),
+    "GCP": ("GCP_BILLING_ACCOUNT_ID", "GCP_BILLING_EXPORT_TABLE", "GOOGLE_APPLICATION_CREDENTIALS"),
+}
+
+_DONE = object()
+
+
+def normalize(provider, row):
+    """
+    Convert a raw provider row into a validated cost entry
+    """
+    return schemas.CostEntryCreate(
+        service=row['service'],
+        provider=provider,
+        cost=float(row['cost']),
+        date=str(row['date'])[:10],
+        project=row.get('project') or "Main Project",
+        environment=row.get('environment') or "Production",
+    )
+
+
+def _produce(provider, fetch, batches, batch_size):
+    """
+    Run one provider fetch, pushing normalized batches onto the queue
+    """
+    rows = 0
+    batch = []
+    try:
+        for row in fetch():
+            batch.append(normalize(provider, row).model_dump())
+            if len(batch) >= batch_size:
+                batches.put((provider, batch))
+                rows += len(batch)
+                batch = []
+        if batch:
+            batches.put((provider, batch))
+            rows += len(batch)
+        return rows
+    finally:
+        batches.put((provider, _DONE))
+
+
+def run_pipeline(db, fetchers, batch_size=DEFAULT_CHUNK_SIZE):
+    """
+    Run provider fetches concurrently and stream their rows into the database.
+
+    `fetchers` maps a provider name to a zero-argument callable returning an
+    iterable of raw rows (dicts with date, service and cost). Returns a
+    summary per provider with the rows fetched, the rows inserted or
+    changed, and any error raised.
+    """
+    if not fetchers:
+        return {}
+
+    # Bounded so slow writes apply back-pressure to fast providers
+    batches = queue.Queue(maxsize=len(fetchers) * 4)
+    summary = {provider: {"rows": 0, "written": 0, "error": None} for provider in fetchers}
+
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+        futures = {
+            provider: executor.submit(_produce, provider, fetch, batches, batch_size)
+            for provider, fetch in fetchers.items()
+        }
+
+        pending = len(fetchers)
+        try:
+            while pending:
+                provider, batch = batches.get()
+                if batch is _DONE:
+                    pending -= 1
+                    continue
+                summary[provider]["written"] += upsert_chunk(db, batch)
+        except Exception:
+            # Keep draining so producers blocked on the queue can finish
+            while pending:
+                _, batch = batches.get()
+                if batch is _DONE:
+                    pending -= 1
+            raise
+
+        for provider, future in futures.items():
+            try:
+                summary[provider]["rows"] = future.result()
+            except Exception as e:
+                summary[provider]["error"] = str(e)
+
+    return summary
+
+
+def fetch_start_date(db, provider, days, restatement_days):
+    """
+    First day to fetch: the watermark minus the restatement window, or the
+    full `days` window when the provider has never synced
+    """
+    today = date.today()
+    state = db.query(models.SyncState).filter(models.SyncState.provider == provider).first()
+    if state is None or not state.last_synced_date:
+        return today - timedelta(days=days)
+    watermark = state.last_synced_date
+    return max(today - timedelta(days=days), watermark - timedelta(days=restatement_days))
+
+
+def record_sync(db, provider, synced_until):
+    state = db.query(models.SyncState).filter(models.SyncState.provider == provider).first()
+    if state is None:
+        state = models.SyncState(provider=provider)
+        db.add(state)
+    state.last_synced_date = synced_until
+    db.commit()
+
+
+def configured_fetchers(db, days, restatement_days=DEFAULT_RESTATEMENT_DAYS, full=False):
+    """
+    Build fetchers for the providers whose settings are all present,
+    starting each one from its watermark unless `full` is set. A provider
+    left out is never recorded as synced, so its first configured run
+    fetches the full window.
+    """
+    fetchers = {}
+
+    def start(provider):
+        if full:
+            return date.today() - timedelta(days=days)
+        return fetch_start_date(db, provider, days, restatement_days)
+
+    for provider, settings in REQUIRED_SETTINGS.items():
+        missing = [name for name in settings if not os.environ.get(name)]
+        if missing:
+            logger.info("Skipping %s: %s not set", provider, ", ".join(missing))
+            continue
+
+        if provider == "AWS":
+            from .fetch_aws_costs import fetch_aws_costs as fetch
+        elif provider == "Azure":
+            from .fetch_azure_costs import fetch_azure_costs as fetch
+        else:
+            from .fetch_gcp_costs import fetch_gcp_costs as fetch
+        fetchers[provider] = partial(fetch, days, start_date=start(provider))
+
+    return fetchers
+
+
+def sync_costs(db, fetchers, batch_size=DEFAULT_CHUNK_SIZE):
+    """
+    Run the pipeline and advance the watermark of every provider that succeeded
+    """
+    synced_until = date.today()
+    summary = run_pipeline(db, fetchers, batch_size)
+    for provider, result in summary.items():
+        if result["error"] is None:
+            record_sync(db, provider, synced_until)
+    return summary
+
 
 def main():
-    parser = argparse.ArgumentParser(description="Fetch cloud costs from AWS and Azure")
-    parser.add_argument("--days", type=int, default=30, help="Number of days to fetch")
+    parser = argparse.ArgumentParser(description="Fetch cloud costs from AWS, Azure and GCP")
+    parser.add_argument("--days", type=int, default=30, help="Maximum number of days to fetch")
+    parser.add_argument("--restatement-days", type=int, default=DEFAULT_RESTATEMENT_DAYS,
+                        help="Days before the last sync to re-fetch for late-arriving charges")
+    parser.add_argument("--full", action="store_true", help="Ignore watermarks and re-fetch the whole window")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per database transaction")
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    init_db()
+    db = SessionLocal()
+    try:
+        fetchers = configured_fetchers(db, args.days, args.restatement_days, args.full)
+        summary = sync_costs(db, fetchers, args.batch_size)
+    finally:
+        db.close()
+
+    for provider, result in summary.items():
+        if result["error"]:
+            print(f"{provider}: failed after {result['written']} rows: {result['error']}")
+        else:
+            print(f"{provider}: {result['rows']} rows fetched, {result['written']} inserted or updated")
 
-    print("--- AWS Costs ---")
-    if os.environ.get("AWS_ACCESS_KEY_ID"):
-        fetch_aws_costs(args.days)
-    else:
-        print("Skipping AWS: AWS_ACCESS_KEY_ID not set.")
-
-    print("\n--- Azure Costs ---")
-    if os.environ.get("AZURE_SUBSCRIPTION_ID"):
-        fetch_azure_costs(args.days)
-    else:
-        print("Skipping Azure: AZURE_SUBSCRIPTION_ID not set.")
-
-    print("\n--- GCP Costs ---")
-    if os.environ.get("GCP_BILLING_ACCOUNT_ID"):
-        from fetch_gcp_costs import fetch_gcp_costs
-        fetch_gcp_costs(args.days)
-    else:
-        print("Skipping GCP: GCP_BILLING_ACCOUNT_ID not set.")
 
 if __name__ == "__main__":
     main()
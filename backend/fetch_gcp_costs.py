@@ -1,46 +1,69 @@
+import logging
 import os
-from google.cloud import billing_v1
 from datetime import date, timedelta
 
-def fetch_gcp_costs(days=30):
+logger = logging.getLogger(__name__)
+
+def fetch_gcp_costs(days=30, client=None, start_date=None):
+    """
+    Yield daily GCP costs per service as dicts with date, service, cost and currency.
+    Reads the Cloud Billing export table in BigQuery named by GCP_BILLING_EXPORT_TABLE.
+    Fetches from `start_date` when given, otherwise the last `days` days.
+    Raises RuntimeError when the credentials or export table are not configured.
+    """
     # Ensure GOOGLE_APPLICATION_CREDENTIALS is set to the path of your JSON key file
-    if not os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
-        print("GOOGLE_APPLICATION_CREDENTIALS not set.")
-        return
+    if client is None and not os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
+        raise RuntimeError("GOOGLE_APPLICATION_CREDENTIALS not set.")
 
     # You also need the Billing Account ID
     billing_account_id = os.environ.get("GCP_BILLING_ACCOUNT_ID")
     if not billing_account_id:
-        print("GCP_BILLING_ACCOUNT_ID not set.")
-        return
-
-    client = billing_v1.CloudBillingClient()
-
-    # Note: The Cloud Billing API is more complex for direct cost fetching compared to AWS/Azure.
-    # Often it involves exporting billing data to BigQuery and querying that.
-    # However, for this example, we will list the billing account info as a placeholder
-    # for where the BigQuery logic would go, as direct API cost fetching is limited.
-    
-    print(f"Fetching GCP costs for account {billing_account_id}...")
-    
-    try:
-        # In a real scenario, you would query BigQuery here.
-        # Example:
-        # client = bigquery.Client()
-        # query = "SELECT usage_start_time, service.description, cost, currency FROM ..."
-        # query_job = client.query(query)
-        
-        print("GCP Cost Fetching requires BigQuery export setup.")
-        print("Simulating fetch for demonstration...")
-        
-        # Simulating output
-        end_date = date.today()
+        raise RuntimeError("GCP_BILLING_ACCOUNT_ID not set.")
+
+    # The Cloud Billing API does not return costs directly; they have to be
+    # exported to BigQuery and queried there.
+    # e.g. my-project.billing.gcp_billing_export_v1_XXXXXX_XXXXXX_XXXXXX
+    export_table = os.environ.get("GCP_BILLING_EXPORT_TABLE")
+    if not export_table:
+        raise RuntimeError("GCP Cost Fetching requires BigQuery export setup: GCP_BILLING_EXPORT_TABLE not set.")
+
+    from google.cloud import bigquery
+    if client is None:
+        client = bigquery.Client()
+
+    end_date = date.today()
+    if start_date is None:
         start_date = end_date - timedelta(days=days)
-        print(f"Date: {end_date}, Service: Compute Engine, Cost: 12.50 USD")
-        print(f"Date: {end_date}, Service: Cloud Storage, Cost: 3.20 USD")
 
-    except Exception as e:
-        print(f"Error fetching GCP costs: {e}")
+    logger.info("Fetching GCP costs for account %s from %s to %s", billing_account_id, start_date, end_date)
+
+    query = f"""
+        SELECT DATE(usage_start_time) AS usage_date, service.description AS service,
+               SUM(cost) AS cost, currency
+        FROM `{export_table}`
+        WHERE billing_account_id = @billing_account_id
+          AND DATE(usage_start_time) >= @start_date
+          AND DATE(usage_start_time) < @end_date
+        GROUP BY usage_date, service, currency
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("billing_account_id", "STRING", billing_account_id),
+        bigquery.ScalarQueryParameter("start_date", "DATE", start_date),
+        bigquery.ScalarQueryParameter("end_date", "DATE", end_date),
+    ])
+
+    for row in client.query(query, job_config=job_config).result():
+        yield {
+            'date': row['usage_date'].isoformat(),
+            'service': row['service'],
+            'cost': float(row['cost']),
+            'currency': row['currency'],
+        }
 
 if __name__ == "__main__":
-    fetch_gcp_costs()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        for row in fetch_gcp_costs():
+            print(f"Date: {row['date']}, Service: {row['service']}, Cost: {row['cost']} {row['currency']}")
+    except Exception as e:
+        print(f"Error fetching GCP costs: {e}")
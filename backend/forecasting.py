@@ -0,0 +1,253 @@
+"""
+Month-end spend forecasting
+
+Every (service, project) daily cost series in the rollup is fitted with a
+linear trend plus day-of-week effects; shorter histories fall back to the
+mean plus weekday effects, or just the mean. Each series is fitted from its
+own first active day; series with the same start share one design matrix,
+so a single least-squares solve fits thousands of them at once.
+The forecast for the current month is cached until new costs are written.
+"""
+import calendar
+import os
+import threading
+import time
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import models
+
+FORECAST_HISTORY_DAYS = int(os.environ.get("FORECAST_HISTORY_DAYS", 56))
+# Costs written by another process (e.g. the fetch job) show up after this
+FORECAST_CACHE_TTL = float(os.environ.get("FORECAST_CACHE_TTL", 3600))
+# Two-sided 95% interval
+CONFIDENCE_Z = 1.96
+# Fewer days than this and weekday effects are not fitted (a flat mean is)
+MIN_SEASONAL_DAYS = 14
+# Fewer days than this and no trend is fitted: a slope from a short history,
+# extrapolated to month end, swamps the level
+MIN_TREND_DAYS = 28
+
+
+def days_in_month(day):
+    return calendar.monthrange(day.year, day.month)[1]
+
+
+def design_matrix(dates, origin):
+    """
+    Intercept, linear trend in days since `origin` and one indicator per
+    weekday except Monday
+    """
+    offsets = np.array([(day - origin).days for day in dates], dtype=float)
+    weekdays = np.array([day.weekday() for day in dates])
+    columns = [np.ones_like(offsets), offsets]
+    columns += [(weekdays == weekday).astype(float) for weekday in range(1, 7)]
+    return np.column_stack(columns).reshape(len(dates), len(columns))
+
+
+def model_columns(day_count):
+    """
+    The design matrix columns fitted on `day_count` days of history: the
+    mean, plus weekday effects from MIN_SEASONAL_DAYS and the trend from
+    MIN_TREND_DAYS
+    """
+    columns = [0]
+    if day_count >= MIN_TREND_DAYS:
+        columns.append(1)
+    if day_count >= MIN_SEASONAL_DAYS:
+        columns.extend(range(2, 8))
+    return columns
+
+
+def fit_series(history, history_start, future_dates):
+    """
+    Fit every row of `history` (series x consecutive days from
+    `history_start`) in one solve and predict `future_dates`.
+    Returns (predictions as series x future days, residual std per series).
+    """
+    series_count, day_count = history.shape
+    if day_count == 0:
+        return np.zeros((series_count, len(future_dates))), np.zeros(series_count)
+
+    history_dates = [history_start + timedelta(days=offset) for offset in range(day_count)]
+    columns = model_columns(day_count)
+    features = design_matrix(history_dates, history_start)[:, columns]
+
+    coefficients, *_ = np.linalg.lstsq(features, history.T, rcond=None)
+    residuals = history - (features @ coefficients).T
+    degrees_of_freedom = max(day_count - features.shape[1], 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / degrees_of_freedom)
+
+    future = design_matrix(future_dates, history_start)[:, columns]
+    predictions = np.clip((future @ coefficients).T, 0, None)
+    return predictions, sigma
+
+
+class MonthForecast:
+    """
+    Month-to-date actuals and month-end projections per (service, project)
+    """
+
+    def __init__(self, month, keys, actual, projection, variance):
+        self.month = month
+        self.keys = keys
+        self.actual = actual
+        self.projection = projection
+        self.variance = variance
+
+    def _bounds(self, actual, projection, variance):
+        margin = CONFIDENCE_Z * np.sqrt(variance)
+        return float(max(projection - margin, actual)), float(projection + margin)
+
+    def total(self):
+        """
+        (actual, projection, lower bound, upper bound) across all series
+        """
+        actual = float(self.actual.sum())
+        projection = float(self.projection.sum())
+        return (actual, projection, *self._bounds(actual, projection, float(self.variance.sum())))
+
+    def by_service(self):
+        """
+        {service: (actual, projection, lower bound, upper bound)}; series
+        errors are treated as independent when combining projects
+        """
+        totals = {}
+        for (service, _), actual, projection, variance in zip(self.keys, self.actual, self.projection, self.variance):
+            sums = totals.setdefault(service, [0.0, 0.0, 0.0])
+            sums[0] += actual
+            sums[1] += projection
+            sums[2] += variance
+        return {
+            service: (actual, projection, *self._bounds(actual, projection, variance))
+            for service, (actual, projection, variance) in totals.items()
+        }
+
+
+def load_history(db: Session, start, end):
+    """
+    Daily costs per (service, project) for [start, end] from the rollup, as
+    (keys, series x days matrix)
+    """
+    rows = db.query(
+        models.CostRollup.date,
+        models.CostRollup.service,
+        models.CostRollup.project,
+        func.sum(models.CostRollup.cost)
+    ).filter(
+        models.CostRollup.date >= start,
+        models.CostRollup.date <= end
+    ).group_by(
+        models.CostRollup.date,
+        models.CostRollup.service,
+        models.CostRollup.project
+    ).all()
+
+    index = {}
+    series = []
+    offsets = []
+    costs = []
+    for day, service, project, cost in rows:
+        series.append(index.setdefault((service, project), len(index)))
+        offsets.append((day - start).days)
+        costs.append(cost or 0)
+
+    history = np.zeros((len(index), (end - start).days + 1))
+    np.add.at(history, (np.array(series, dtype=int), np.array(offsets, dtype=int)), costs)
+    return list(index), history
+
+
+def forecast_month(db: Session, today=None):
+    """
+    Forecast month-end spend for every (service, project) with costs in the
+    last FORECAST_HISTORY_DAYS days. Days up to `today` count as actuals.
+    """
+    today = today or date.today()
+    month = today.replace(day=1)
+    window_start = min(month, today - timedelta(days=FORECAST_HISTORY_DAYS - 1))
+    keys, history = load_history(db, window_start, today)
+
+    month_offset = (month - window_start).days
+    actual = history[:, month_offset:].sum(axis=1)
+    future_dates = [
+        today + timedelta(days=offset)
+        for offset in range(1, days_in_month(today) - today.day + 1)
+    ]
+
+    # Fit each series from its own first active day, not the window's: a
+    # series that began last week would otherwise be fitted as weeks of
+    # zeros followed by its real costs. Series starting on the same day
+    # share a design matrix and are solved together.
+    active = history != 0
+    first_days = np.where(active.any(axis=1), active.argmax(axis=1), month_offset)
+    predictions = np.zeros((len(keys), len(future_dates)))
+    sigma = np.zeros(len(keys))
+    for first_day in np.unique(first_days):
+        rows = np.flatnonzero(first_days == first_day)
+        predictions[rows], sigma[rows] = fit_series(
+            history[rows, first_day:], window_start + timedelta(days=int(first_day)), future_dates
+        )
+
+    return MonthForecast(
+        month,
+        keys,
+        actual,
+        actual + predictions.sum(axis=1),
+        sigma ** 2 * len(future_dates)
+    )
+
+
+def database_key(db: Session):
+    """
+    The database `db` is bound to, the same for its sync and async drivers
+    """
+    url = db.get_bind().url
+    return url.set(drivername=url.get_backend_name()).render_as_string()
+
+
+class ForecastCache:
+    """
+    Holds the current month's forecast per database until costs are
+    written, the day changes or FORECAST_CACHE_TTL passes
+    """
+
+    def __init__(self, ttl=FORECAST_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # database -> (day, expires at, forecast)
+        self.generation = 0
+
+    def cached(self, db: Session, today=None):
+        """
+        The cached forecast for `db` and `today` if there is a fresh one, else None
+        """
+        today = today or date.today()
+        with self._lock:
+            entry = self._entries.get(database_key(db))
+        if entry is not None and entry[0] == today and entry[1] > time.monotonic():
+            return entry[2]
+        return None
+
+    def get(self, db: Session, today=None):
+        today = today or date.today()
+        with self._lock:
+            generation = self.generation
+        forecast = self.cached(db, today)
+        if forecast is not None:
+            return forecast
+
+        forecast = forecast_month(db, today)
+        with self._lock:
+            # Don't keep a forecast computed across a write
+            if generation == self.generation:
+                self._entries[database_key(db)] = (today, time.monotonic() + self.ttl, forecast)
+        return forecast
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+
+forecast_cache = ForecastCache()
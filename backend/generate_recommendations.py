@@ -1,117 +1,273 @@
 """
 Generate cost optimization recommendations based on spending patterns
+
+Recommendations are keyed by (rule, service, provider) and upserted, so
+regenerating never duplicates them and keeps applied or ignored ones.
+Ingestion marks the (service, provider) groups it writes as dirty; a
+regeneration only recomputes those groups plus the account-wide rules,
+and does a full pass when no recommendations have been stored yet.
 """
+import math
 from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, or_
 from datetime import datetime, timedelta
 from . import models
+from .rollup import upsert_increments
+
+RULE_IDLE = "idle"
+RULE_RIGHTSIZE = "rightsize"
+RULE_RESERVED = "reserved"
+RULE_MULTI_CLOUD = "multi_cloud"
+RULE_DEV_SCHEDULE = "dev_schedule"
+
+# Rules evaluated per (service, provider) and across all spend
+GROUP_RULES = (RULE_IDLE, RULE_RIGHTSIZE, RULE_RESERVED)
+GLOBAL_RULES = (RULE_MULTI_CLOUD, RULE_DEV_SCHEDULE)
 
-def generate_recommendations(db: Session):
+def _summarize(total, total_squared, count):
+    mean = total / count if count else 0
+    variance = max(total_squared / count - mean * mean, 0) if count else 0
+    return {
+        'total': total,
+        'total_squared': total_squared,
+        'count': count,
+        'mean': mean,
+        'stddev': math.sqrt(variance),
+    }
+
+def mark_groups_dirty(db: Session, entries):
     """
-    Analyze spending data and generate optimization recommendations
+    Record the (service, provider) groups of written cost entry dicts so the
+    next regeneration recomputes them. The caller commits.
     """
-    recommendations = []
-    
-    # Get spending data from the last 30 days
-    thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-    costs = db.query(models.CostEntry).filter(
-        models.CostEntry.date >= thirty_days_ago
+    groups = {(entry["service"], entry["provider"]) for entry in entries}
+    if not groups:
+        return
+
+    rows = [{"service": service, "provider": provider, "version": 1} for service, provider in groups]
+    upsert_increments(db, models.DirtyCostGroup, ("service", "provider"), ("version",), rows)
+
+def spending_statistics(db: Session, since, groups=None):
+    """
+    Per (service, provider, environment) sum, count, mean and standard
+    deviation of line item costs since `since`, in one grouped rollup query.
+    `groups` restricts it to a set of (service, provider) pairs.
+    """
+    query = db.query(
+        models.CostRollup.service,
+        models.CostRollup.provider,
+        models.CostRollup.environment,
+        func.sum(models.CostRollup.cost),
+        func.sum(models.CostRollup.cost_squared),
+        func.sum(models.CostRollup.row_count)
+    ).filter(
+        models.CostRollup.date >= since
+    )
+    if groups is not None:
+        query = query.filter(
+            models.CostRollup.service.in_({service for service, _ in groups}),
+            models.CostRollup.provider.in_({provider for _, provider in groups})
+        )
+    rows = query.group_by(
+        models.CostRollup.service, models.CostRollup.provider, models.CostRollup.environment
     ).all()
-    
-    if not costs:
-        return recommendations
-    
-    # Analyze by service
-    service_costs = {}
-    for cost in costs:
-        key = (cost.service, cost.provider)
-        if key not in service_costs:
-            service_costs[key] = []
-        service_costs[key].append(cost.cost)
-    
-    # Generate recommendations based on patterns
-    for (service, provider), cost_list in service_costs.items():
-        avg_cost = sum(cost_list) / len(cost_list)
-        total_cost = sum(cost_list)
-        
-        # Recommendation 1: Idle Resources (very low average cost)
-        if avg_cost < 5 and total_cost > 0:
-            recommendations.append({
-                'title': f'Remove Idle {service} Resources',
-                'description': f'Your {service} service on {provider} has minimal usage. Consider removing or consolidating these resources to save costs.',
-                'estimated_savings': total_cost * 0.8,  # 80% savings
-                'service': service,
-                'provider': provider
-            })
-        
-        # Recommendation 2: Underutilized Services (moderate cost but could be optimized)
-        elif 5 <= avg_cost < 50:
-            recommendations.append({
-                'title': f'Right-size {service} Instances',
-                'description': f'Your {service} service on {provider} appears underutilized. Consider downsizing to a smaller instance type.',
-                'estimated_savings': total_cost * 0.3,  # 30% savings
-                'service': service,
-                'provider': provider
-            })
-        
-        # Recommendation 3: Reserved Instances for consistent workloads
-        elif avg_cost >= 50 and len(cost_list) >= 25:  # Consistent usage
-            recommendations.append({
-                'title': f'Use Reserved Instances for {service}',
-                'description': f'Your {service} service on {provider} has consistent usage. Switch to reserved instances for up to 40% savings.',
-                'estimated_savings': total_cost * 0.4,  # 40% savings
-                'service': service,
-                'provider': provider
-            })
-    
+
+    return {
+        (service, provider, environment): _summarize(total or 0, total_squared or 0, count or 0)
+        for service, provider, environment, total, total_squared, count in rows
+        if groups is None or (service, provider) in groups
+    }
+
+def spending_totals(db: Session, since):
+    """
+    Total cost per (provider, environment) since `since`, for the rules
+    that look at all spend at once
+    """
+    rows = db.query(
+        models.CostRollup.provider,
+        models.CostRollup.environment,
+        func.sum(models.CostRollup.cost)
+    ).filter(
+        models.CostRollup.date >= since
+    ).group_by(
+        models.CostRollup.provider, models.CostRollup.environment
+    ).all()
+    return {(provider, environment): total or 0 for provider, environment, total in rows}
+
+def group_recommendation(service, provider, stats):
+    """
+    The recommendation, if any, for one (service, provider) group
+    """
+    total_cost = stats['total']
+    entry_count = stats['count']
+    avg_cost = stats['mean']
+
+    # Recommendation 1: Idle Resources (very low average cost)
+    if avg_cost < 5 and total_cost > 0:
+        return {
+            'rule': RULE_IDLE,
+            'title': f'Remove Idle {service} Resources',
+            'description': f'Your {service} service on {provider} has minimal usage. Consider removing or consolidating these resources to save costs.',
+            'estimated_savings': total_cost * 0.8,  # 80% savings
+            'service': service,
+            'provider': provider
+        }
+
+    # Recommendation 2: Underutilized Services (moderate cost but could be optimized)
+    if 5 <= avg_cost < 50:
+        return {
+            'rule': RULE_RIGHTSIZE,
+            'title': f'Right-size {service} Instances',
+            'description': f'Your {service} service on {provider} appears underutilized. Consider downsizing to a smaller instance type.',
+            'estimated_savings': total_cost * 0.3,  # 30% savings
+            'service': service,
+            'provider': provider
+        }
+
+    # Recommendation 3: Reserved Instances for consistent workloads
+    if avg_cost >= 50 and entry_count >= 25:  # Consistent usage
+        return {
+            'rule': RULE_RESERVED,
+            'title': f'Use Reserved Instances for {service}',
+            'description': f'Your {service} service on {provider} has consistent usage. Switch to reserved instances for up to 40% savings.',
+            'estimated_savings': total_cost * 0.4,  # 40% savings
+            'service': service,
+            'provider': provider
+        }
+    return None
+
+def global_recommendations(totals):
+    """
+    Recommendations across all spend, from {(provider, environment): total}
+    """
+    recommendations = []
+    providers_used = {provider for provider, _ in totals}
+    dev_totals = [total for (_, environment), total in totals.items() if environment == 'Development']
+
     # Recommendation 4: Multi-region optimization
-    providers_used = set(cost.provider for cost in costs)
     if len(providers_used) > 1:
-        total_multi_cloud_cost = sum(cost.cost for cost in costs)
         recommendations.append({
+            'rule': RULE_MULTI_CLOUD,
             'title': 'Consolidate Multi-Cloud Resources',
             'description': f'You are using {len(providers_used)} cloud providers. Consider consolidating resources to a single provider for volume discounts.',
-            'estimated_savings': total_multi_cloud_cost * 0.15,  # 15% savings
+            'estimated_savings': sum(totals.values()) * 0.15,  # 15% savings
             'service': 'Multi-Cloud',
             'provider': 'All'
         })
-    
+
     # Recommendation 5: Development environment optimization
-    dev_costs = [cost for cost in costs if cost.environment == 'Development']
-    if dev_costs:
-        dev_total = sum(cost.cost for cost in dev_costs)
+    if dev_totals:
         recommendations.append({
+            'rule': RULE_DEV_SCHEDULE,
             'title': 'Optimize Development Environments',
             'description': 'Development environments are running 24/7. Implement auto-shutdown during non-business hours to save costs.',
-            'estimated_savings': dev_total * 0.5,  # 50% savings
+            'estimated_savings': sum(dev_totals) * 0.5,  # 50% savings
             'service': 'Development',
             'provider': 'All'
         })
-    
+
     return recommendations
 
-def create_recommendations_in_db(db: Session):
+def generate_recommendations(db: Session, groups=None):
     """
-    Generate and store recommendations in the database
+    Analyze spending data and generate optimization recommendations.
+    With `groups`, only those (service, provider) pairs are analyzed,
+    plus the account-wide rules.
     """
-    # Check if recommendations already exist
-    existing = db.query(models.Optimization).filter(
-        models.Optimization.status == 'pending'
-    ).count()
-    
-    if existing > 0:
-        return  # Don't generate duplicates
-    
-    recommendations = generate_recommendations(db)
-    
-    for rec in recommendations:
-        optimization = models.Optimization(
-            title=rec['title'],
-            description=rec['description'],
-            estimated_savings=rec['estimated_savings'],
-            service=rec['service'],
-            provider=rec['provider'],
-            status='pending'
-        )
-        db.add(optimization)
-    
+    # Get spending statistics from the last 30 days of the rollup
+    thirty_days_ago = (datetime.now() - timedelta(days=30)).date()
+    statistics = spending_statistics(db, thirty_days_ago, groups)
+
+    # Fold the environment groups into per-service totals in a single pass
+    service_sums = {}
+    totals = {}
+    for (service, provider, environment), stats in statistics.items():
+        sums = service_sums.setdefault((service, provider), [0.0, 0.0, 0])
+        sums[0] += stats['total']
+        sums[1] += stats['total_squared']
+        sums[2] += stats['count']
+        totals[(provider, environment)] = totals.get((provider, environment), 0) + stats['total']
+
+    recommendations = []
+    for (service, provider), sums in service_sums.items():
+        recommendation = group_recommendation(service, provider, _summarize(*sums))
+        if recommendation:
+            recommendations.append(recommendation)
+
+    # The account-wide rules need every group's spend, not just the dirty ones
+    if groups is not None:
+        totals = spending_totals(db, thirty_days_ago)
+    recommendations.extend(global_recommendations(totals))
+
+    return recommendations
+
+def create_recommendations_in_db(db: Session, full=False):
+    """
+    Generate recommendations and upsert them by (rule, service, provider).
+
+    Only groups marked dirty by ingestion are recomputed unless `full` is
+    set or nothing has been stored yet. Pending recommendations are updated
+    or removed when their rule no longer applies; applied and ignored ones
+    are left as they are. Returns counts of the changes made.
+    """
+    dirty = db.query(
+        models.DirtyCostGroup.id,
+        models.DirtyCostGroup.service,
+        models.DirtyCostGroup.provider,
+        models.DirtyCostGroup.version
+    ).all()
+    if not full:
+        full = db.query(models.Optimization.id).filter(models.Optimization.rule.isnot(None)).first() is None
+    summary = {"full": full, "groups": len(dirty), "created": 0, "updated": 0, "removed": 0}
+    if not full and not dirty:
+        return summary
+
+    groups = None if full else {(service, provider) for _, service, provider, _ in dirty}
+    desired = {
+        (rec['rule'], rec['service'], rec['provider']): rec
+        for rec in generate_recommendations(db, groups)
+    }
+
+    # Stored recommendations that this run is responsible for
+    existing = db.query(models.Optimization).filter(models.Optimization.rule.isnot(None))
+    if groups is not None:
+        existing = existing.filter(or_(
+            models.Optimization.rule.in_(GLOBAL_RULES),
+            and_(
+                models.Optimization.rule.in_(GROUP_RULES),
+                models.Optimization.service.in_({service for service, _ in groups}),
+                models.Optimization.provider.in_({provider for _, provider in groups})
+            )
+        ))
+
+    for optimization in existing:
+        key = (optimization.rule, optimization.service, optimization.provider)
+        if optimization.rule in GROUP_RULES and groups is not None and key[1:] not in groups:
+            continue
+        rec = desired.pop(key, None)
+        if optimization.status != 'pending':
+            continue
+        if rec is None:
+            db.delete(optimization)
+            summary["removed"] += 1
+        elif (optimization.title, optimization.description) != (rec['title'], rec['description']) or not math.isclose(
+            optimization.estimated_savings or 0, rec['estimated_savings'], rel_tol=1e-9
+        ):
+            optimization.title = rec['title']
+            optimization.description = rec['description']
+            optimization.estimated_savings = rec['estimated_savings']
+            summary["updated"] += 1
+
+    for rec in desired.values():
+        db.add(models.Optimization(**rec, status='pending'))
+        summary["created"] += 1
+
+    # Clear only the marks this run has seen; later writes bump the version
+    for dirty_id, _, _, version in dirty:
+        db.query(models.DirtyCostGroup).filter(
+            models.DirtyCostGroup.id == dirty_id,
+            models.DirtyCostGroup.version == version
+        ).delete(synchronize_session=False)
+
     db.commit()
+    return summary
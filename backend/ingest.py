@@ -0,0 +1,135 @@
+"""
+Bulk ingestion of cost entries
+
+Rows are written with executemany-style core inserts in chunked
+transactions, and the daily rollup is updated in the same transaction as
+each chunk. Committed chunks are broadcast to live dashboards.
+"""
+import math
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session
+from . import models
+from .rollup import apply_entries, apply_deltas, ROLLUP_KEYS
+from .anomalies import observe_entries
+from .generate_recommendations import mark_groups_dirty
+from .events import publish_cost_changes
+from .cache import response_cache
+from .forecasting import forecast_cache
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def publish_committed(rows):
+    """
+    Drop the cached forecast and responses, then tell subscribers about the
+    committed rows; in the other order a client refetching on the event
+    could be served the stale cached body
+    """
+    forecast_cache.invalidate()
+    response_cache.invalidate()
+    publish_cost_changes(rows)
+
+
+def insert_chunk(db: Session, rows):
+    """
+    Insert one chunk of validated cost entry dicts and commit it
+    """
+    if not rows:
+        return 0
+    db.execute(insert(models.CostEntry), rows)
+    apply_entries(db, rows)
+    observe_entries(db, rows)
+    mark_groups_dirty(db, rows)
+    db.commit()
+    publish_committed(rows)
+    return len(rows)
+
+
+def ingest_entries(db: Session, entries, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Insert an iterable of validated cost entry dicts in chunks.
+    Returns the number of rows inserted.
+    """
+    inserted = 0
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            inserted += insert_chunk(db, chunk)
+            chunk = []
+    inserted += insert_chunk(db, chunk)
+    return inserted
+
+
+def upsert_chunk(db: Session, rows):
+    """
+    Insert or update one chunk of cost entry dicts keyed on
+    (provider, service, date, project, environment) and commit it.
+    Rows sharing a key within the chunk are summed. A reported cost replaces
+    everything stored for its key: when several line items exist they are
+    collapsed into one row holding the new total.
+    """
+    if not rows:
+        return 0
+
+    incoming = {}
+    for row in rows:
+        key = tuple(row[field] for field in ROLLUP_KEYS)
+        if key in incoming:
+            incoming[key] = dict(incoming[key], cost=incoming[key]["cost"] + row["cost"])
+        else:
+            incoming[key] = row
+
+    # Load the existing rows that could share a key with this chunk in one query
+    existing = {}  # key -> [ids, cost, cost_squared]
+    providers = {row["provider"] for row in incoming.values()}
+    services = {row["service"] for row in incoming.values()}
+    dates = [row["date"] for row in incoming.values()]
+    matches = db.query(
+        models.CostEntry.id,
+        models.CostEntry.cost,
+        *[getattr(models.CostEntry, field) for field in ROLLUP_KEYS]
+    ).filter(
+        models.CostEntry.provider.in_(providers),
+        models.CostEntry.service.in_(services),
+        models.CostEntry.date >= min(dates),
+        models.CostEntry.date <= max(dates)
+    ).order_by(models.CostEntry.id)
+    for entry_id, cost, *key in matches:
+        cost = cost or 0
+        stored = existing.setdefault(tuple(key), [[], 0.0, 0.0])
+        stored[0].append(entry_id)
+        stored[1] += cost
+        stored[2] += cost * cost
+
+    inserts = []
+    updates = []
+    removed = []
+    deltas = {}
+    changes = []
+    for key, row in incoming.items():
+        if key in existing:
+            ids, old_cost, old_squared = existing[key]
+            if math.isclose(row["cost"], old_cost, abs_tol=1e-9):
+                continue
+            updates.append({"id": ids[0], "cost": row["cost"]})
+            removed.extend(ids[1:])
+            deltas[key] = (row["cost"] - old_cost, row["cost"] ** 2 - old_squared, 1 - len(ids))
+            changes.append(dict(row, cost=row["cost"] - old_cost))
+        else:
+            inserts.append(row)
+            changes.append(row)
+
+    if inserts:
+        db.execute(insert(models.CostEntry), inserts)
+        apply_entries(db, inserts)
+    if updates:
+        db.execute(update(models.CostEntry), updates)
+        apply_deltas(db, deltas)
+    if removed:
+        db.execute(delete(models.CostEntry).where(models.CostEntry.id.in_(removed)))
+    observe_entries(db, changes)
+    mark_groups_dirty(db, changes)
+    db.commit()
+    publish_committed(changes)
+    return len(inserts) + len(updates)
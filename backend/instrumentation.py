@@ -0,0 +1,305 @@
+"""
+Opt-in request instrumentation and Prometheus-style metrics
+
+With INSTRUMENTATION_ENABLED=true every request records its latency, the
+number and duration of SQL statements it ran, the result rows it fetched
+(entities, column tuples and aggregates alike) and the time spent
+serializing its response, all labelled by route template. `GET /metrics`
+exposes them in the Prometheus text format, so a route that loads whole
+tables or issues a query per row stands out by its query and row counts.
+
+PROFILE_SAMPLE_RATE (0-1) profiles that fraction of requests with cProfile,
+and a request sent with `X-Profile: 1` is always profiled; each profile is
+written to PROFILE_DIR as a pstats file named after its route.
+"""
+import cProfile
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000)
+
+# Streams stay open for as long as the client is connected, so their
+# duration says nothing about performance
+UNTIMED_CONTENT_TYPES = (b"text/event-stream",)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route"), LATENCY_BUCKETS
+)
+requests_total = Counter("http_requests_total", "Requests by route and status code", ("method", "route", "status"))
+request_queries = Histogram(
+    "db_queries_per_request", "SQL statements executed per request", ("method", "route"), COUNT_BUCKETS
+)
+query_duration = Histogram(
+    "db_query_duration_seconds", "Duration of individual SQL statements by route", ("route",), LATENCY_BUCKETS
+)
+request_rows = Histogram(
+    "rows_materialized_per_request", "Result rows fetched from SELECTs per request", ("method", "route"), COUNT_BUCKETS
+)
+serialization_duration = Histogram(
+    "response_serialization_seconds", "Time spent validating and encoding response bodies",
+    ("method", "route"), LATENCY_BUCKETS
+)
+profiles_written = Counter("profiles_written_total", "Request profiles dumped to PROFILE_DIR", ("route",))
+METRICS = (request_duration, requests_total, request_queries, query_duration, request_rows,
+           serialization_duration, profiles_written)
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "rows", "serialization")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.rows = 0
+        self.serialization = 0.0
+
+    @property
+    def route(self):
+        """
+        The matched route template, e.g. /jobs/{job_id}, once routing has run
+        """
+        return getattr(self.scope.get("route"), "path", None) or "unmatched"
+
+
+# Shared by reference with the threads and greenlets a request's work runs in
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        query_duration.observe(elapsed, stats.route)
+    else:
+        query_duration.observe(elapsed, "background")
+
+
+def _count_rows(orm_execute_state):
+    """
+    Buffer a request's SELECT results to count their rows. Loading ORM
+    entities is only one way to materialize a table; column tuples and
+    aggregates never fire the mapper `load` event.
+    """
+    stats = current_request.get()
+    if stats is None or not orm_execute_state.is_select:
+        return None
+    frozen = orm_execute_state.invoke_statement().freeze()
+    stats.rows += len(frozen.data)
+    return frozen()
+
+
+def install_sql_events():
+    """
+    Count and time every statement on every engine, and count the rows of
+    every session SELECT
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Session, "do_orm_execute", _count_rows)
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Attribute the enclosed work to the current request's serialization time
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.serialization += time.perf_counter() - start
+
+
+def _time_fastapi_serialization():
+    """
+    Wrap FastAPI's response_model validation and encoding in the
+    serialization timer
+    """
+    from fastapi import routing
+
+    serialize_response = routing.serialize_response
+    if getattr(serialize_response, "instrumented", False):
+        return
+
+    async def timed_serialize_response(*args, **kwargs):
+        with serialization_timer():
+            return await serialize_response(*args, **kwargs)
+
+    timed_serialize_response.instrumented = True
+    routing.serialize_response = timed_serialize_response
+
+
+_profile_lock = threading.Lock()
+
+
+def _profile_path(method, route):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{method}-{slug}.prof")
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware recording per-route metrics, and profiling sampled requests
+    """
+
+    def __init__(self, app, sample_rate=PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = {"code": 500, "timed": True}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                status["timed"] = not content_type.startswith(UNTIMED_CONTENT_TYPES)
+            await send(message)
+
+        profiler = None
+        forced = (b"x-profile", b"1") in scope.get("headers", ())
+        if (forced or (self.sample_rate and random.random() < self.sample_rate)) and _profile_lock.acquire(blocking=False):
+            # cProfile hooks the whole thread, so only one request is profiled at a time
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            current_request.reset(token)
+
+            route = stats.route
+            method = scope["method"]
+            if profiler is not None:
+                try:
+                    profiler.dump_stats(_profile_path(method, route))
+                    profiles_written.inc(route)
+                finally:
+                    _profile_lock.release()
+
+            requests_total.inc(method, route, str(status["code"]))
+            if status["timed"]:
+                request_duration.observe(elapsed, method, route)
+            request_queries.observe(stats.queries, method, route)
+            request_rows.observe(stats.rows, method, route)
+            serialization_duration.observe(stats.serialization, method, route)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_endpoint():
+    """
+    Request, SQL and serialization metrics in the Prometheus text format
+    """
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def instrument_app(app):
+    """
+    Add the middleware, SQL event hooks and `GET /metrics` to `app`
+    """
+    install_sql_events()
+    _time_fastapi_serialization()
+    app.add_middleware(InstrumentationMiddleware)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -1,12 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
-from .routers import costs, alerts, budget, optimization
+from .database import SessionLocal
+from .routers import costs, alerts, budget, optimization, jobs, events
+from .rollup import ensure_rollups
+from .anomalies import ensure_anomaly_states
+from .migrations import init_db
+from .cache import response_cache
+from .spend import spend_summary
+from .scheduler import scheduler
+from .instrumentation import INSTRUMENTATION_ENABLED, instrument_app
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Create tables and migrate existing ones
+init_db()
 
-app = FastAPI(title="Cloud Cost Insight API")
+# Backfill the cost rollup and anomaly statistics for databases created before they existed
+with SessionLocal() as db:
+    ensure_rollups(db)
+    ensure_anomaly_states(db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Run fetches, rollup refreshes, recommendations and compaction off the request path
+    scheduler.start()
+    yield
+    scheduler.stop()
+
+app = FastAPI(title="Cloud Cost Insight API", lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -15,13 +35,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Per-route latency, SQL and serialization metrics on GET /metrics
+if INSTRUMENTATION_ENABLED:
+    instrument_app(app)
+
 app.include_router(costs.router)
 app.include_router(alerts.router)
 app.include_router(budget.router)
 app.include_router(optimization.router)
+app.include_router(jobs.router)
+app.include_router(events.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Cloud Cost Insight API"}
+
+@app.get("/cache/stats")
+def read_cache_stats():
+    return dict(response_cache.stats(), spend_summary=spend_summary.stats())
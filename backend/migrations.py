@@ -0,0 +1,182 @@
+"""
+Schema migrations for existing databases
+
+`Base.metadata.create_all` only creates missing tables, so columns and
+indexes added to existing tables are applied here. Every step is
+idempotent and runs at startup.
+"""
+from sqlalchemy import inspect, text
+from .database import Base, engine as default_engine
+from . import models
+
+# Indexes superseded by composite ones; the planner would otherwise pick
+# them to avoid a sort and then read every matching row from the table
+OBSOLETE_INDEXES = [
+    ("cost_rollups", "ix_cost_rollups_service"),
+    ("cost_rollups", "ix_cost_rollups_provider"),
+    # Replaced by ix_cost_rollups_date_covering, which also covers project
+    ("cost_rollups", "ix_cost_rollups_covering"),
+]
+
+# (table, column) pairs stored as strings before they became DATE columns
+DATE_COLUMNS = [
+    ("cost_entries", "date"),
+    ("cost_rollups", "date"),
+    ("sync_states", "last_synced_date"),
+]
+
+# PRAGMA user_version of a SQLite database whose date columns have been
+# normalized, so the full-table UPDATE runs once rather than at every start
+SQLITE_DATES_NORMALIZED_VERSION = 1
+
+# Columns added to existing tables: (table, column, DDL type)
+ADDED_COLUMNS = [
+    ("optimizations", "rule", "VARCHAR"),
+    ("optimizations", "updated_at", "TIMESTAMP"),
+    ("budgets", "project", "VARCHAR"),
+    ("budgets", "environment", "VARCHAR"),
+    ("budgets", "provider", "VARCHAR"),
+    ("budgets", "period", "VARCHAR"),
+    ("alert_thresholds", "series_daily_amount", "FLOAT"),
+]
+
+# Recommendation rules by the title prefix they were stored with before
+# optimizations carried a rule
+RULE_TITLE_PREFIXES = [
+    ("idle", "Remove Idle "),
+    ("rightsize", "Right-size "),
+    ("reserved", "Use Reserved Instances"),
+    ("multi_cloud", "Consolidate Multi-Cloud"),
+    ("dev_schedule", "Optimize Development"),
+]
+
+
+def _migrate_date_columns(connection):
+    """
+    Convert string date columns to DATE. SQLite has no column types to
+    change, so values are only normalized to YYYY-MM-DD, which is what the
+    SQLAlchemy Date type reads and writes there; the database's
+    user_version records that this was done.
+    """
+    is_sqlite = connection.dialect.name == "sqlite"
+    if is_sqlite and connection.execute(text("PRAGMA user_version")).scalar() >= SQLITE_DATES_NORMALIZED_VERSION:
+        return
+
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    for table, column in DATE_COLUMNS:
+        if table not in tables:
+            continue
+        if is_sqlite:
+            connection.execute(text(
+                f"UPDATE {table} SET {column} = substr({column}, 1, 10) WHERE length({column}) > 10"
+            ))
+            continue
+
+        column_type = next(
+            (c["type"] for c in inspector.get_columns(table) if c["name"] == column), None
+        )
+        if column_type is not None and column_type.python_type is str:
+            connection.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE DATE USING CAST({column} AS DATE)"
+            ))
+
+    if is_sqlite:
+        connection.execute(text(f"PRAGMA user_version = {SQLITE_DATES_NORMALIZED_VERSION}"))
+
+
+def _drop_obsolete_indexes(connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table, name in OBSOLETE_INDEXES:
+        if table in tables and any(index["name"] == name for index in inspector.get_indexes(table)):
+            connection.execute(text(f"DROP INDEX {name}"))
+
+
+def _add_missing_columns(connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table, column, ddl_type in ADDED_COLUMNS:
+        if table not in tables:
+            continue
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _backfill_optimization_rules(connection):
+    """
+    Derive the rule of recommendations stored without one from their title,
+    then drop duplicates per (rule, service, provider) so the unique index
+    can be created. An applied or ignored row is kept over a pending one.
+    """
+    for rule, prefix in RULE_TITLE_PREFIXES:
+        connection.execute(
+            text("UPDATE optimizations SET rule = :rule WHERE rule IS NULL AND title LIKE :pattern"),
+            {"rule": rule, "pattern": prefix + "%"}
+        )
+
+    keep = {}
+    duplicates = []
+    rows = connection.execute(text(
+        "SELECT id, rule, service, provider, status FROM optimizations "
+        "WHERE rule IS NOT NULL ORDER BY id DESC"
+    ))
+    for row_id, rule, service, provider, status in rows:
+        key = (rule, service, provider)
+        if key not in keep:
+            keep[key] = (row_id, status)
+        elif keep[key][1] == "pending" and status != "pending":
+            duplicates.append(keep[key][0])
+            keep[key] = (row_id, status)
+        else:
+            duplicates.append(row_id)
+    for row_id in duplicates:
+        connection.execute(text("DELETE FROM optimizations WHERE id = :id"), {"id": row_id})
+
+
+def _dedupe_active_jobs(connection):
+    """
+    Fail all but the newest queued or running run of each job so the
+    partial unique index on active job names can be created
+    """
+    if "jobs" not in inspect(connection).get_table_names():
+        return
+    connection.execute(text(
+        "UPDATE jobs SET status = 'failed', error = 'Superseded by a newer run' "
+        "WHERE status IN ('queued', 'running') AND id NOT IN ("
+        "SELECT MAX(id) FROM jobs WHERE status IN ('queued', 'running') GROUP BY name)"
+    ))
+
+
+def create_table_indexes(connection, table):
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def _create_missing_indexes(connection):
+    for table in Base.metadata.sorted_tables:
+        create_table_indexes(connection, table)
+
+
+def run_migrations(engine=default_engine):
+    with engine.begin() as connection:
+        _migrate_date_columns(connection)
+        _add_missing_columns(connection)
+        _backfill_optimization_rules(connection)
+        _dedupe_active_jobs(connection)
+        _drop_obsolete_indexes(connection)
+        _create_missing_indexes(connection)
+
+
+def init_db(engine=default_engine):
+    """
+    Create missing tables and bring existing ones up to date
+    """
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Database schema is up to date.")
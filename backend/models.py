@@ -1,39 +1,172 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index, JSON, Text, UniqueConstraint, text
 from sqlalchemy.sql import func
 from .database import Base
 
 class CostEntry(Base):
     __tablename__ = "cost_entries"
+    __table_args__ = (
+        # Keyset pagination and date-range scans
+        Index("ix_cost_entries_date_id", "date", "id"),
+        # Date-range aggregates by service/provider without touching the table
+        Index("ix_cost_entries_date_service_provider_cost", "date", "service", "provider", "cost"),
+        # Upsert lookups from the fetch pipeline
+        Index("ix_cost_entries_provider_service_date", "provider", "service", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     service = Column(String, index=True)
     provider = Column(String, index=True)
     cost = Column(Float)
-    date = Column(String, index=True)
+    date = Column(Date, index=True)
     project = Column(String, index=True, default="Main Project")
     environment = Column(String, index=True, default="Production")
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+class CostRollup(Base):
+    """
+    Daily cost totals per (date, provider, service, project, environment),
+    maintained incrementally as cost entries are written
+    """
+    __tablename__ = "cost_rollups"
+    __table_args__ = (
+        UniqueConstraint("date", "provider", "service", "project", "environment", name="uq_cost_rollups_key"),
+        # Covers the budget, forecast and recommendation aggregates (index-only scans)
+        Index(
+            "ix_cost_rollups_date_covering",
+            "date", "service", "provider", "environment", "project", "cost", "cost_squared", "row_count"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date, index=True)
+    provider = Column(String)
+    service = Column(String)
+    project = Column(String)
+    environment = Column(String)
+    cost = Column(Float, default=0)
+    cost_squared = Column(Float, default=0)  # Sum of squared line item costs, for variance
+    row_count = Column(Integer, default=0)
+
+class SyncState(Base):
+    """
+    Per-provider watermark of the last successful cost fetch
+    """
+    __tablename__ = "sync_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String, unique=True, index=True)
+    last_synced_date = Column(Date)  # Exclusive end date of the last successful fetch
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class AnomalyState(Base):
+    """
+    Running daily cost statistics per (service, project), updated as cost
+    entries are ingested
+    """
+    __tablename__ = "anomaly_states"
+    __table_args__ = (
+        UniqueConstraint("service", "project", name="uq_anomaly_states_series"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    service = Column(String)
+    project = Column(String)
+    last_date = Column(Date)  # Day currently being accumulated
+    day_total = Column(Float, default=0)
+    mean = Column(Float, default=0)  # EWMA of closed daily totals
+    variance = Column(Float, default=0)  # EW variance of closed daily totals
+    days = Column(Integer, default=0)  # Number of closed days folded in
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class CostAlert(Base):
+    """
+    A (service, project) day whose spend breached the alert threshold or
+    spiked above its running average, or a day whose total across every
+    series breached the account-wide threshold (no service or project)
+    """
+    __tablename__ = "cost_alerts"
+    __table_args__ = (
+        UniqueConstraint("service", "project", "date", "kind", name="uq_cost_alerts_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    service = Column(String)
+    project = Column(String)
+    date = Column(Date, index=True)
+    kind = Column(String)  # threshold, spike, daily_total
+    amount = Column(Float)  # Day total so far
+    expected = Column(Float)  # Threshold or running average
+    score = Column(Float, nullable=True)  # Standard deviations above the average (spikes)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class Job(Base):
+    """
+    A background job run by the scheduler
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # De-duplication of queued/running jobs and last-run lookups
+        Index("ix_jobs_name_status", "name", "status"),
+        Index("ix_jobs_name_created_at", "name", "created_at"),
+        # At most one queued or running run per job; enqueue relies on it
+        Index(
+            "uq_jobs_active_name", "name", unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    trigger = Column(String)  # schedule, manual
+    status = Column(String, default="queued")  # queued, running, succeeded, failed
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+
 class AlertThreshold(Base):
     __tablename__ = "alert_thresholds"
 
     id = Column(Integer, primary_key=True, index=True)
-    amount = Column(Float)
+    amount = Column(Float)  # Account-wide spend threshold shown on the dashboard
+    # Daily limit per (service, project) for ingest-time alerts; None disables them
+    series_daily_amount = Column(Float, nullable=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
 class Budget(Base):
+    """
+    A monthly budget. Unset project, environment and provider mean "all";
+    an unset period (YYYY-MM) makes it recurring, and a budget for a
+    specific month overrides the recurring one of the same scope.
+    """
     __tablename__ = "budgets"
+    __table_args__ = (
+        Index("ix_budgets_scope", "project", "environment", "provider", "period"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     amount = Column(Float)
+    project = Column(String, nullable=True)
+    environment = Column(String, nullable=True)
+    provider = Column(String, nullable=True)
+    period = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 class Optimization(Base):
     __tablename__ = "optimizations"
+    __table_args__ = (
+        # One recommendation per rule and group; regeneration upserts on this key
+        Index("uq_optimizations_rule_service_provider", "rule", "service", "provider", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    rule = Column(String)  # idle, rightsize, reserved, multi_cloud, dev_schedule
     title = Column(String, index=True)
     description = Column(String)
     estimated_savings = Column(Float)
@@ -41,4 +174,21 @@ class Optimization(Base):
     service = Column(String, index=True)
     provider = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class DirtyCostGroup(Base):
+    """
+    (service, provider) groups whose costs changed since recommendations
+    were last generated. `version` is bumped on every change so a
+    regeneration only clears the marks it has seen.
+    """
+    __tablename__ = "dirty_cost_groups"
+    __table_args__ = (
+        UniqueConstraint("service", "provider", name="uq_dirty_cost_groups_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    service = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=1)
 
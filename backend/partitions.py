@@ -0,0 +1,193 @@
+"""
+Monthly partitioning and retention for raw cost entries
+
+On PostgreSQL, `cost_entries` can be converted into a table natively
+partitioned by month on `date`, so queries on the current month only scan
+the current partition:
+
+    python -m backend.partitions convert
+
+Partitioning is PostgreSQL-only. On SQLite `cost_entries` stays one
+table: month tables behind a view would need INSTEAD OF triggers for every
+insert, upsert and delete, and an insert through a view cannot report the
+new row's id, which the ORM needs. The date-leading indexes keep
+current-month queries to a range scan of the index rather than the table,
+but that is not partition pruning; retention is what bounds the table.
+
+Raw rows older than RAW_RETENTION_MONTHS full months are compacted: their
+rollups are recomputed from the raw rows and the raw rows are then
+dropped (whole partitions on PostgreSQL). Aggregates read the rollup, so
+history stays available at daily granularity. Compaction runs as the
+`compact_partitions` scheduler job when RAW_RETENTION_MONTHS is set, or by
+hand:
+
+    python -m backend.partitions compact
+"""
+import argparse
+import logging
+import os
+from datetime import date
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from . import models
+from .rollup import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# 0 keeps raw rows forever
+RAW_RETENTION_MONTHS = int(os.environ.get("RAW_RETENTION_MONTHS", 0))
+COMPACTION_INTERVAL_SECONDS = float(os.environ.get("COMPACTION_INTERVAL_SECONDS", 24 * 60 * 60))
+PARTITION_MONTHS_AHEAD = 2
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"cost_entries_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(connection):
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = 'cost_entries')"
+    )).scalar()
+
+
+def ensure_partitions(connection, start_month, end_month):
+    """
+    Create monthly partitions covering [start_month, end_month]
+    """
+    month = month_start(start_month)
+    while month <= end_month:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF cost_entries "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        month = add_months(month, 1)
+
+
+def convert_to_partitioned(engine):
+    """
+    Rebuild cost_entries on PostgreSQL as a table partitioned by month,
+    copying existing rows into their partitions in one transaction
+    """
+    from .migrations import create_table_indexes
+
+    with engine.begin() as connection:
+        if connection.dialect.name != "postgresql":
+            raise RuntimeError("Native partitioning is only available on PostgreSQL")
+        if is_partitioned(connection):
+            return False
+
+        connection.execute(text("ALTER TABLE cost_entries RENAME TO cost_entries_unpartitioned"))
+        connection.execute(text(
+            "ALTER TABLE cost_entries_unpartitioned RENAME CONSTRAINT cost_entries_pkey TO cost_entries_unpartitioned_pkey"
+        ))
+        connection.execute(text(
+            "CREATE TABLE cost_entries (LIKE cost_entries_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (date)"
+        ))
+        # The partition key has to be part of the primary key
+        connection.execute(text("ALTER TABLE cost_entries ADD PRIMARY KEY (id, date)"))
+        connection.execute(text("CREATE TABLE cost_entries_default PARTITION OF cost_entries DEFAULT"))
+
+        oldest, newest = connection.execute(text(
+            "SELECT min(date), max(date) FROM cost_entries_unpartitioned"
+        )).one()
+        today = date.today()
+        ensure_partitions(
+            connection,
+            oldest or today,
+            max(newest or today, add_months(month_start(today), PARTITION_MONTHS_AHEAD))
+        )
+
+        connection.execute(text("INSERT INTO cost_entries SELECT * FROM cost_entries_unpartitioned"))
+        # Keep the id sequence when the old table (its owner) is dropped
+        connection.execute(text("ALTER SEQUENCE cost_entries_id_seq OWNED BY cost_entries.id"))
+        connection.execute(text("DROP TABLE cost_entries_unpartitioned"))
+        create_table_indexes(connection, models.CostEntry.__table__)
+    return True
+
+
+def compact_partitions(db: Session, retention_months=RAW_RETENTION_MONTHS, today=None):
+    """
+    Fold raw rows older than `retention_months` full months into the
+    rollup and drop them. Returns the number of months compacted.
+    """
+    if retention_months <= 0:
+        return 0
+
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    oldest = db.query(func.min(models.CostEntry.date)).filter(models.CostEntry.date < cutoff).scalar()
+    if oldest is None:
+        return 0
+
+    partitioned = is_partitioned(db.connection())
+    compacted = 0
+    month = month_start(oldest)
+    while month < cutoff:
+        next_month = add_months(month, 1)
+        # Make the rollup exact for the month before its raw rows go away
+        rebuild_rollups(db, month, next_month)
+
+        if partitioned:
+            db.execute(text(f"DROP TABLE IF EXISTS {partition_name(month)}"))
+        db.query(models.CostEntry).filter(
+            models.CostEntry.date >= month,
+            models.CostEntry.date < next_month
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        logger.info("Compacted raw cost entries for %s", month.strftime('%Y-%m'))
+        compacted += 1
+        month = next_month
+
+    return compacted
+
+
+def maintain_partitions(db: Session, retention_months=RAW_RETENTION_MONTHS):
+    """
+    Create upcoming partitions (PostgreSQL) and compact expired months
+    """
+    connection = db.connection()
+    if is_partitioned(connection):
+        current = month_start(date.today())
+        ensure_partitions(connection, current, add_months(current, PARTITION_MONTHS_AHEAD))
+        db.commit()
+    return compact_partitions(db, retention_months)
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, engine
+    from .migrations import init_db
+
+    parser = argparse.ArgumentParser(description="Partition and compact raw cost entries")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("convert", help="Convert cost_entries to monthly partitions (PostgreSQL)")
+    compact_parser = subparsers.add_parser("compact", help="Compact raw rows past the retention period")
+    compact_parser.add_argument("--retention-months", type=int, default=RAW_RETENTION_MONTHS)
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "convert":
+        try:
+            converted = convert_to_partitioned(engine)
+        except RuntimeError as e:
+            parser.error(str(e))
+        print("cost_entries converted to monthly partitions." if converted else "cost_entries is already partitioned.")
+    else:
+        db = SessionLocal()
+        try:
+            months = maintain_partitions(db, args.retention_months)
+        finally:
+            db.close()
+        print(f"Compacted {months} month(s) of raw cost entries.")
@@ -0,0 +1,137 @@
+"""
+Maintain the daily cost rollup table
+
+Aggregate endpoints read `models.CostRollup` instead of scanning raw cost
+entries, so their cost scales with the number of distinct
+(date, provider, service, project, environment) groups rather than the
+number of line items. Rebuild it after a backfill with:
+
+    python -m backend.rollup
+"""
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from . import models
+
+ROLLUP_KEYS = ("date", "provider", "service", "project", "environment")
+
+
+def _get(entry, field):
+    return entry[field] if isinstance(entry, dict) else getattr(entry, field)
+
+
+def upsert_increments(db: Session, model, keys, fields, rows):
+    """
+    Insert `rows` (dicts) into `model`, or add their `fields` to those of
+    the existing row with the same `keys`
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={field: getattr(model, field) + getattr(stmt.excluded, field) for field in fields}
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Generic fallback for databases without ON CONFLICT support
+    for row in rows:
+        existing = db.query(model).filter_by(**{key: row[key] for key in keys}).first()
+        if existing:
+            for field in fields:
+                setattr(existing, field, getattr(existing, field) + row[field])
+        else:
+            db.add(model(**row))
+    db.flush()
+
+
+def apply_entries(db: Session, entries):
+    """
+    Add newly written cost entries (dicts or objects) to the rollup.
+    The caller commits, so the rollup stays consistent with the raw rows.
+    """
+    deltas = {}
+    for entry in entries:
+        key = tuple(_get(entry, field) for field in ROLLUP_KEYS)
+        cost = _get(entry, "cost") or 0
+        totals = deltas.setdefault(key, [0.0, 0.0, 0])
+        totals[0] += cost
+        totals[1] += cost * cost
+        totals[2] += 1
+
+    apply_deltas(db, deltas)
+
+
+def apply_deltas(db: Session, deltas):
+    """
+    Upsert {key: (cost, cost_squared, row_count)} deltas into the rollup
+    """
+    if not deltas:
+        return
+
+    rows = [
+        dict(zip(ROLLUP_KEYS, key), cost=cost, cost_squared=cost_squared, row_count=row_count)
+        for key, (cost, cost_squared, row_count) in deltas.items()
+    ]
+
+    upsert_increments(db, models.CostRollup, ROLLUP_KEYS, ("cost", "cost_squared", "row_count"), rows)
+
+
+def rebuild_rollups(db: Session, start_date=None, end_date=None):
+    """
+    Recompute the rollup from raw cost entries for [start_date, end_date).
+    The range never reaches before the oldest raw row, so months already
+    compacted away by retention keep their rollups.
+    """
+    oldest = db.query(func.min(models.CostEntry.date)).scalar()
+    if oldest is None:
+        return
+    start_date = max(start_date, oldest) if start_date is not None else oldest
+    if end_date is not None and start_date >= end_date:
+        return
+
+    stale = db.query(models.CostRollup).filter(models.CostRollup.date >= start_date)
+    if end_date is not None:
+        stale = stale.filter(models.CostRollup.date < end_date)
+    stale.delete(synchronize_session=False)
+
+    key_columns = [getattr(models.CostEntry, field) for field in ROLLUP_KEYS]
+    select = db.query(
+        *key_columns,
+        func.sum(models.CostEntry.cost),
+        func.sum(models.CostEntry.cost * models.CostEntry.cost),
+        func.count(models.CostEntry.id)
+    ).filter(models.CostEntry.date >= start_date)
+    if end_date is not None:
+        select = select.filter(models.CostEntry.date < end_date)
+    select = select.group_by(*key_columns)
+
+    db.execute(
+        insert(models.CostRollup).from_select(
+            list(ROLLUP_KEYS) + ["cost", "cost_squared", "row_count"],
+            select.statement
+        )
+    )
+    db.commit()
+
+
+def ensure_rollups(db: Session):
+    """
+    Build the rollup for databases created before it existed
+    """
+    if db.query(models.CostRollup.id).first() is None and db.query(models.CostEntry.id).first() is not None:
+        rebuild_rollups(db)
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+    from .migrations import init_db
+
+    init_db()
+    db = SessionLocal()
+    print("Rebuilding cost rollups...")
+    rebuild_rollups(db)
+    print(f"Rollup rebuilt: {db.query(models.CostRollup).count()} groups.")
+    db.close()
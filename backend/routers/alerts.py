@@ -1,7 +1,10 @@
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db
+from ..anomalies import active_alerts, ACTIVE_ALERT_DAYS
 
 router = APIRouter(
     prefix="/alerts",
@@ -10,8 +13,8 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=schemas.AlertThreshold)
-def read_alert_threshold(db: Session = Depends(get_db)):
-    alert = db.query(models.AlertThreshold).first()
+async def read_alert_threshold(db: AsyncSession = Depends(get_async_db)):
+    alert = await db.run_sync(lambda session: session.query(models.AlertThreshold).first())
     if alert is None:
         # Return a default if not set, or 404. Let's return a default 0 for now or create one.
         # Better to return 404 if not set, or handle in frontend.
@@ -20,15 +23,29 @@ def read_alert_threshold(db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Alert threshold not set")
     return alert
 
-@router.post("/", response_model=schemas.AlertThreshold)
-def set_alert_threshold(alert: schemas.AlertThresholdCreate, db: Session = Depends(get_db)):
+def save_alert_threshold(db: Session, alert: schemas.AlertThresholdCreate):
+    # Fields left out of the request keep their stored values
+    values = alert.model_dump(exclude_unset=True)
     db_alert = db.query(models.AlertThreshold).first()
     if db_alert:
-        db_alert.amount = alert.amount
+        for field, value in values.items():
+            setattr(db_alert, field, value)
     else:
-        db_alert = models.AlertThreshold(amount=alert.amount)
+        db_alert = models.AlertThreshold(**values)
         db.add(db_alert)
     
     db.commit()
     db.refresh(db_alert)
     return db_alert
+
+@router.get("/active", response_model=List[schemas.CostAlert])
+async def read_active_alerts(days: int = ACTIVE_ALERT_DAYS, db: AsyncSession = Depends(get_async_db)):
+    """
+    Threshold breaches and spending spikes per (service, project) over the
+    last `days` days, detected as costs are ingested
+    """
+    return await db.run_sync(active_alerts, max(1, days))
+
+@router.post("/", response_model=schemas.AlertThreshold)
+async def set_alert_threshold(alert: schemas.AlertThresholdCreate, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(save_alert_threshold, alert)
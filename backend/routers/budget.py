@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from datetime import date, datetime
+from typing import Optional
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db
+from ..partitions import add_months
+from .costs import period_column
+from ..cache import response_cache, cache_key, cached_json_response
+from ..forecasting import forecast_cache
+from ..spend import spend_summary
+from ..events import broadcaster
 
 router = APIRouter(
     prefix="/budget",
@@ -11,35 +19,56 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+SCOPE_FIELDS = ("project", "environment", "provider")
+HISTORY_MONTHS = 12
+MAX_HISTORY_MONTHS = 120
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+def scope_filters(query, scope):
+    """
+    Match budgets with exactly this (project, environment, provider) scope
+    """
+    for field, value in zip(SCOPE_FIELDS, scope):
+        column = getattr(models.Budget, field)
+        query = query.filter(column.is_(None) if value is None else column == value)
+    return query
+
+def find_budget(db: Session, month, scope=(None, None, None)):
+    """
+    The budget for a scope in `month` (YYYY-MM): the one set for that
+    month, otherwise the recurring one
+    """
+    return scope_filters(db.query(models.Budget), scope).filter(
+        or_(models.Budget.period == month, models.Budget.period.is_(None))
+    ).order_by(models.Budget.period.is_(None), models.Budget.id.desc()).first()
+
 @router.get("/", response_model=schemas.BudgetResponse)
-def get_budget(db: Session = Depends(get_db)):
+async def get_budget(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
-    Get current budget and spending data with projections
+    Get current budget and spending data with projections.
+    Served from the response cache until costs or the budget change.
     """
-    # Fetch the current budget
-    budget = db.query(models.Budget).first()
-    
-    # Calculate current month's spending
-    now = datetime.now()
-    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Get all costs for current month
-    current_month_costs = db.query(models.CostEntry).filter(
-        models.CostEntry.date >= first_day_of_month.strftime('%Y-%m-%d')
-    ).all()
-    
-    current_spend = sum(cost.cost for cost in current_month_costs)
-    
-    # Calculate days elapsed and days in month
-    days_elapsed = now.day
-    days_in_month = (now.replace(month=now.month % 12 + 1, day=1) - timedelta(days=1)).day if now.month < 12 else 31
+    month = datetime.now().strftime('%Y-%m')
+
+    async def compute():
+        forecast = await spend_summary.get(db)
+        return await db.run_sync(compute_budget, forecast)
+
+    return await cached_json_response(request, cache_key(request, month), compute)
+
+def compute_budget(db: Session, forecast=None):
+    """
+    Compute the budget summary for the current month
+    """
+    # Fetch the account-wide budget for this month
+    today = date.today()
+    budget = find_budget(db, today.strftime('%Y-%m'))
     
-    # Forecast end-of-month spend
-    if days_elapsed > 0:
-        daily_average = current_spend / days_elapsed
-        forecasted_spend = daily_average * days_in_month
-    else:
-        forecasted_spend = 0
+    # Month-to-date spend and month-end forecast (trend + weekday seasonality)
+    if forecast is None:
+        forecast = forecast_cache.get(db, today)
+    current_spend, forecasted_spend, forecast_lower, forecast_upper = forecast.total()
+    days_elapsed = today.day
     
     # Calculate remaining budget
     budget_amount = budget.amount if budget else 0
@@ -49,16 +78,9 @@ def get_budget(db: Session = Depends(get_db)):
     percentage_used = (current_spend / budget_amount * 100) if budget_amount > 0 else 0
     
     # Calculate service-level projections
-    service_costs = {}
-    for cost in current_month_costs:
-        if cost.service not in service_costs:
-            service_costs[cost.service] = 0
-        service_costs[cost.service] += cost.cost
-    
     services = []
-    for service, total_cost in service_costs.items():
-        daily_spend = total_cost / days_elapsed if days_elapsed > 0 else 0
-        monthly_projection = daily_spend * days_in_month
+    for service, (total_cost, monthly_projection, lower, upper) in forecast.by_service().items():
+        daily_spend = total_cost / days_elapsed
         
         # Determine status based on projection vs budget
         if budget_amount > 0:
@@ -76,6 +98,8 @@ def get_budget(db: Session = Depends(get_db)):
             service=service,
             daily_spend=round(daily_spend, 2),
             monthly_projection=round(monthly_projection, 2),
+            lower_bound=round(lower, 2),
+            upper_bound=round(upper, 2),
             status=status
         ))
     
@@ -84,23 +108,156 @@ def get_budget(db: Session = Depends(get_db)):
         current_spend=round(current_spend, 2),
         remaining=round(remaining, 2),
         forecasted_spend=round(forecasted_spend, 2),
+        forecast_lower_bound=round(forecast_lower, 2),
+        forecast_upper_bound=round(forecast_upper, 2),
         percentage_used=round(percentage_used, 2),
         services=services
     )
 
-@router.post("/", response_model=schemas.Budget)
-def set_budget(budget: schemas.BudgetCreate, db: Session = Depends(get_db)):
-    """
-    Set or update monthly budget
-    """
-    db_budget = db.query(models.Budget).first()
+def save_budget(db: Session, budget: schemas.BudgetCreate):
+    scope = tuple(getattr(budget, field) for field in SCOPE_FIELDS)
+    query = scope_filters(db.query(models.Budget), scope)
+    if budget.period is None:
+        query = query.filter(models.Budget.period.is_(None))
+    else:
+        query = query.filter(models.Budget.period == budget.period)
+    db_budget = query.first()
     if db_budget:
         db_budget.amount = budget.amount
         db_budget.updated_at = datetime.utcnow()
     else:
-        db_budget = models.Budget(amount=budget.amount)
+        db_budget = models.Budget(**budget.model_dump())
         db.add(db_budget)
     
     db.commit()
     db.refresh(db_budget)
     return db_budget
+
+@router.post("/", response_model=schemas.Budget)
+async def set_budget(budget: schemas.BudgetCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Set or update a monthly budget. Without project, environment or
+    provider it covers all spend; without a period it applies to every
+    month that has no budget of its own.
+    """
+    db_budget = await db.run_sync(save_budget, budget)
+    response_cache.invalidate()
+    broadcaster.publish("budget", {
+        "amount": db_budget.amount,
+        **{field: getattr(db_budget, field) for field in (*SCOPE_FIELDS, "period")}
+    })
+    return db_budget
+
+def month_key(value):
+    """
+    YYYY-MM for a month bucket, returned as a date or a date string
+    depending on the dialect
+    """
+    return value.strftime('%Y-%m') if hasattr(value, "strftime") else str(value)[:7]
+
+def compute_budget_history(db: Session, start: date, months: int, scope):
+    """
+    Budget vs. actual spend for every budget scope and month from `start`.
+    All budgets are read in one query and actuals in one grouped rollup
+    query, whatever the number of months and scopes.
+    """
+    month_keys = [add_months(start, i).strftime('%Y-%m') for i in range(months)]
+    end = add_months(start, months)
+
+    query = db.query(models.Budget).filter(or_(
+        models.Budget.period.is_(None),
+        models.Budget.period.between(month_keys[0], month_keys[-1])
+    ))
+    for field, value in zip(SCOPE_FIELDS, scope):
+        if value is not None:
+            query = query.filter(getattr(models.Budget, field) == value)
+    budgets = query.all()
+    if not budgets:
+        return schemas.BudgetHistory(start=month_keys[0], end=month_keys[-1], entries=[])
+
+    # Which budget applies to each scope and month
+    recurring = {}
+    by_month = {}
+    for budget in budgets:
+        key = tuple(getattr(budget, field) for field in SCOPE_FIELDS)
+        if budget.period is None:
+            recurring[key] = budget
+        else:
+            by_month[(key, budget.period)] = budget
+
+    month = period_column(db.get_bind().dialect.name, "month").label("month")
+    rows = db.query(
+        month,
+        models.CostRollup.project,
+        models.CostRollup.environment,
+        models.CostRollup.provider,
+        func.sum(models.CostRollup.cost)
+    ).filter(
+        models.CostRollup.date >= start,
+        models.CostRollup.date < end
+    ).group_by(
+        month, models.CostRollup.project, models.CostRollup.environment, models.CostRollup.provider
+    )
+
+    # Fold the groups into totals for each combination of fields the budgets are scoped by
+    shapes = {
+        tuple(field for field in SCOPE_FIELDS if getattr(budget, field) is not None)
+        for budget in budgets
+    }
+    totals = {shape: {} for shape in shapes}
+    for month_value, project, environment, provider, cost in rows:
+        values = {"project": project, "environment": environment, "provider": provider}
+        for shape in shapes:
+            key = (month_key(month_value), *(values[field] for field in shape))
+            totals[shape][key] = totals[shape].get(key, 0) + (cost or 0)
+
+    entries = []
+    scopes = set(recurring) | {key for key, _ in by_month}
+    for key in sorted(scopes, key=lambda key: tuple(value or "" for value in key)):
+        shape = tuple(field for field, value in zip(SCOPE_FIELDS, key) if value is not None)
+        for month_value in month_keys:
+            budget = by_month.get((key, month_value)) or recurring.get(key)
+            if budget is None:
+                continue
+            actual = totals[shape].get((month_value, *(value for value in key if value is not None)), 0)
+            entries.append(schemas.BudgetHistoryEntry(
+                month=month_value,
+                budget_id=budget.id,
+                project=budget.project,
+                environment=budget.environment,
+                provider=budget.provider,
+                budget=budget.amount,
+                actual=round(actual, 2),
+                remaining=round(budget.amount - actual, 2),
+                percentage_used=round(actual / budget.amount * 100, 2) if budget.amount > 0 else 0
+            ))
+    return schemas.BudgetHistory(start=month_keys[0], end=month_keys[-1], entries=entries)
+
+@router.get("/history", response_model=schemas.BudgetHistory)
+async def get_budget_history(
+    request: Request,
+    start: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    end: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    project: Optional[str] = None,
+    environment: Optional[str] = None,
+    provider: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Budget vs. actual per budget scope and month, from `start` to `end`
+    (YYYY-MM, default the last 12 months including this one). Filter by
+    project, environment or provider to only include budgets scoped to them.
+    """
+    end_month = date.fromisoformat(f"{end}-01") if end else date.today().replace(day=1)
+    start_month = date.fromisoformat(f"{start}-01") if start else add_months(end_month, 1 - HISTORY_MONTHS)
+    months = (end_month.year - start_month.year) * 12 + end_month.month - start_month.month + 1
+    if months < 1:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if months > MAX_HISTORY_MONTHS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_HISTORY_MONTHS} months can be requested")
+
+    return await cached_json_response(
+        request,
+        cache_key(request, date.today().strftime('%Y-%m')),
+        lambda: db.run_sync(compute_budget_history, start_month, months, (project, environment, provider))
+    )
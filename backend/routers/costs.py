@@ -1,8 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import Date, and_, cast, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date
+from typing import List, Literal, Optional
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db, SessionLocal
+from ..rollup import apply_entries
+from ..anomalies import observe_entries
+from ..generate_recommendations import mark_groups_dirty
+from ..events import publish_cost_changes
+from ..ingest import insert_chunk, DEFAULT_CHUNK_SIZE
+from ..cache import response_cache, cache_key, cached_json_response
+from ..forecasting import forecast_cache
+from ..serialization import FAST_JSON_ENABLED, json_default, json_response, model_columns, rows_to_dicts
+from ..columnar import ColumnarUnavailable, arrow_stream, import_parquet, parquet_stream, require_pyarrow
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = ("id", "service", "provider", "cost", "date", "project", "environment", "created_at")
+BREAKDOWN_DIMENSIONS = ("provider", "service", "project", "environment")
 
 router = APIRouter(
     prefix="/costs",
@@ -10,15 +35,409 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def cost_filters(
+    provider: Optional[str] = None,
+    service: Optional[str] = None,
+    project: Optional[str] = None,
+    environment: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """
+    Common cost entry filters; dates are inclusive bounds
+    """
+    return {
+        "provider": provider,
+        "service": service,
+        "project": project,
+        "environment": environment,
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+def apply_cost_filters(query, filters, model=models.CostEntry):
+    for field in ("provider", "service", "project", "environment"):
+        if filters[field] is not None:
+            query = query.filter(getattr(model, field) == filters[field])
+    if filters["start_date"] is not None:
+        query = query.filter(model.date >= filters["start_date"])
+    if filters["end_date"] is not None:
+        query = query.filter(model.date <= filters["end_date"])
+    return query
+
+def encode_cursor(entry_date, entry_id):
+    return base64.urlsafe_b64encode(json.dumps([entry_date.isoformat(), entry_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        entry_date, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date.fromisoformat(entry_date), int(entry_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def after_cursor(query, entry_date, entry_id):
+    """
+    Keyset condition for rows ordered after (date, id)
+    """
+    return query.filter(or_(
+        models.CostEntry.date > entry_date,
+        and_(models.CostEntry.date == entry_date, models.CostEntry.id > entry_id)
+    ))
+
+def list_costs(db: Session, filters, cursor=None, skip=0, limit=100, columns=None):
+    """
+    A page of cost entries, or of column tuples when `columns` is given
+    """
+    query = db.query(*columns) if columns else db.query(models.CostEntry)
+    query = apply_cost_filters(query, filters)
+    if cursor:
+        query = after_cursor(query, *cursor)
+    elif skip:
+        query = query.offset(skip)
+
+    return query.order_by(models.CostEntry.date, models.CostEntry.id).limit(limit).all()
+
 @router.get("/", response_model=List[schemas.CostEntry])
-def read_costs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    costs = db.query(models.CostEntry).offset(skip).limit(limit).all()
+async def read_costs(
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    filters: dict = Depends(cost_filters),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List cost entries ordered by (date, id).
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the
+    next page; `skip` is only honoured when no cursor is given.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if FAST_JSON_ENABLED:
+        columns = model_columns(models.CostEntry, schemas.CostEntry)
+        rows = await db.run_sync(list_costs, filters, position, skip, limit, columns)
+        headers = {}
+        if rows and len(rows) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1].date, rows[-1].id)
+        return json_response(rows_to_dicts(schemas.CostEntry, rows), headers)
+
+    costs = await db.run_sync(list_costs, filters, position, skip, limit)
+    if costs and len(costs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(costs[-1].date, costs[-1].id)
     return costs
 
-@router.post("/", response_model=schemas.CostEntry)
-def create_cost(cost: schemas.CostEntryCreate, db: Session = Depends(get_db)):
+def breakdown_dimensions(group_by: Optional[str] = None):
+    """
+    Comma-separated dimensions to group by, e.g. project,environment,provider
+    """
+    if not group_by:
+        return ()
+    selected = tuple(dict.fromkeys(field.strip() for field in group_by.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in BREAKDOWN_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by dimensions: {', '.join(unknown)}")
+    return selected
+
+def period_column(dialect, granularity):
+    """
+    Start date of the day, week (Monday) or month containing each rollup date
+    """
+    column = models.CostRollup.date
+    if granularity == "day":
+        return column
+    if dialect == "postgresql":
+        return cast(func.date_trunc(granularity, column), Date)
+    if dialect == "sqlite":
+        if granularity == "week":
+            return func.date(column, "weekday 0", "-6 days")
+        return func.date(column, "start of month")
+    raise HTTPException(status_code=400, detail=f"Granularity {granularity} is not supported on {dialect}")
+
+def compute_breakdown(db: Session, dimensions, granularity, filters):
+    """
+    Aggregate the daily rollup by period and dimensions in one grouped query
+    """
+    keys = []
+    names = []
+    if granularity is not None:
+        keys.append(period_column(db.get_bind().dialect.name, granularity))
+        names.append("period")
+    for dimension in dimensions:
+        keys.append(getattr(models.CostRollup, dimension))
+        names.append(dimension)
+
+    query = apply_cost_filters(
+        db.query(*keys, func.sum(models.CostRollup.cost), func.sum(models.CostRollup.row_count)),
+        filters,
+        model=models.CostRollup
+    )
+    if keys:
+        query = query.group_by(*keys).order_by(*keys)
+    rows = [row for row in query.all() if row[-1]]
+
+    values = list(zip(*rows)) if rows else [()] * (len(names) + 2)
+    columns = dict(zip(names, (list(column) for column in values)))
+    if "period" in columns:
+        columns["period"] = [str(period) for period in columns["period"]]
+    columns["cost"] = [round(cost or 0, 2) for cost in values[-2]]
+    columns["row_count"] = [int(count or 0) for count in values[-1]]
+
+    return schemas.CostBreakdown(
+        group_by=list(dimensions),
+        granularity=granularity,
+        rows=len(rows),
+        columns=columns
+    )
+
+@router.get("/breakdown", response_model=schemas.CostBreakdown)
+async def read_cost_breakdown(
+    request: Request,
+    group_by: tuple = Depends(breakdown_dimensions),
+    granularity: Optional[Literal["day", "week", "month"]] = None,
+    filters: dict = Depends(cost_filters),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Total cost by any combination of provider, service, project and
+    environment, optionally per day, week or month, over the filtered date
+    range. Answered from the daily rollup in one query and returned as
+    columns (one list per field) rather than a list of objects.
+    """
+    return await cached_json_response(
+        request,
+        cache_key(request),
+        lambda: db.run_sync(compute_breakdown, group_by, granularity, filters)
+    )
+
+def export_columns(columns: Optional[str] = None):
+    """
+    Comma-separated column projection for exports; all columns by default
+    """
+    if not columns:
+        return EXPORT_COLUMNS
+    selected = tuple(column.strip() for column in columns.split(",") if column.strip())
+    unknown = [column for column in selected if column not in EXPORT_COLUMNS]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown export columns: {', '.join(unknown)}" if unknown else "No export columns given"
+        )
+    return selected
+
+def iter_cost_pages(filters, columns=EXPORT_COLUMNS, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield filtered cost entries as lists of column tuples, one keyset page
+    at a time. The page key (date, id) is read even when not projected.
+    """
+    selected = [getattr(models.CostEntry, column) for column in columns]
+    keys = [models.CostEntry.date.label("page_date"), models.CostEntry.id.label("page_id")]
+    db = SessionLocal()
+    try:
+        last = None
+        while True:
+            query = apply_cost_filters(db.query(*selected, *keys), filters)
+            if last is not None:
+                query = after_cursor(query, *last)
+            rows = query.order_by(models.CostEntry.date, models.CostEntry.id).limit(batch_size).all()
+            if not rows:
+                break
+            yield [tuple(row)[:len(columns)] for row in rows]
+            last = (rows[-1].page_date, rows[-1].page_id)
+    finally:
+        db.close()
+
+def iter_cost_rows(filters, columns=EXPORT_COLUMNS, batch_size=EXPORT_BATCH_SIZE):
+    for page in iter_cost_pages(filters, columns, batch_size):
+        yield from page
+
+def _ndjson_lines(rows, columns=EXPORT_COLUMNS):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=json_default) + "\n"
+
+def _csv_lines(rows, columns=EXPORT_COLUMNS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@router.get("/export")
+def export_costs(
+    format: Literal["ndjson", "csv", "parquet", "arrow"] = "ndjson",
+    columns: tuple = Depends(export_columns),
+    filters: dict = Depends(cost_filters)
+):
+    """
+    Stream every matching cost entry as NDJSON, CSV, Parquet or an Arrow IPC
+    stream without building the full result in memory. Parquet and Arrow
+    encode one record batch per page read from the database.
+    """
+    if format in ("parquet", "arrow"):
+        try:
+            require_pyarrow()
+        except ColumnarUnavailable as e:
+            raise HTTPException(status_code=501, detail=str(e))
+
+        encode = parquet_stream if format == "parquet" else arrow_stream
+        return StreamingResponse(
+            encode(iter_cost_pages(filters, columns), columns),
+            media_type="application/vnd.apache.parquet" if format == "parquet" else "application/vnd.apache.arrow.stream",
+            headers={"Content-Disposition": f"attachment; filename=costs.{format}"}
+        )
+
+    rows = iter_cost_rows(filters, columns)
+    if format == "csv":
+        return StreamingResponse(
+            _csv_lines(rows, columns),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=costs.csv"}
+        )
+    return StreamingResponse(_ndjson_lines(rows, columns), media_type="application/x-ndjson")
+
+def save_cost(db: Session, cost: schemas.CostEntryCreate):
     db_cost = models.CostEntry(**cost.dict())
     db.add(db_cost)
+    apply_entries(db, [cost.dict()])
+    observe_entries(db, [cost.dict()])
+    mark_groups_dirty(db, [cost.dict()])
     db.commit()
     db.refresh(db_cost)
     return db_cost
+
+@router.post("/", response_model=schemas.CostEntry)
+async def create_cost(cost: schemas.CostEntryCreate, db: AsyncSession = Depends(get_async_db)):
+    db_cost = await db.run_sync(save_cost, cost)
+    forecast_cache.invalidate()
+    response_cache.invalidate()
+    # After invalidating, so subscribers that refetch see the new entry
+    publish_cost_changes([cost.dict()])
+    return db_cost
+
+async def _iter_ndjson(request: Request):
+    """
+    Yield parsed objects from an NDJSON body without buffering it whole
+    """
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+@router.post("/bulk", response_model=schemas.BulkIngestResponse)
+async def create_costs_bulk(request: Request, chunk_size: int = DEFAULT_CHUNK_SIZE, db: AsyncSession = Depends(get_async_db)):
+    """
+    Ingest many cost entries from a JSON array or an NDJSON stream.
+    Rows are validated and inserted in chunked transactions; invalid rows are
+    skipped and reported by their position in the input.
+    """
+    chunk_size = max(1, chunk_size)
+    received = 0
+    inserted = 0
+    failed = 0
+    errors = []
+    chunk = []
+
+    def record_error(index, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append(schemas.BulkIngestError(index=index, error=message))
+
+    async def add_row(index, obj):
+        nonlocal inserted, chunk
+        try:
+            chunk.append(schemas.CostEntryCreate.model_validate(obj).model_dump())
+        except ValidationError as e:
+            record_error(index, "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+            return
+        if len(chunk) >= chunk_size:
+            inserted += await db.run_sync(insert_chunk, chunk)
+            chunk = []
+
+    try:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        if content_type in NDJSON_TYPES:
+            async for line in _iter_ndjson(request):
+                index = received
+                received += 1
+                try:
+                    obj = json.loads(line)
+                except ValueError as e:
+                    record_error(index, f"Invalid JSON: {e}")
+                    continue
+                await add_row(index, obj)
+        else:
+            try:
+                body = await request.json()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+            if not isinstance(body, list):
+                raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+            for index, obj in enumerate(body):
+                received += 1
+                await add_row(index, obj)
+
+        inserted += await db.run_sync(insert_chunk, chunk)
+    finally:
+        # Chunks commit as they go, so a failure part way may follow written rows
+        if inserted:
+            forecast_cache.invalidate()
+            response_cache.invalidate()
+
+    return schemas.BulkIngestResponse(
+        received=received,
+        inserted=inserted,
+        failed=failed,
+        errors=errors
+    )
+
+def import_parquet_file(source, chunk_size):
+    """
+    Run a Parquet import on its own sync session, so it can be moved off
+    the event loop whole
+    """
+    db = SessionLocal()
+    try:
+        return import_parquet(db, source, chunk_size)
+    finally:
+        db.close()
+
+@router.post("/import", response_model=schemas.BulkIngestResponse)
+async def import_costs(file: UploadFile = File(...), chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Load cost entries from an uploaded Parquet file in chunked transactions.
+    Columns are cast with Arrow instead of validating each row, and the
+    whole file is checked before anything is written; `project` and
+    `environment` default as on POST /costs. Rows with a missing required
+    value are skipped and reported. Reading, casting and writing the file
+    all run in the threadpool: under DB_ASYNC, `run_sync` would run them on
+    the event loop and stall every other request until the import ended.
+    """
+    try:
+        received, inserted, failures = await run_in_threadpool(import_parquet_file, file.file, max(1, chunk_size))
+    except ColumnarUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+        # Chunks commit as they go, so even a failed import may have written rows
+        forecast_cache.invalidate()
+        response_cache.invalidate()
+
+    return schemas.BulkIngestResponse(
+        received=received,
+        inserted=inserted,
+        failed=len(failures),
+        errors=[schemas.BulkIngestError(index=index, error=error) for index, error in failures[:MAX_REPORTED_ERRORS]]
+    )
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Header
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from ..events import broadcaster
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/")
+async def stream_events(last_event_id: Optional[int] = Header(None)):
+    """
+    Server-Sent Events stream of changes: `costs` (current month spend
+    deltas per ingested batch), `budget`, `optimization` status changes,
+    `job` completions and `resync` when the client should refetch
+    """
+    return StreamingResponse(
+        broadcaster.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/stats")
+def read_event_stats():
+    return broadcaster.stats()
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from .. import models, schemas
+from ..database import get_async_db
+from ..scheduler import scheduler
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+def list_jobs(db: Session, name=None, status=None, limit=50):
+    query = db.query(models.Job)
+    if name is not None:
+        query = query.filter(models.Job.name == name)
+    if status is not None:
+        query = query.filter(models.Job.status == status)
+    return query.order_by(models.Job.id.desc()).limit(limit).all()
+
+@router.get("/", response_model=List[schemas.Job])
+async def read_jobs(
+    name: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List recent job runs, newest first
+    """
+    return await db.run_sync(list_jobs, name, status, limit)
+
+@router.get("/stats", response_model=List[schemas.JobStats])
+async def read_job_stats(db: AsyncSession = Depends(get_async_db)):
+    """
+    Run counts, failures and durations for every registered job
+    """
+    return await db.run_sync(scheduler.stats)
+
+@router.get("/{job_id}", response_model=schemas.Job)
+async def read_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = await db.run_sync(lambda session: session.get(models.Job, job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/{name}/run", response_model=schemas.Job, status_code=202)
+async def run_job(name: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Queue a run of a job now. If it is already queued or running, that run
+    is returned instead of starting another.
+    """
+    if name not in scheduler.definitions:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await db.run_sync(scheduler.enqueue, name)
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from .. import models, schemas
-from ..database import get_db
-from ..generate_recommendations import create_recommendations_in_db
+from ..database import get_async_db
+from ..scheduler import scheduler
+from ..cache import response_cache, cache_key, cached_json_response
+from ..events import broadcaster
+from ..forecasting import forecast_cache
+from ..spend import spend_summary
+from ..serialization import FAST_JSON_ENABLED, dumps, model_columns, rows_to_dicts
 
 router = APIRouter(
     prefix="/optimization",
@@ -12,36 +18,44 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=schemas.OptimizationResponse)
-def get_optimizations(db: Session = Depends(get_db)):
+async def get_optimizations(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
-    Get all optimization recommendations with summary statistics
+    Get all optimization recommendations with summary statistics.
+    Served from the response cache until costs or recommendations change.
+    """
+    month = datetime.now().strftime('%Y-%m')
+
+    async def compute():
+        forecast = await spend_summary.get(db)
+        if FAST_JSON_ENABLED:
+            return await db.run_sync(encode_optimizations, forecast.total()[0])
+        return await db.run_sync(compute_optimizations, forecast.total()[0])
+
+    return await cached_json_response(request, cache_key(request, month), compute)
+
+def optimization_summary(db: Session, optimizations, current_spend=None):
+    """
+    Summary statistics over optimization objects or column tuples, against
+    the current month's spend taken from the shared month forecast when not
+    given
     """
-    # Get all optimizations
-    optimizations = db.query(models.Optimization).all()
-    
     # Calculate summary statistics
-    total_estimated_savings = sum(opt.estimated_savings for opt in optimizations)
+    # Float starts keep the totals floats (0.0, not 0) in the encoded JSON
+    total_estimated_savings = sum((opt.estimated_savings for opt in optimizations), 0.0)
     total_applied_savings = sum(
-        opt.estimated_savings for opt in optimizations if opt.status == 'applied'
+        (opt.estimated_savings for opt in optimizations if opt.status == 'applied'), 0.0
     )
     
     pending_count = sum(1 for opt in optimizations if opt.status == 'pending')
     applied_count = sum(1 for opt in optimizations if opt.status == 'applied')
     ignored_count = sum(1 for opt in optimizations if opt.status == 'ignored')
     
-    # Calculate current month's spending for percentage
-    now = datetime.now()
-    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    current_month_costs = db.query(models.CostEntry).filter(
-        models.CostEntry.date >= first_day_of_month.strftime('%Y-%m-%d')
-    ).all()
+    # Current month's spending for the percentage
+    if current_spend is None:
+        current_spend = forecast_cache.get(db, date.today()).total()[0]
+    savings_percentage = (total_estimated_savings / current_spend * 100) if current_spend > 0 else 0.0
     
-    current_spend = sum(cost.cost for cost in current_month_costs)
-    savings_percentage = (total_estimated_savings / current_spend * 100) if current_spend > 0 else 0
-    
-    return schemas.OptimizationResponse(
-        optimizations=optimizations,
+    return dict(
         total_estimated_savings=round(total_estimated_savings, 2),
         total_applied_savings=round(total_applied_savings, 2),
         pending_count=pending_count,
@@ -50,49 +64,81 @@ def get_optimizations(db: Session = Depends(get_db)):
         savings_percentage=round(savings_percentage, 2)
     )
 
-@router.post("/{optimization_id}/apply", response_model=schemas.Optimization)
-def apply_optimization(optimization_id: int, db: Session = Depends(get_db)):
+def compute_optimizations(db: Session, current_spend=None):
     """
-    Mark an optimization recommendation as applied
+    Compute the optimization summary against the current month's spend
+    """
+    optimizations = db.query(models.Optimization).all()
+    return schemas.OptimizationResponse(
+        optimizations=optimizations,
+        **optimization_summary(db, optimizations, current_spend)
+    )
+
+def encode_optimizations(db: Session, current_spend=None):
+    """
+    The JSON body of `compute_optimizations`, built from column tuples
+    without validating each recommendation
     """
+    rows = db.query(*model_columns(models.Optimization, schemas.Optimization)).all()
+    return dumps(dict(
+        optimizations=rows_to_dicts(schemas.Optimization, rows),
+        **optimization_summary(db, rows, current_spend)
+    ))
+
+def set_optimization_status(db: Session, optimization_id: int, status: str):
     optimization = db.query(models.Optimization).filter(
         models.Optimization.id == optimization_id
     ).first()
     
     if not optimization:
-        raise HTTPException(status_code=404, detail="Optimization not found")
+        return None
     
-    optimization.status = 'applied'
+    optimization.status = status
     db.commit()
     db.refresh(optimization)
     
     return optimization
 
+def publish_status_change(optimization):
+    broadcaster.publish("optimization", {
+        "id": optimization.id,
+        "status": optimization.status,
+        "service": optimization.service,
+        "provider": optimization.provider,
+        "estimated_savings": optimization.estimated_savings,
+    })
+
+@router.post("/{optimization_id}/apply", response_model=schemas.Optimization)
+async def apply_optimization(optimization_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Mark an optimization recommendation as applied
+    """
+    optimization = await db.run_sync(set_optimization_status, optimization_id, 'applied')
+    if not optimization:
+        raise HTTPException(status_code=404, detail="Optimization not found")
+    response_cache.invalidate()
+    publish_status_change(optimization)
+    
+    return optimization
+
 @router.post("/{optimization_id}/ignore", response_model=schemas.Optimization)
-def ignore_optimization(optimization_id: int, db: Session = Depends(get_db)):
+async def ignore_optimization(optimization_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Mark an optimization recommendation as ignored
     """
-    optimization = db.query(models.Optimization).filter(
-        models.Optimization.id == optimization_id
-    ).first()
-    
+    optimization = await db.run_sync(set_optimization_status, optimization_id, 'ignored')
     if not optimization:
         raise HTTPException(status_code=404, detail="Optimization not found")
-    
-    optimization.status = 'ignored'
-    db.commit()
-    db.refresh(optimization)
+    response_cache.invalidate()
+    publish_status_change(optimization)
     
     return optimization
 
-@router.post("/generate")
-def generate_optimizations(db: Session = Depends(get_db)):
+@router.post("/generate", status_code=202)
+async def generate_optimizations(db: AsyncSession = Depends(get_async_db)):
     """
-    Generate new optimization recommendations based on current spending data
+    Queue generation of new optimization recommendations based on current
+    spending data. Poll `GET /jobs/{job_id}` for the outcome.
     """
-    try:
-        create_recommendations_in_db(db)
-        return {"message": "Recommendations generated successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    job = await db.run_sync(scheduler.enqueue, "generate_recommendations")
+    return {"message": "Recommendation generation queued", "job_id": job.id, "status": job.status}
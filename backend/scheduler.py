@@ -0,0 +1,308 @@
+"""
+In-process background job scheduler
+
+Heavy work (provider fetches, rollup refreshes, recommendation generation,
+partition compaction) runs on a small worker pool instead of inside
+requests. Every run is recorded in the `jobs` table with its status,
+duration and result. A job that is already queued or running is not
+enqueued again; the existing run is returned instead.
+
+Jobs with an interval are enqueued by a scheduler thread once that long
+has passed since their last run; any job can be run on demand with
+`POST /jobs/{name}/run`.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models, schemas
+from .cache import response_cache
+from .database import SessionLocal
+from .forecasting import forecast_cache
+from .events import broadcaster
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEDULER_TICK_SECONDS = float(os.environ.get("SCHEDULER_TICK_SECONDS", 30))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# 0 disables the periodic run; the job can still be triggered by hand
+JOB_FETCH_INTERVAL_SECONDS = float(os.environ.get("JOB_FETCH_INTERVAL_SECONDS", 6 * 60 * 60))
+JOB_ROLLUP_INTERVAL_SECONDS = float(os.environ.get("JOB_ROLLUP_INTERVAL_SECONDS", 24 * 60 * 60))
+JOB_RECOMMENDATIONS_INTERVAL_SECONDS = float(os.environ.get("JOB_RECOMMENDATIONS_INTERVAL_SECONDS", 24 * 60 * 60))
+ROLLUP_REFRESH_DAYS = int(os.environ.get("ROLLUP_REFRESH_DAYS", 35))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobDefinition:
+    def __init__(self, name, run, interval=0, invalidates_cache=False):
+        self.name = name
+        self.run = run  # Called with a Session; returns a JSON-serializable result
+        self.interval = interval
+        self.invalidates_cache = invalidates_cache
+
+
+class Scheduler:
+    def __init__(self, session_factory, workers=JOB_WORKERS, tick=SCHEDULER_TICK_SECONDS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.tick = tick
+        self.definitions = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def register(self, name, run, interval=0, invalidates_cache=False):
+        self.definitions[name] = JobDefinition(name, run, interval, invalidates_cache)
+
+    def start(self, periodic=SCHEDULER_ENABLED):
+        """
+        Start the worker pool and, when `periodic` is set, the scheduler thread.
+        Jobs left queued or running by a previous process are marked failed.
+        """
+        with self.session_factory() as db:
+            db.query(models.Job).filter(models.Job.status.in_(ACTIVE_STATUSES)).update(
+                {"status": "failed", "error": "Interrupted by shutdown", "finished_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+
+        self._stop.clear()
+        self._ensure_executor()
+        if periodic:
+            self._thread = threading.Thread(target=self._run_schedule, name="job-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _ensure_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+            return self._executor
+
+    def enqueue(self, db: Session, name, trigger="manual"):
+        """
+        Queue a run of `name` unless one is already queued or running, and
+        return the job row. Concurrent callers are de-duplicated by the
+        partial unique index on active job names, not a thread lock: with
+        async sessions this runs on the event loop thread, where blocking on
+        a lock held across a query would hang every request.
+        """
+        if name not in self.definitions:
+            raise KeyError(name)
+
+        executor = self._ensure_executor()
+        job = self._active_job(db, name)
+        if job is not None:
+            return job
+
+        job = models.Job(name=name, trigger=trigger, status="queued")
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request queued it between the check and the insert
+            db.rollback()
+            job = self._active_job(db, name)
+            if job is None:
+                raise
+            return job
+        db.refresh(job)
+        executor.submit(self._execute, job.id)
+        return job
+
+    def _active_job(self, db: Session, name):
+        return db.query(models.Job).filter(
+            models.Job.name == name,
+            models.Job.status.in_(ACTIVE_STATUSES)
+        ).order_by(models.Job.id.desc()).first()
+
+    def _execute(self, job_id):
+        db = self.session_factory()
+        try:
+            job = db.get(models.Job, job_id)
+            definition = self.definitions[job.name]
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            db.commit()
+
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = definition.run(db)
+            except Exception as e:
+                logger.exception("Job %s failed", definition.name)
+                db.rollback()
+                error = str(e) or e.__class__.__name__
+            if definition.invalidates_cache:
+                # Even a failed run may have committed some of its writes
+                forecast_cache.invalidate()
+                response_cache.invalidate()
+
+            job = db.get(models.Job, job_id)
+            job.status = "failed" if error else "succeeded"
+            job.result = result
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            job.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            db.commit()
+
+            broadcaster.publish("job", {
+                "id": job.id,
+                "name": job.name,
+                "status": job.status,
+                "duration_ms": job.duration_ms,
+                "invalidates_cache": definition.invalidates_cache,
+            })
+        except Exception:
+            logger.exception("Could not record job %s", job_id)
+        finally:
+            db.close()
+
+    def due_jobs(self, db: Session, now=None):
+        """
+        Names of periodic jobs whose interval has passed since their last run
+        """
+        now = now or datetime.utcnow()
+        last_runs = dict(db.query(models.Job.name, func.max(models.Job.created_at)).group_by(models.Job.name))
+        return [
+            definition.name
+            for definition in self.definitions.values()
+            if definition.interval > 0 and (
+                last_runs.get(definition.name) is None
+                or now - last_runs[definition.name] >= timedelta(seconds=definition.interval)
+            )
+        ]
+
+    def _run_schedule(self):
+        while not self._stop.is_set():
+            db = self.session_factory()
+            try:
+                for name in self.due_jobs(db):
+                    self.enqueue(db, name, "schedule")
+            except Exception:
+                logger.exception("Scheduling jobs failed")
+                db.rollback()
+            finally:
+                db.close()
+            self._stop.wait(self.tick)
+
+    def stats(self, db: Session):
+        """
+        Run counts, failures and durations per registered job
+        """
+        totals = {
+            name: (runs, failures, average)
+            for name, runs, failures, average in db.query(
+                models.Job.name,
+                func.count(models.Job.id),
+                func.sum(case((models.Job.status == "failed", 1), else_=0)),
+                func.avg(models.Job.duration_ms)
+            ).group_by(models.Job.name)
+        }
+        latest_ids = db.query(func.max(models.Job.id)).group_by(models.Job.name)
+        latest = {
+            job.name: job
+            for job in db.query(models.Job).filter(models.Job.id.in_(latest_ids.scalar_subquery()))
+        }
+
+        stats = []
+        for name, definition in self.definitions.items():
+            runs, failures, average = totals.get(name, (0, 0, None))
+            last = latest.get(name)
+            stats.append(schemas.JobStats(
+                name=name,
+                interval_seconds=definition.interval,
+                runs=runs,
+                failures=failures or 0,
+                average_duration_ms=round(average, 2) if average is not None else None,
+                last_status=last.status if last else None,
+                last_run_at=last.created_at if last else None,
+                last_duration_ms=last.duration_ms if last else None
+            ))
+        return stats
+
+
+def fetch_costs_job(db: Session):
+    from .fetch_cloud_costs import configured_fetchers, sync_costs
+
+    fetchers = configured_fetchers(db, days=30)
+    summary = sync_costs(db, fetchers)
+    failed = {provider: result["error"] for provider, result in summary.items() if result["error"]}
+    if failed:
+        raise RuntimeError("; ".join(f"{provider}: {error}" for provider, error in failed.items()))
+    return summary
+
+
+def refresh_rollups_job(db: Session):
+    from .rollup import rebuild_rollups
+
+    since = date.today() - timedelta(days=ROLLUP_REFRESH_DAYS)
+    rebuild_rollups(db, since)
+    return {"since": since.isoformat()}
+
+
+def needs_full_recommendations(db: Session, now=None):
+    """
+    Whether no generation has made a full pass today. Only ingest marks
+    groups dirty, but the lookback window moves every day and rollup
+    refreshes and compaction change past costs, so the first run each day
+    re-evaluates every group.
+    """
+    now = now or datetime.utcnow()
+    midnight = datetime.combine(now.date(), datetime.min.time())
+    results = db.query(models.Job.result).filter(
+        models.Job.name == "generate_recommendations",
+        models.Job.status == "succeeded",
+        models.Job.created_at >= midnight
+    )
+    return not any((result or {}).get("full") for (result,) in results)
+
+
+def generate_recommendations_job(db: Session):
+    from .generate_recommendations import create_recommendations_in_db
+
+    summary = create_recommendations_in_db(db, full=needs_full_recommendations(db))
+    summary["pending"] = db.query(models.Optimization).filter(models.Optimization.status == "pending").count()
+    return summary
+
+
+def compact_partitions_job(db: Session):
+    from .partitions import maintain_partitions
+
+    return {"months_compacted": maintain_partitions(db)}
+
+
+def register_default_jobs(job_scheduler):
+    from .partitions import COMPACTION_INTERVAL_SECONDS, RAW_RETENTION_MONTHS
+
+    job_scheduler.register("fetch_costs", fetch_costs_job, JOB_FETCH_INTERVAL_SECONDS, invalidates_cache=True)
+    job_scheduler.register("refresh_rollups", refresh_rollups_job, JOB_ROLLUP_INTERVAL_SECONDS, invalidates_cache=True)
+    job_scheduler.register(
+        "generate_recommendations", generate_recommendations_job,
+        JOB_RECOMMENDATIONS_INTERVAL_SECONDS, invalidates_cache=True
+    )
+    job_scheduler.register(
+        "compact_partitions", compact_partitions_job,
+        COMPACTION_INTERVAL_SECONDS if RAW_RETENTION_MONTHS > 0 else 0
+    )
+
+
+scheduler = Scheduler(SessionLocal)
+register_default_jobs(scheduler)
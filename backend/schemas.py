@@ -1,12 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import Any, Optional
 
 class CostEntryBase(BaseModel):
     service: str
     provider: str
     cost: float
-    date: str
+    date: date
     project: str = "Main Project"
     environment: str = "Production"
 
@@ -20,8 +20,28 @@ class CostEntry(CostEntryBase):
     class Config:
         from_attributes = True
 
+class BulkIngestError(BaseModel):
+    index: int
+    error: str
+
+class BulkIngestResponse(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: list[BulkIngestError]
+
+class CostBreakdown(BaseModel):
+    group_by: list[str]
+    granularity: Optional[str]  # day, week, month or None for the whole range
+    rows: int
+    # Column name -> values: period (ISO date of the period start), each
+    # group_by dimension, cost and row_count
+    columns: dict[str, list[Any]]
+
 class AlertThresholdBase(BaseModel):
     amount: float
+    # Daily limit per (service, project) for ingest-time alerts
+    series_daily_amount: Optional[float] = None
 
 class AlertThresholdCreate(AlertThresholdBase):
     pass
@@ -33,8 +53,54 @@ class AlertThreshold(AlertThresholdBase):
     class Config:
         from_attributes = True
 
+class CostAlert(BaseModel):
+    # None for daily_total alerts, which cover every service and project
+    service: Optional[str] = None
+    project: Optional[str] = None
+    date: date
+    kind: str  # threshold, spike, daily_total
+    amount: float
+    expected: float
+    score: Optional[float] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class Job(BaseModel):
+    id: int
+    name: str
+    trigger: str
+    status: str  # queued, running, succeeded, failed
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+class JobStats(BaseModel):
+    name: str
+    interval_seconds: float  # 0 when the job only runs on demand
+    runs: int
+    failures: int
+    average_duration_ms: Optional[float]
+    last_status: Optional[str]
+    last_run_at: Optional[datetime]
+    last_duration_ms: Optional[float]
+
 class BudgetBase(BaseModel):
     amount: float
+    # Scope; None means every project, environment or provider
+    project: Optional[str] = None
+    environment: Optional[str] = None
+    provider: Optional[str] = None
+    # YYYY-MM for a single month; None applies to every month
+    period: Optional[str] = Field(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$")
 
 class BudgetCreate(BudgetBase):
     pass
@@ -51,6 +117,8 @@ class ServiceProjection(BaseModel):
     service: str
     daily_spend: float
     monthly_projection: float
+    lower_bound: float  # 95% interval for the month-end projection
+    upper_bound: float
     status: str
 
 class BudgetResponse(BaseModel):
@@ -58,9 +126,27 @@ class BudgetResponse(BaseModel):
     current_spend: float
     remaining: float
     forecasted_spend: float
+    forecast_lower_bound: float
+    forecast_upper_bound: float
     percentage_used: float
     services: list[ServiceProjection]
 
+class BudgetHistoryEntry(BaseModel):
+    month: str  # YYYY-MM
+    budget_id: int
+    project: Optional[str]
+    environment: Optional[str]
+    provider: Optional[str]
+    budget: float
+    actual: float
+    remaining: float
+    percentage_used: float
+
+class BudgetHistory(BaseModel):
+    start: str
+    end: str
+    entries: list[BudgetHistoryEntry]
+
 class OptimizationBase(BaseModel):
     title: str
     description: str
@@ -73,6 +159,7 @@ class OptimizationCreate(OptimizationBase):
 
 class Optimization(OptimizationBase):
     id: int
+    rule: Optional[str] = None
     status: str
     created_at: datetime
 
@@ -1,65 +1,224 @@
-from .database import SessionLocal, engine, Base
-from .models import CostEntry, AlertThreshold
-from .generate_recommendations import create_recommendations_in_db
+"""
+Seed the database with demo or synthetic cost data
+
+    python -m backend.seed
+    python -m backend.seed --rows 1000000 --days 90 --projects 20 --skew 1.2
+
+Without --rows a small demo dataset is written. With it, a seedable
+synthetic generator produces realistic-looking spend (a few groups dominate,
+costs drift upward and non-production environments dip at weekends) and
+bulk-loads it in chunked core inserts, so millions of rows load in a
+reasonable time for local benchmarking.
+"""
+import argparse
+import time
 from datetime import date, timedelta
 import random
+import numpy as np
+from sqlalchemy import insert
+from .database import SessionLocal
+from .migrations import init_db, create_table_indexes
+from .models import CostEntry, AlertThreshold
+from .generate_recommendations import create_recommendations_in_db
+from .rollup import rebuild_rollups
+from .anomalies import rebuild_anomaly_states
+
+DEFAULT_PROVIDERS = {
+    "AWS": ["EC2", "RDS", "S3", "Lambda"],
+    "Azure": ["Virtual Machines", "SQL Database", "Blob Storage", "Functions"],
+    "GCP": ["Compute Engine", "Cloud SQL", "Cloud Storage", "Cloud Functions"]
+}
+DEFAULT_PROJECTS = ["Alpha", "Beta", "Gamma"]
+ENVIRONMENTS = ["Production", "Development", "Staging"]
+
+# Share of weekday spend each environment keeps at weekends
+WEEKEND_FACTOR = {"Production": 1.0, "Staging": 0.5, "Development": 0.3}
+# Daily cost growth, so recent days cost a little more than older ones
+DAILY_GROWTH = 0.002
+SYNTHETIC_CHUNK_SIZE = 50000
+
+def project_names(count):
+    """
+    `count` project names, starting with the demo projects
+    """
+    extra = [f"Project {i}" for i in range(len(DEFAULT_PROJECTS) + 1, count + 1)]
+    return (DEFAULT_PROJECTS + extra)[:count]
+
+def synthetic_cost_chunks(rows, days=30, providers=None, projects=None, skew=1.0, seed=42,
+                          end_date=None, chunk_size=SYNTHETIC_CHUNK_SIZE):
+    """
+    Yield lists of up to `chunk_size` synthetic cost entry dicts, `rows` in
+    total, dated over the `days` days up to `end_date` (today by default).
+
+    Each (provider, service, project, environment) group gets a log-normal
+    base cost, and rows are spread across groups with Zipf weights
+    1 / rank ** `skew` (0 spreads them evenly). The same `seed` always
+    produces the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    end_date = end_date or date.today()
+    providers = providers or DEFAULT_PROVIDERS
+    projects = projects or DEFAULT_PROJECTS
+
+    groups = [
+        (provider, service, project, environment)
+        for provider, services in providers.items()
+        for service in services
+        for project in projects
+        for environment in ENVIRONMENTS
+    ]
+    weights = 1.0 / np.arange(1, len(groups) + 1) ** skew
+    rng.shuffle(weights)
+    weights /= weights.sum()
+    base_costs = rng.lognormal(np.log(20), 1.0, size=len(groups))
+    weekend_factors = np.array([WEEKEND_FACTOR[environment] for *_, environment in groups])
+
+    dates = [end_date - timedelta(days=offset) for offset in range(days)]
+    is_weekend = np.array([day.weekday() >= 5 for day in dates])
+    growth = np.exp(-DAILY_GROWTH * np.arange(days))
+
+    for start in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - start)
+        group_index = rng.choice(len(groups), size=size, p=weights)
+        offsets = rng.integers(0, days, size=size)
+        costs = (
+            base_costs[group_index]
+            * growth[offsets]
+            * np.where(is_weekend[offsets], weekend_factors[group_index], 1.0)
+            * rng.lognormal(0.0, 0.25, size=size)
+        ).round(2)
+
+        chunk = []
+        for index, offset, cost in zip(group_index.tolist(), offsets.tolist(), costs.tolist()):
+            provider, service, project, environment = groups[index]
+            chunk.append({
+                "service": service,
+                "provider": provider,
+                "cost": cost,
+                "date": dates[offset],
+                "project": project,
+                "environment": environment,
+            })
+        yield chunk
+
+def load_synthetic(db, rows, chunk_size=SYNTHETIC_CHUNK_SIZE, **options):
+    """
+    Bulk insert `rows` synthetic cost entries (see `synthetic_cost_chunks`
+    for `options`) and rebuild the rollup. Into an empty table the cost
+    entry indexes are dropped during the load and built once afterwards,
+    which is much faster than maintaining them row by row.
+    Returns the number of rows inserted.
+    """
+    table = CostEntry.__table__
+    defer_indexes = db.query(CostEntry.id).first() is None
+    if defer_indexes:
+        connection = db.connection()
+        for index in table.indexes:
+            index.drop(connection, checkfirst=True)
+        db.commit()
+
+    inserted = 0
+    for chunk in synthetic_cost_chunks(rows, chunk_size=chunk_size, **options):
+        # Core insert on the table skips the ORM's per-row bookkeeping
+        db.connection().execute(insert(table), chunk)
+        db.commit()
+        inserted += len(chunk)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+    if defer_indexes:
+        create_table_indexes(db.connection(), table)
+        db.commit()
+    rebuild_rollups(db)
+    return inserted
 
 def seed_data():
+    # Create tables and migrate existing ones
+    init_db()
     db = SessionLocal()
-    
+
     # Check if data exists
     if db.query(CostEntry).count() > 0:
         print("Data already exists.")
         return
 
     print("Seeding data...")
-    
-    services = ["EC2", "S3", "RDS", "Lambda", "CloudFront"]
-    providers = ["AWS", "Azure", "GCP"]
+
     # Create mock cost entries
     today = date.today()
-    providers = ["AWS", "Azure", "GCP"]
-    services = {
-        "AWS": ["EC2", "RDS", "S3", "Lambda"],
-        "Azure": ["Virtual Machines", "SQL Database", "Blob Storage", "Functions"],
-        "GCP": ["Compute Engine", "Cloud SQL", "Cloud Storage", "Cloud Functions"]
-    }
     projects = ["Alpha", "Beta", "Gamma"]
     environments = ["Production", "Development", "Staging"]
 
     costs = []
     for i in range(30):
         current_date = today - timedelta(days=i)
-        for provider in providers:
-            for service in services[provider]:
-                cost_entry = CostEntry(
-                    service=service,
-                    provider=provider,
-                    cost=round(random.uniform(1.0, 50.0), 2),
-                    date=current_date.isoformat(),
-                    project=random.choice(projects),
-                    environment=random.choice(environments)
-                )
-                costs.append(cost_entry)
-    
-    db.add_all(costs)
+        for provider, services in DEFAULT_PROVIDERS.items():
+            for service in services:
+                costs.append({
+                    "service": service,
+                    "provider": provider,
+                    "cost": round(random.uniform(1.0, 50.0), 2),
+                    "date": current_date,
+                    "project": random.choice(projects),
+                    "environment": random.choice(environments)
+                })
+
+    db.execute(insert(CostEntry), costs)
     db.commit()
+    rebuild_rollups(db)
     # Set default alert
     if not db.query(AlertThreshold).first():
         db.add(AlertThreshold(amount=1000.0))
 
     db.commit()
-    
+
     # Generate optimization recommendations
     print("Generating optimization recommendations...")
     create_recommendations_in_db(db)
-    
+
     db.close()
     print("Data seeded successfully.")
 
-if __name__ == "__main__":
-    seed_data()
+def seed_synthetic(args):
+    init_db()
+    db = SessionLocal()
+    if not args.append and db.query(CostEntry.id).first() is not None:
+        print("Data already exists. Pass --append to add synthetic rows anyway.")
+        db.close()
+        return
+
+    providers = {provider: DEFAULT_PROVIDERS[provider] for provider in args.providers}
+    print(f"Loading {args.rows} synthetic cost entries...")
+    start = time.perf_counter()
+    inserted = load_synthetic(
+        db, args.rows, chunk_size=args.chunk_size, days=args.days, providers=providers,
+        projects=project_names(args.projects), skew=args.skew, seed=args.seed
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Inserted {inserted} rows in {elapsed:.1f}s ({inserted / elapsed:,.0f} rows/sec)")
 
+    if not db.query(AlertThreshold).first():
+        db.add(AlertThreshold(amount=1000.0))
+        db.commit()
+    rebuild_anomaly_states(db)
+    create_recommendations_in_db(db, full=True)
+    db.close()
+    print("Data seeded successfully.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with demo or synthetic cost data")
+    parser.add_argument("--rows", type=int, help="Load this many synthetic rows instead of the demo dataset")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--providers", nargs="+", choices=list(DEFAULT_PROVIDERS), default=list(DEFAULT_PROVIDERS))
+    parser.add_argument("--projects", type=int, default=len(DEFAULT_PROJECTS))
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of spend across groups; 0 is uniform")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=SYNTHETIC_CHUNK_SIZE)
+    parser.add_argument("--append", action="store_true", help="Add rows even if cost data already exists")
+    args = parser.parse_args()
+
+    if args.rows is None:
+        seed_data()
+    else:
+        seed_synthetic(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Fast JSON encoding for large list responses
+
+Returning ORM objects makes FastAPI validate each one through its response
+model (`from_attributes`) before encoding it, which dominates CPU on big
+pages. With FAST_JSON_ENABLED (the default) `GET /costs` and
+`GET /optimization` instead select plain column tuples, in the response
+model's field order, and encode them straight into the response body. The
+wire format is the same as the response model's.
+
+orjson is used when it is installed; otherwise the standard library json
+module produces the same output, only more slowly.
+"""
+import json
+import os
+from datetime import date, datetime
+from fastapi import Response
+from .instrumentation import serialization_timer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON_ENABLED = os.environ.get("FAST_JSON_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def model_columns(model, schema):
+    """
+    The columns of ORM `model` backing each field of response model `schema`,
+    in the schema's field order
+    """
+    return [getattr(model, field) for field in schema.model_fields]
+
+
+def rows_to_dicts(schema, rows):
+    """
+    Column tuples selected with `model_columns` as dicts keyed by field name
+    """
+    fields = tuple(schema.model_fields)
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def json_default(value):
+    """
+    `default` for the stdlib json encoder: ISO dates and datetimes, and
+    anything else (e.g. Decimal sums on PostgreSQL) as its string
+    """
+    return value.isoformat() if isinstance(value, (date, datetime)) else str(value)
+
+
+def dumps(value):
+    """
+    Encode `value` as compact UTF-8 JSON bytes, as Pydantic would
+    """
+    with serialization_timer():
+        if orjson is not None:
+            return orjson.dumps(value)
+        return json.dumps(value, default=json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_response(value, headers=None):
+    return Response(content=dumps(value), media_type="application/json", headers=headers)
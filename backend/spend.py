@@ -0,0 +1,73 @@
+"""
+Shared current-month spend summary
+
+`GET /budget` and `GET /optimization` both need the month-to-date spend,
+and the dashboard requests them together. Both read it from one cached
+month forecast (actuals plus projections, see `forecasting`), and
+concurrent requests that miss the cache wait for a single in-flight
+computation instead of each scanning the rollup.
+"""
+import asyncio
+from datetime import date
+from .forecasting import database_key, forecast_cache
+
+
+class SpendSummary:
+    """
+    Single-flight access to the current month's forecast. A computation is
+    shared by every request on the same event loop that asks for the same
+    database and day while it runs.
+    """
+
+    def __init__(self, cache=forecast_cache):
+        self.cache = cache
+        self._inflight = {}  # (event loop, database, day) -> future
+        self.computations = 0
+        self.coalesced = 0
+
+    async def get(self, db, today=None):
+        """
+        The month forecast for `today`, where `db` is a request session
+        exposing `run_sync`
+        """
+        today = today or date.today()
+        session = db.sync_session
+        forecast = self.cache.cached(session, today)
+        if forecast is not None:
+            return forecast
+
+        loop = asyncio.get_running_loop()
+        key = (loop, database_key(session), today)
+        while key in self._inflight:
+            future = self._inflight[key]
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The request computing it went away; compute it here instead
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        self.computations += 1
+        try:
+            forecast = await db.run_sync(self.cache.get, today)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        else:
+            future.set_result(forecast)
+        finally:
+            self._inflight.pop(key, None)
+        return forecast
+
+    def stats(self):
+        return {"computations": self.computations, "coalesced": self.coalesced}
+
+
+spend_summary = SpendSummary()
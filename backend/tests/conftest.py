@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+# Keep the app's default engine and the scheduler away from the development database
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db"))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from backend.database import Base, create_db_engine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+def cost_row(day, cost, service="EC2", provider="AWS", project="Alpha", environment="Production"):
+    return {
+        "service": service,
+        "provider": provider,
+        "cost": cost,
+        "date": day,
+        "project": project,
+        "environment": environment,
+    }
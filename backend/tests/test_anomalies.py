@@ -0,0 +1,100 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy.orm import sessionmaker
+from backend import models
+from backend.database import Base, create_db_engine
+from backend.ingest import insert_chunk
+from backend.tests.conftest import cost_row
+
+START = date(2026, 9, 1)
+
+
+def daily_chunks(spike_day=10, days=12):
+    """
+    One chunk per day: a flat 10/day with small wobble, and a spike on `spike_day`
+    """
+    return [
+        [cost_row(START + timedelta(days=offset), 500.0 if offset == spike_day else 10.0 + offset % 3)]
+        for offset in range(days)
+    ]
+
+
+def alerts(db):
+    return sorted((alert.date, alert.kind) for alert in db.query(models.CostAlert))
+
+
+def state(db):
+    series = db.query(models.AnomalyState).one()
+    return series.last_date, series.days, round(series.mean, 6), round(series.variance, 6)
+
+
+def test_account_threshold_applies_to_the_daily_total(db):
+    db.add(models.AlertThreshold(amount=100.0))
+    db.commit()
+    insert_chunk(db, [cost_row(START, 60.0), cost_row(START, 30.0, service="S3")])
+    assert alerts(db) == []
+
+    # Neither series breaches on its own, but the day's total does
+    insert_chunk(db, [cost_row(START, 20.0, service="RDS")])
+    assert alerts(db) == [(START, "daily_total")]
+    alert = db.query(models.CostAlert).one()
+    assert (alert.service, alert.project, alert.amount, alert.expected) == (None, None, 110.0, 100.0)
+
+    db.query(models.AlertThreshold).update({"series_daily_amount": 50.0})
+    db.commit()
+    insert_chunk(db, [cost_row(START, 1.0)])
+    assert alerts(db) == [(START, "daily_total"), (START, "threshold")]
+
+    # A correction back under the limit clears it
+    insert_chunk(db, [cost_row(START, -40.0)])
+    assert alerts(db) == []
+
+
+def test_posted_threshold_raises_an_alert():
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    today = date.today()
+    with TestClient(app) as client:
+        client.post("/alerts/", json={"amount": 100.0}).raise_for_status()
+        client.post("/costs/", json=cost_row(today.isoformat(), 250.0, project="Threshold")).raise_for_status()
+        active = client.get("/alerts/active").json()
+
+    assert {
+        "service": None, "project": None, "date": today.isoformat(), "kind": "daily_total", "expected": 100.0
+    }.items() <= next(alert for alert in active if alert["kind"] == "daily_total").items()
+
+
+@pytest.mark.parametrize("order", ["reversed", "spike_first", "late_day"])
+def test_alerts_do_not_depend_on_chunk_order(db, tmp_path, order):
+    for chunk in daily_chunks():
+        insert_chunk(db, chunk)
+    expected_alerts, expected_state = alerts(db), state(db)
+    assert (START + timedelta(days=10), "spike") in expected_alerts
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'reordered.db'}")
+    Base.metadata.create_all(bind=engine)
+    other = sessionmaker(bind=engine)()
+    chunks = daily_chunks()
+    if order == "reversed":
+        chunks.reverse()
+    elif order == "spike_first":
+        chunks.insert(0, chunks.pop(10))
+    else:
+        chunks.append(chunks.pop(4))
+    for chunk in chunks:
+        insert_chunk(other, chunk)
+
+    assert alerts(other) == expected_alerts
+    assert state(other) == expected_state
+    other.close()
+    engine.dispose()
+
+
+def test_late_correction_clears_a_past_alert(db):
+    for chunk in daily_chunks():
+        insert_chunk(db, chunk)
+    spike_day = START + timedelta(days=10)
+
+    insert_chunk(db, [cost_row(spike_day, -489.0)])
+    assert (spike_day, "spike") not in alerts(db)
@@ -0,0 +1,42 @@
+from datetime import date
+import pytest
+from backend import models
+from backend.columnar import import_parquet
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet  # noqa: E402
+
+
+def write_parquet(path, columns):
+    pa.parquet.write_table(pa.table(columns), path)
+    return path
+
+
+def test_import_fills_missing_project_and_environment(db, tmp_path):
+    path = write_parquet(tmp_path / "costs.parquet", {
+        "service": ["EC2", "S3"],
+        "provider": ["AWS", "AWS"],
+        "cost": [10.0, 2.5],
+        "date": [date(2026, 10, 1), date(2026, 10, 2)],
+    })
+
+    assert import_parquet(db, path) == (2, 2, [])
+    assert {(entry.project, entry.environment) for entry in db.query(models.CostEntry)} == {
+        ("Main Project", "Production")
+    }
+
+
+def test_import_rejects_a_bad_later_batch_without_writing(db, tmp_path):
+    path = write_parquet(tmp_path / "costs.parquet", {
+        "service": ["EC2", "EC2", "EC2"],
+        "provider": ["AWS", "AWS", "AWS"],
+        "cost": ["1.5", "2.5", "not a number"],
+        "date": [date(2026, 10, 1)] * 3,
+        "project": ["Alpha"] * 3,
+        "environment": ["Production"] * 3,
+    })
+
+    with pytest.raises(ValueError):
+        import_parquet(db, path, chunk_size=1)
+    assert db.query(models.CostEntry).count() == 0
+    assert db.query(models.CostRollup).count() == 0
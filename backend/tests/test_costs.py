@@ -0,0 +1,82 @@
+from datetime import date
+import pytest
+from fastapi import HTTPException
+from backend.ingest import insert_chunk
+from backend.routers.costs import cost_filters, decode_cursor, encode_cursor, list_costs
+from backend.tests.conftest import cost_row
+
+
+def walk_pages(db, filters, limit):
+    """
+    Follow the cursor the way a client does, returning the ids of each page
+    """
+    pages, cursor = [], None
+    while True:
+        page = list_costs(db, filters, cursor, limit=limit)
+        if not page:
+            return pages
+        pages.append([entry.id for entry in page])
+        if len(page) < limit:
+            return pages
+        cursor = decode_cursor(encode_cursor(page[-1].date, page[-1].id))
+
+
+def test_cursor_pages_cover_every_row_once(db):
+    # Several rows share a date, so pages must break ties on id
+    insert_chunk(db, [cost_row(date(2026, 10, day % 3 + 1), float(day)) for day in range(10)])
+
+    pages = walk_pages(db, cost_filters(), limit=3)
+    ids = [entry_id for page in pages for entry_id in page]
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert ids == [entry.id for entry in list_costs(db, cost_filters(), limit=100)]
+    assert len(set(ids)) == 10
+
+
+def test_cursor_is_stable_when_earlier_rows_are_added(db):
+    insert_chunk(db, [cost_row(date(2026, 10, day), 1.0) for day in range(10, 16)])
+    first = list_costs(db, cost_filters(), limit=3)
+    cursor = (first[-1].date, first[-1].id)
+
+    # An offset would shift by the new row and repeat one from the first page
+    insert_chunk(db, [cost_row(date(2026, 10, 1), 1.0)])
+    second = list_costs(db, cost_filters(), cursor, limit=3)
+
+    assert [entry.date.day for entry in second] == [13, 14, 15]
+
+
+def test_cursor_respects_filters(db):
+    insert_chunk(db, [
+        cost_row(date(2026, 10, day), 1.0, provider=provider)
+        for day in range(1, 6) for provider in ("AWS", "GCP")
+    ])
+
+    pages = walk_pages(db, cost_filters(provider="GCP"), limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+
+def test_invalid_cursor_is_a_bad_request():
+    with pytest.raises(HTTPException) as error:
+        decode_cursor("not-a-cursor")
+    assert error.value.status_code == 400
+
+
+def test_bulk_failure_after_a_committed_chunk_invalidates_caches(monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.cache import response_cache
+    from backend.main import app
+    from backend.routers import costs
+
+    def fail_after_first_chunk(db, rows):
+        monkeypatch.setattr(costs, "insert_chunk", lambda db, rows: 1 / 0)
+        return insert_chunk(db, rows)
+
+    monkeypatch.setattr(costs, "insert_chunk", fail_after_first_chunk)
+    rows = [cost_row(date(2026, 10, 1).isoformat(), 1.0)] * 2
+    generation = response_cache.generation
+    with TestClient(app, raise_server_exceptions=False) as client:
+        response = client.post("/costs/bulk?chunk_size=1", json=rows)
+
+    assert response.status_code == 500
+    assert response_cache.generation > generation
@@ -0,0 +1,93 @@
+from datetime import date, timedelta
+import pytest
+from backend import fetch_aws_costs as aws
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class StubCostExplorer:
+    """
+    Serves one result per day of the requested window, `page_size` days per
+    page, after failing the first `throttles` calls
+    """
+
+    def __init__(self, page_size=2, throttles=0, error="ThrottlingException"):
+        self.page_size = page_size
+        self.throttles = throttles
+        self.error = error
+        self.calls = []
+
+    def get_cost_and_usage(self, **request):
+        self.calls.append(request)
+        if self.throttles:
+            self.throttles -= 1
+            raise ClientError(self.error)
+
+        start = date.fromisoformat(request["TimePeriod"]["Start"])
+        end = date.fromisoformat(request["TimePeriod"]["End"])
+        days = [start + timedelta(days=i) for i in range((end - start).days)]
+        offset = int(request.get("NextPageToken", 0))
+        page = days[offset:offset + self.page_size]
+        response = {"ResultsByTime": [
+            {
+                "TimePeriod": {"Start": day.isoformat()},
+                "Groups": [{"Keys": ["EC2"], "Metrics": {"UnblendedCost": {"Amount": "1.5", "Unit": "USD"}}}],
+            }
+            for day in page
+        ]}
+        if offset + self.page_size < len(days):
+            response["NextPageToken"] = str(offset + self.page_size)
+        return response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(aws.time, "sleep", delays.append)
+    return delays
+
+
+def test_windows_follow_every_page(sleeps):
+    client = StubCostExplorer(page_size=2)
+    start = date.today() - timedelta(days=10)
+
+    rows = list(aws.fetch_aws_costs(client=client, start_date=start, chunk_days=4, max_workers=2))
+
+    assert sorted(row["date"] for row in rows) == [(start + timedelta(days=i)).isoformat() for i in range(10)]
+    # Windows of 4, 4 and 2 days at two days per page
+    assert len(client.calls) == 5
+    assert sum("NextPageToken" in call for call in client.calls) == 2
+    assert sleeps == []
+
+
+def test_throttled_calls_are_retried_with_backoff(sleeps):
+    client = StubCostExplorer(page_size=5, throttles=3)
+
+    rows = aws._fetch_window(client, date(2026, 10, 1), date(2026, 10, 3), max_retries=5)
+
+    assert [row["date"] for row in rows] == ["2026-10-01", "2026-10-02"]
+    assert len(client.calls) == 4
+    assert len(sleeps) == 3
+    assert sleeps[0] < sleeps[1] < sleeps[2]
+
+
+def test_retries_give_up_after_max_retries(sleeps):
+    client = StubCostExplorer(throttles=10)
+
+    with pytest.raises(ClientError):
+        aws._fetch_window(client, date(2026, 10, 1), date(2026, 10, 3), max_retries=2)
+    assert len(client.calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_other_errors_are_not_retried(sleeps):
+    client = StubCostExplorer(throttles=1, error="AccessDeniedException")
+
+    with pytest.raises(ClientError):
+        aws._fetch_window(client, date(2026, 10, 1), date(2026, 10, 3), max_retries=5)
+    assert len(client.calls) == 1
+    assert sleeps == []
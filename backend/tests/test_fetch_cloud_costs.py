@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+import pytest
+from backend import models
+from backend.fetch_cloud_costs import configured_fetchers, fetch_start_date, sync_costs
+
+
+def rows(start, end, cost=1.0, service="EC2"):
+    day = start
+    while day < end:
+        yield {"date": day.isoformat(), "service": service, "cost": cost}
+        day += timedelta(days=1)
+
+
+def watermark(db, provider):
+    state = db.query(models.SyncState).filter(models.SyncState.provider == provider).first()
+    return state.last_synced_date if state else None
+
+
+def test_watermark_advances_and_resumes(db):
+    today = date.today()
+    assert fetch_start_date(db, "AWS", 30, 3) == today - timedelta(days=30)
+
+    summary = sync_costs(db, {"AWS": lambda: rows(today - timedelta(days=30), today)})
+    assert summary["AWS"] == {"rows": 30, "written": 30, "error": None}
+    assert watermark(db, "AWS") == today
+
+    # The next run only re-fetches the restatement window
+    start = fetch_start_date(db, "AWS", 30, 3)
+    assert start == today - timedelta(days=3)
+    summary = sync_costs(db, {"AWS": lambda: rows(start, today, cost=2.0)})
+    assert summary["AWS"]["written"] == 3
+    assert db.query(models.CostEntry).count() == 30
+
+
+def test_failed_provider_keeps_its_watermark(db):
+    today = date.today()
+
+    def failing():
+        yield from rows(today - timedelta(days=2), today)
+        raise RuntimeError("throttled")
+
+    summary = sync_costs(db, {
+        "AWS": lambda: rows(today - timedelta(days=5), today),
+        "GCP": failing,
+    })
+    assert summary["GCP"]["error"] == "throttled"
+    assert watermark(db, "AWS") == today
+    assert watermark(db, "GCP") is None
+    assert fetch_start_date(db, "GCP", 30, 3) == today - timedelta(days=30)
+
+
+def test_misconfigured_providers_are_not_fetched(db, monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AZURE_SUBSCRIPTION_ID", "GCP_BILLING_EXPORT_TABLE",
+                 "GOOGLE_APPLICATION_CREDENTIALS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("GCP_BILLING_ACCOUNT_ID", "000000-000000-000000")
+
+    assert configured_fetchers(db, 30) == {}
+    assert sync_costs(db, {}) == {}
+    assert db.query(models.SyncState).count() == 0
+
+
+def test_gcp_fetch_raises_without_export_table(monkeypatch):
+    from backend.fetch_gcp_costs import fetch_gcp_costs
+
+    monkeypatch.setenv("GCP_BILLING_ACCOUNT_ID", "000000-000000-000000")
+    monkeypatch.delenv("GCP_BILLING_EXPORT_TABLE", raising=False)
+    with pytest.raises(RuntimeError, match="GCP_BILLING_EXPORT_TABLE"):
+        list(fetch_gcp_costs(client=object()))
@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from sqlalchemy.orm import sessionmaker
+from backend.database import Base, create_db_engine
+from backend.forecasting import MIN_SEASONAL_DAYS, MIN_TREND_DAYS, ForecastCache, fit_series, forecast_month
+from backend.ingest import insert_chunk
+from backend.tests.conftest import cost_row
+
+
+def test_cache_is_kept_per_database(db, tmp_path):
+    other_engine = create_db_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    Base.metadata.create_all(bind=other_engine)
+    other = sessionmaker(bind=other_engine)()
+    today = date.today()
+    insert_chunk(db, [cost_row(today, 10.0)])
+    insert_chunk(other, [cost_row(today, 99.0)])
+
+    cache = ForecastCache(ttl=60)
+    assert cache.get(db, today).total()[0] == 10.0
+    assert cache.get(other, today).total()[0] == 99.0
+    assert cache.cached(db, today) is not cache.cached(other, today)
+
+    cache.invalidate()
+    assert cache.cached(db, today) is None
+    assert cache.cached(other, today) is None
+    other.close()
+    other_engine.dispose()
+
+
+# A Monday, so weekday offsets are easy to read
+HISTORY_START = date(2026, 9, 7)
+WEEKLY = np.array([10.0, 10.0, 10.0, 10.0, 10.0, 2.0, 2.0])
+
+
+def weekday_history(days, trend=0.0):
+    offsets = np.arange(days)
+    return (WEEKLY[offsets % 7] + trend * offsets)[None, :]
+
+
+def future(history_days, days=20):
+    start = HISTORY_START + timedelta(days=history_days)
+    return [start + timedelta(days=offset) for offset in range(days)]
+
+
+@pytest.mark.parametrize("days", [1, 3, 5, 10])
+def test_short_history_projects_the_mean(days):
+    history = weekday_history(days)
+    predictions, sigma = fit_series(history, HISTORY_START, future(days))
+    assert np.allclose(predictions, history.mean())
+    assert sigma.shape == (1,)
+
+
+def test_short_history_does_not_extrapolate_a_slope():
+    # Ten days from a Monday end on a weekend dip; a fitted slope would head to zero
+    history = weekday_history(10)
+    predictions, _ = fit_series(history, HISTORY_START, future(10, 30))
+    assert predictions.sum() == pytest.approx(history.mean() * 30)
+    assert predictions.min() > 5
+
+
+def test_two_weeks_fit_weekday_effects_without_trend():
+    history = weekday_history(MIN_SEASONAL_DAYS)
+    dates = future(MIN_SEASONAL_DAYS, 14)
+    predictions, _ = fit_series(history, HISTORY_START, dates)
+    expected = [WEEKLY[day.weekday()] for day in dates]
+    assert np.allclose(predictions[0], expected)
+
+
+def test_long_history_fits_the_trend():
+    days = MIN_TREND_DAYS + 7
+    history = weekday_history(days, trend=0.5)
+    dates = future(days, 7)
+    predictions, _ = fit_series(history, HISTORY_START, dates)
+    expected = [WEEKLY[day.weekday()] + 0.5 * (day - HISTORY_START).days for day in dates]
+    assert np.allclose(predictions[0], expected)
+
+
+def test_month_forecast_for_a_new_series_uses_its_mean(db):
+    today = date(2026, 10, 5)
+    insert_chunk(db, [cost_row(today - timedelta(days=offset), 100.0 + offset) for offset in range(5)])
+
+    actual, projection, lower, upper = forecast_month(db, today).total()
+    assert actual == 510.0
+    assert projection == pytest.approx(510.0 + 102.0 * 26)
+    assert lower <= projection <= upper
+
+
+def test_month_forecast_fits_each_series_from_its_own_start(db):
+    today = date(2026, 10, 5)
+    insert_chunk(db, [cost_row(today - timedelta(days=offset), 50.0) for offset in range(56)])
+    insert_chunk(db, [cost_row(today - timedelta(days=offset), 100.0, service="RDS") for offset in range(5)])
+
+    by_service = forecast_month(db, today).by_service()
+    assert by_service["RDS"][1] == pytest.approx(100.0 * 31)
+    assert by_service["EC2"][1] == pytest.approx(50.0 * 31)
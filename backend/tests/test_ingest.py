@@ -0,0 +1,48 @@
+from datetime import date
+from sqlalchemy import func
+from backend import models
+from backend.ingest import insert_chunk, upsert_chunk
+from backend.tests.conftest import cost_row
+
+DAY = date(2026, 10, 1)
+
+
+def raw_total(db):
+    return db.query(func.sum(models.CostEntry.cost)).scalar()
+
+
+def rollup(db):
+    return db.query(models.CostRollup.cost, models.CostRollup.row_count).one()
+
+
+def test_upsert_replaces_multiple_line_items(db):
+    insert_chunk(db, [cost_row(DAY, 10.0), cost_row(DAY, 5.0)])
+
+    assert upsert_chunk(db, [cost_row(DAY, 15.0)]) == 0
+    assert db.query(models.CostEntry).count() == 2
+
+    assert upsert_chunk(db, [cost_row(DAY, 18.0)]) == 1
+    assert db.query(models.CostEntry).count() == 1
+    assert raw_total(db) == 18.0
+    assert rollup(db) == (18.0, 1)
+
+
+def test_upsert_sums_rows_within_a_chunk(db):
+    upsert_chunk(db, [cost_row(DAY, 4.0), cost_row(DAY, 6.0), cost_row(DAY, 1.0, service="S3")])
+    assert raw_total(db) == 11.0
+
+    upsert_chunk(db, [cost_row(DAY, 7.0), cost_row(DAY, 2.0)])
+    assert raw_total(db) == 10.0
+    rollups = dict(db.query(models.CostRollup.service, models.CostRollup.cost))
+    assert rollups == {"EC2": 9.0, "S3": 1.0}
+
+
+def test_upsert_keeps_other_keys(db):
+    insert_chunk(db, [cost_row(DAY, 3.0, project="Beta"), cost_row(DAY, 10.0), cost_row(DAY, 5.0)])
+    upsert_chunk(db, [cost_row(DAY, 20.0)])
+
+    by_project = dict(
+        db.query(models.CostEntry.project, func.sum(models.CostEntry.cost)).group_by(models.CostEntry.project)
+    )
+    assert by_project == {"Alpha": 20.0, "Beta": 3.0}
+    assert db.query(func.sum(models.CostRollup.cost)).scalar() == 23.0
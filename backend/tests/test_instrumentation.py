@@ -0,0 +1,23 @@
+from datetime import date
+from sqlalchemy import func
+from backend import models
+from backend.ingest import insert_chunk
+from backend.instrumentation import RequestStats, current_request, install_sql_events
+from backend.tests.conftest import cost_row
+
+
+def test_rows_are_counted_for_column_and_aggregate_queries(db):
+    install_sql_events()
+    insert_chunk(db, [cost_row(date(2026, 10, day), 1.0) for day in range(1, 6)])
+
+    stats = RequestStats({})
+    token = current_request.set(stats)
+    try:
+        assert len(db.query(models.CostEntry).all()) == 5
+        assert len(db.query(models.CostEntry.date, models.CostEntry.cost).all()) == 5
+        assert db.query(func.sum(models.CostEntry.cost)).scalar() == 5.0
+    finally:
+        current_request.reset(token)
+
+    assert stats.rows == 11
+    assert stats.queries == 3
@@ -0,0 +1,21 @@
+from sqlalchemy import event, text
+from backend.migrations import SQLITE_DATES_NORMALIZED_VERSION, init_db
+
+
+def test_sqlite_dates_are_normalized_once(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO cost_entries (service, provider, cost, date) "
+            "VALUES ('EC2', 'AWS', 1.0, '2026-10-01 00:00:00.000000')"
+        ))
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    init_db(engine)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT date FROM cost_entries")).scalar() == "2026-10-01"
+        assert connection.execute(text("PRAGMA user_version")).scalar() == SQLITE_DATES_NORMALIZED_VERSION
+
+    statements.clear()
+    init_db(engine)
+    assert not any(statement.startswith("UPDATE cost_entries") for statement in statements)
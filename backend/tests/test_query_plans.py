@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import text
+from backend import models
+from backend.benchmark import plan_checks, query_plans, seed_rows
+
+
+@pytest.fixture
+def seeded(db):
+    seed_rows(db, 5000, days=120)
+    db.add(models.Budget(amount=1000.0, project="Alpha"))
+    db.commit()
+    db.execute(text("ANALYZE"))
+    return db
+
+
+@pytest.mark.parametrize("name, fn", plan_checks(), ids=[name for name, _ in plan_checks()])
+def test_aggregates_use_the_covering_rollup_index(seeded, name, fn):
+    plans = query_plans(seeded, fn)
+
+    assert plans
+    for details in plans:
+        assert any("COVERING INDEX ix_cost_rollups_date_covering" in detail for detail in details), details
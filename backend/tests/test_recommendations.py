@@ -0,0 +1,46 @@
+from datetime import date, datetime, timedelta
+from backend import models
+from backend.generate_recommendations import RULE_RIGHTSIZE, create_recommendations_in_db
+from backend.ingest import insert_chunk
+from backend.scheduler import generate_recommendations_job, needs_full_recommendations
+from backend.tests.conftest import cost_row
+
+
+def record_run(db, created_at, full, status="succeeded"):
+    db.add(models.Job(
+        name="generate_recommendations", trigger="schedule", status=status,
+        result={"full": full}, created_at=created_at
+    ))
+    db.commit()
+
+
+def test_first_run_each_day_is_full(db):
+    now = datetime(2026, 10, 17, 9, 0)
+    assert needs_full_recommendations(db, now)
+
+    record_run(db, now - timedelta(days=1), full=True)
+    record_run(db, now - timedelta(hours=1), full=False)
+    record_run(db, now - timedelta(hours=2), full=True, status="failed")
+    assert needs_full_recommendations(db, now)
+
+    record_run(db, now - timedelta(hours=3), full=True)
+    assert not needs_full_recommendations(db, now)
+
+
+def test_scheduled_run_drops_recommendations_for_silent_services(db):
+    today = date.today()
+    insert_chunk(db, [cost_row(today - timedelta(days=offset), 20.0) for offset in range(10)])
+    create_recommendations_in_db(db, full=True)
+
+    # A service that stopped reporting more than 30 days ago, never marked dirty
+    db.add(models.Optimization(
+        rule=RULE_RIGHTSIZE, title="Right-size Old Instances", description="", estimated_savings=5.0,
+        service="Old", provider="AWS", status="pending"
+    ))
+    db.query(models.DirtyCostGroup).delete()
+    db.commit()
+
+    assert create_recommendations_in_db(db)["removed"] == 0
+    summary = generate_recommendations_job(db)
+    assert summary["full"]
+    assert db.query(models.Optimization).filter(models.Optimization.service == "Old").count() == 0
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+from sqlalchemy import func
+from backend import models
+from backend.ingest import insert_chunk
+from backend.partitions import compact_partitions
+from backend.rollup import rebuild_rollups
+from backend.tests.conftest import cost_row
+
+TODAY = date(2026, 10, 17)
+
+
+def daily_rows(start, end, cost=10.0):
+    days = (end - start).days
+    return [cost_row(start + timedelta(days=offset), cost) for offset in range(days)]
+
+
+def rollup_total(db, start=None):
+    query = db.query(func.sum(models.CostRollup.cost))
+    if start is not None:
+        query = query.filter(models.CostRollup.date >= start)
+    return query.scalar() or 0
+
+
+def test_incremental_rollup_matches_rebuild(db):
+    insert_chunk(db, daily_rows(date(2026, 9, 1), date(2026, 9, 11)))
+    insert_chunk(db, [cost_row(date(2026, 9, 5), 2.5, service="S3"), cost_row(date(2026, 9, 5), 4.0)])
+    incremental = sorted(
+        (row.date, row.service, row.cost, row.row_count) for row in db.query(models.CostRollup)
+    )
+
+    rebuild_rollups(db)
+    rebuilt = sorted((row.date, row.service, row.cost, row.row_count) for row in db.query(models.CostRollup))
+    assert incremental == rebuilt
+    assert rollup_total(db) == 106.5
+
+
+def test_refresh_does_not_drop_compacted_rollups(db):
+    insert_chunk(db, daily_rows(date(2026, 8, 1), date(2026, 10, 1)))
+    assert compact_partitions(db, retention_months=1, today=TODAY) == 1
+    assert db.query(func.min(models.CostEntry.date)).scalar() == date(2026, 9, 1)
+    total = rollup_total(db)
+
+    # A refresh window reaching back into the compacted month
+    rebuild_rollups(db, date(2026, 8, 20))
+    assert rollup_total(db) == total
+    assert rollup_total(db, date(2026, 8, 29)) == total - 28 * 10.0
+
+
+def test_rebuild_without_raw_rows_keeps_rollups(db):
+    insert_chunk(db, daily_rows(date(2026, 8, 1), date(2026, 8, 11)))
+    compact_partitions(db, retention_months=1, today=TODAY)
+    assert db.query(models.CostEntry).count() == 0
+
+    rebuild_rollups(db, date(2026, 8, 1))
+    assert rollup_total(db) == 100.0
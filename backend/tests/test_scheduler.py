@@ -0,0 +1,31 @@
+from sqlalchemy.orm import sessionmaker
+from backend import models
+from backend.cache import response_cache
+from backend.forecasting import forecast_cache
+from backend.scheduler import Scheduler
+
+
+def run_job(engine, run):
+    scheduler = Scheduler(sessionmaker(bind=engine))
+    scheduler.register("job", run, invalidates_cache=True)
+    with scheduler.session_factory() as db:
+        job = models.Job(name="job", trigger="manual", status="queued")
+        db.add(job)
+        db.commit()
+        job_id = job.id
+    scheduler._execute(job_id)
+    with scheduler.session_factory() as db:
+        return db.get(models.Job, job_id).status
+
+
+def test_failed_job_still_invalidates_caches(engine):
+    def partial_write(db):
+        # Like a fetch where one provider commits before another fails
+        db.add(models.CostEntry(service="EC2", provider="AWS", cost=1.0))
+        db.commit()
+        raise RuntimeError("GCP: quota exceeded")
+
+    generations = (response_cache.generation, forecast_cache.generation)
+    assert run_job(engine, partial_write) == "failed"
+    assert response_cache.generation == generations[0] + 1
+    assert forecast_cache.generation == generations[1] + 1
@@ -14,6 +14,8 @@ export interface CostEntry {
 export interface AlertThreshold {
   id: number;
   amount: number;
+  // Daily limit per (service, project) for ingest-time alerts
+  series_daily_amount?: number | null;
   updated_at: string;
 }
 
@@ -25,6 +27,50 @@ export async function fetchCosts(skip = 0, limit = 100): Promise<CostEntry[]> {
   return res.json();
 }
 
+export interface CostBreakdown {
+  group_by: string[];
+  granularity: 'day' | 'week' | 'month' | null;
+  rows: number;
+  // One array per field: period, each group_by dimension, cost and row_count
+  columns: Record<string, (string | number)[]>;
+}
+
+export interface CostBreakdownQuery {
+  groupBy?: string[];
+  granularity?: 'day' | 'week' | 'month';
+  provider?: string;
+  service?: string;
+  project?: string;
+  environment?: string;
+  startDate?: string;
+  endDate?: string;
+}
+
+export async function fetchCostBreakdown(query: CostBreakdownQuery = {}): Promise<CostBreakdown> {
+  const params = new URLSearchParams();
+  if (query.groupBy?.length) params.set('group_by', query.groupBy.join(','));
+  if (query.granularity) params.set('granularity', query.granularity);
+  if (query.provider) params.set('provider', query.provider);
+  if (query.service) params.set('service', query.service);
+  if (query.project) params.set('project', query.project);
+  if (query.environment) params.set('environment', query.environment);
+  if (query.startDate) params.set('start_date', query.startDate);
+  if (query.endDate) params.set('end_date', query.endDate);
+  const res = await fetch(`${API_URL}/costs/breakdown?${params}`);
+  if (!res.ok) {
+    throw new Error('Failed to fetch cost breakdown');
+  }
+  return res.json();
+}
+
+// Turn a columnar breakdown into one object per row
+export function breakdownRows(breakdown: CostBreakdown): Record<string, string | number>[] {
+  const names = Object.keys(breakdown.columns);
+  return Array.from({ length: breakdown.rows }, (_, index) =>
+    Object.fromEntries(names.map(name => [name, breakdown.columns[name][index]]))
+  );
+}
+
 export async function fetchAlertThreshold(): Promise<AlertThreshold> {
   const res = await fetch(`${API_URL}/alerts/`);
   if (!res.ok) {
@@ -48,17 +94,44 @@ export async function setAlertThreshold(amount: number): Promise<AlertThreshold>
   return res.json();
 }
 
-export interface Budget {
+export interface BudgetScope {
+  project?: string | null;
+  environment?: string | null;
+  provider?: string | null;
+  period?: string | null; // YYYY-MM; null applies to every month
+}
+
+export interface Budget extends BudgetScope {
   id: number;
   amount: number;
   created_at: string;
   updated_at: string;
 }
 
+export interface BudgetHistoryEntry {
+  month: string;
+  budget_id: number;
+  project: string | null;
+  environment: string | null;
+  provider: string | null;
+  budget: number;
+  actual: number;
+  remaining: number;
+  percentage_used: number;
+}
+
+export interface BudgetHistory {
+  start: string;
+  end: string;
+  entries: BudgetHistoryEntry[];
+}
+
 export interface ServiceProjection {
   service: string;
   daily_spend: number;
   monthly_projection: number;
+  lower_bound: number;
+  upper_bound: number;
   status: string;
 }
 
@@ -67,6 +140,8 @@ export interface BudgetResponse {
   current_spend: number;
   remaining: number;
   forecasted_spend: number;
+  forecast_lower_bound: number;
+  forecast_upper_bound: number;
   percentage_used: number;
   services: ServiceProjection[];
 }
@@ -79,13 +154,13 @@ export async function fetchBudget(): Promise<BudgetResponse> {
   return res.json();
 }
 
-export async function setBudget(amount: number): Promise<Budget> {
+export async function setBudget(amount: number, scope: BudgetScope = {}): Promise<Budget> {
   const res = await fetch(`${API_URL}/budget/`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ amount }),
+    body: JSON.stringify({ amount, ...scope }),
   });
   if (!res.ok) {
     throw new Error('Failed to set budget');
@@ -93,6 +168,20 @@ export async function setBudget(amount: number): Promise<Budget> {
   return res.json();
 }
 
+export async function fetchBudgetHistory(
+  query: { start?: string; end?: string; project?: string; environment?: string; provider?: string } = {}
+): Promise<BudgetHistory> {
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(query)) {
+    if (value) params.set(key, value);
+  }
+  const res = await fetch(`${API_URL}/budget/history?${params}`);
+  if (!res.ok) {
+    throw new Error('Failed to fetch budget history');
+  }
+  return res.json();
+}
+
 export interface Optimization {
   id: number;
   title: string;
@@ -142,7 +231,7 @@ export async function ignoreOptimization(id: number): Promise<Optimization> {
   return res.json();
 }
 
-export async function generateOptimizations(): Promise<{ message: string }> {
+export async function generateOptimizations(): Promise<{ message: string; job_id: number; status: string }> {
   const res = await fetch(`${API_URL}/optimization/generate`, {
     method: 'POST',
   });
@@ -153,3 +242,22 @@ export async function generateOptimizations(): Promise<{ message: string }> {
 }
 
 
+
+export type DashboardEvent =
+  | { type: 'costs'; data: { rows: number; current_month: { month: string; total: number; services: Record<string, number> } } }
+  | { type: 'budget'; data: { amount: number } & BudgetScope }
+  | { type: 'optimization'; data: { id: number; status: string; service: string; provider: string; estimated_savings: number } }
+  | { type: 'job'; data: { id: number; name: string; status: string; duration_ms: number | null; invalidates_cache: boolean } }
+  | { type: 'resync'; data: Record<string, never> };
+
+// Live updates pushed by the API; returns a function that closes the stream.
+// EventSource reconnects on its own and resumes from the last event it saw.
+export function subscribeToEvents(onEvent: (event: DashboardEvent) => void): () => void {
+  const source = new EventSource(`${API_URL}/events/`);
+  for (const type of ['costs', 'budget', 'optimization', 'job', 'resync'] as const) {
+    source.addEventListener(type, (message) => {
+      onEvent({ type, data: JSON.parse((message as MessageEvent).data) } as DashboardEvent);
+    });
+  }
+  return () => source.close();
+}
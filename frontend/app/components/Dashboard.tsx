@@ -2,8 +2,8 @@
 
 import { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
-import { fetchCosts, fetchAlertThreshold, setAlertThreshold, fetchBudget, CostEntry, AlertThreshold, BudgetResponse } from '../api';
-import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
+import { fetchCostBreakdown, breakdownRows, fetchAlertThreshold, setAlertThreshold, fetchBudget, fetchBudgetHistory, subscribeToEvents, CostBreakdown, AlertThreshold, BudgetResponse, BudgetHistory } from '../api';
+import { LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 import { Bell, DollarSign, TrendingUp, X } from 'lucide-react';
 import Sidebar from './Sidebar';
 import AdvancedDashboard from './AdvancedDashboard';
@@ -12,30 +12,50 @@ const COLORS = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6'];
 
 export default function DashboardWithSidebar() {
     const router = useRouter();
-    const [costs, setCosts] = useState<CostEntry[]>([]);
+    const [trendBreakdown, setTrendBreakdown] = useState<CostBreakdown | null>(null);
+    const [serviceBreakdown, setServiceBreakdown] = useState<CostBreakdown | null>(null);
+    const [providerBreakdown, setProviderBreakdown] = useState<CostBreakdown | null>(null);
     const [alertThreshold, setAlertThresholdState] = useState<AlertThreshold | null>(null);
     const [budgetData, setBudgetData] = useState<BudgetResponse | null>(null);
+    const [budgetHistory, setBudgetHistory] = useState<BudgetHistory | null>(null);
     const [newThreshold, setNewThreshold] = useState<string>('');
     const [totalCost, setTotalCost] = useState(0);
     const [loading, setLoading] = useState(true);
     const [timeframe, setTimeframe] = useState<'daily' | 'weekly' | 'monthly'>('daily');
     const [activeView, setActiveView] = useState('dashboard');
     const [showAlertModal, setShowAlertModal] = useState(false);
+    const [revision, setRevision] = useState(0);
+
+    // Refetch totals and charts when the API reports new costs or budgets,
+    // or a background job (e.g. a provider fetch) that changes them finishes.
+    // Bulk loads publish one event per chunk, so wait for a quiet second.
+    useEffect(() => {
+        let timer: ReturnType<typeof setTimeout> | undefined;
+        const unsubscribe = subscribeToEvents(event => {
+            const changesCosts = event.type === 'costs' || event.type === 'budget' || event.type === 'resync'
+                || (event.type === 'job' && event.data.invalidates_cache);
+            if (!changesCosts) return;
+            clearTimeout(timer);
+            timer = setTimeout(() => setRevision(r => r + 1), 1000);
+        });
+        return () => {
+            clearTimeout(timer);
+            unsubscribe();
+        };
+    }, []);
 
     useEffect(() => {
         async function loadData() {
             try {
-                const [costsData, alertData] = await Promise.all([fetchCosts(), fetchAlertThreshold()]);
-                setCosts(costsData);
+                const [totals, alertData] = await Promise.all([fetchCostBreakdown(), fetchAlertThreshold()]);
                 setAlertThresholdState(alertData);
-
-                const total = costsData.reduce((acc, curr) => acc + curr.cost, 0);
-                setTotalCost(total);
+                setTotalCost((totals.columns.cost?.[0] as number) || 0);
 
                 // Fetch budget data
                 try {
-                    const budget = await fetchBudget();
+                    const [budget, history] = await Promise.all([fetchBudget(), fetchBudgetHistory()]);
                     setBudgetData(budget);
+                    setBudgetHistory(history);
                 } catch (error) {
                     console.error('Failed to load budget:', error);
                 }
@@ -46,7 +66,22 @@ export default function DashboardWithSidebar() {
             }
         }
         loadData();
-    }, []);
+    }, [revision]);
+
+    // Chart data is aggregated by the API; refetch when the view or timeframe changes
+    useEffect(() => {
+        const provider = ({ aws: 'AWS', azure: 'Azure', gcp: 'GCP' } as Record<string, string>)[activeView];
+        const granularity = ({ daily: 'day', weekly: 'week', monthly: 'month' } as const)[timeframe];
+        Promise.all([
+            fetchCostBreakdown({ groupBy: ['provider'], granularity, provider }),
+            fetchCostBreakdown({ groupBy: ['service'], provider }),
+            fetchCostBreakdown({ groupBy: ['provider'], provider }),
+        ]).then(([trend, byService, byProvider]) => {
+            setTrendBreakdown(trend);
+            setServiceBreakdown(byService);
+            setProviderBreakdown(byProvider);
+        }).catch(error => console.error('Failed to load cost breakdown:', error));
+    }, [activeView, timeframe, revision]);
 
     const handleSetAlert = async () => {
         if (!newThreshold) return;
@@ -70,72 +105,26 @@ export default function DashboardWithSidebar() {
         }
     };
 
-    // Helper to get week number
-    const getWeek = (date: Date) => {
-        const d = new Date(Date.UTC(date.getFullYear(), date.getMonth(), date.getDate()));
-        const dayNum = d.getUTCDay() || 7;
-        d.setUTCDate(d.getUTCDate() + 4 - dayNum);
-        const yearStart = new Date(Date.UTC(d.getUTCFullYear(), 0, 1));
-        return Math.ceil((((d.getTime() - yearStart.getTime()) / 86400000) + 1) / 7);
-    };
+    const breakdownTotals = (breakdown: CostBreakdown | null, dimension: string) =>
+        breakdown ? breakdownRows(breakdown).map(row => ({ name: row[dimension] as string, value: row.cost as number })) : [];
 
-    // Filter costs by provider
-    const getFilteredCosts = () => {
-        if (activeView === 'aws') return costs.filter(c => c.provider === 'AWS');
-        if (activeView === 'azure') return costs.filter(c => c.provider === 'Azure');
-        if (activeView === 'gcp') return costs.filter(c => c.provider === 'GCP');
-        return costs;
-    };
-
-    const filteredCosts = getFilteredCosts();
-    const providers = Array.from(new Set(filteredCosts.map(c => c.provider)));
-
-    const aggregatedCosts = Object.values(filteredCosts.reduce((acc: any, curr) => {
-        const date = new Date(curr.date);
-        let key = curr.date;
-
-        if (timeframe === 'weekly') {
-            const week = getWeek(date);
-            key = `${date.getFullYear()}-W${week}`;
-        } else if (timeframe === 'monthly') {
-            key = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}`;
-        }
-
-        if (!acc[key]) {
-            acc[key] = { date: key };
-        }
-        if (!acc[key][curr.provider]) {
-            acc[key][curr.provider] = 0;
-        }
-        acc[key][curr.provider] += curr.cost;
+    // Pivot (period, provider) rows into one chart point per period
+    const trendRows = trendBreakdown ? breakdownRows(trendBreakdown) : [];
+    const providers = Array.from(new Set(trendRows.map(row => row.provider as string)));
+    const roundedCostsByDate = Object.values(trendRows.reduce((acc: any, row) => {
+        const period = row.period as string;
+        acc[period] = acc[period] || { date: period };
+        acc[period][row.provider as string] = row.cost;
         return acc;
-    }, {})).sort((a: any, b: any) => a.date.localeCompare(b.date));
+    }, {}));
 
-    const roundedCostsByDate = aggregatedCosts.map((item: any) => {
-        const newItem = { ...item };
-        providers.forEach(provider => {
-            if (newItem[provider]) {
-                newItem[provider] = parseFloat(newItem[provider].toFixed(2));
-            }
-        });
-        return newItem;
-    });
+    // Scoped budgets overlap the account-wide one, so chart only the latter
+    const budgetByMonth = (budgetHistory?.entries ?? [])
+        .filter(entry => !entry.project && !entry.environment && !entry.provider)
+        .map(entry => ({ month: entry.month, Budget: entry.budget, Actual: entry.actual }));
 
-    const costsByService = Object.values(filteredCosts.reduce((acc: any, curr) => {
-        if (!acc[curr.service]) {
-            acc[curr.service] = { name: curr.service, value: 0 };
-        }
-        acc[curr.service].value += curr.cost;
-        return acc;
-    }, {})).map((item: any) => ({ ...item, value: parseFloat(item.value.toFixed(2)) }));
-
-    const costsByProvider = Object.values(filteredCosts.reduce((acc: any, curr) => {
-        if (!acc[curr.provider]) {
-            acc[curr.provider] = { name: curr.provider, value: 0 };
-        }
-        acc[curr.provider].value += curr.cost;
-        return acc;
-    }, {})).map((item: any) => ({ ...item, value: parseFloat(item.value.toFixed(2)) }));
+    const costsByService = breakdownTotals(serviceBreakdown, 'service');
+    const costsByProvider = breakdownTotals(providerBreakdown, 'provider');
 
     if (loading) return <div className="flex h-screen items-center justify-center">Loading dashboard...</div>;
 
@@ -263,6 +252,29 @@ export default function DashboardWithSidebar() {
                                 </div>
                             </div>
 
+                            {/* Budget vs. Actual per Month */}
+                            {budgetByMonth.length > 0 && (
+                                <div className="bg-gray-800 p-6 rounded-xl shadow-sm border border-gray-700">
+                                    <h2 className="text-xl font-semibold mb-4 text-gray-100">Budget vs. Actual</h2>
+                                    <div className="h-[300px]">
+                                        <ResponsiveContainer width="100%" height="100%">
+                                            <BarChart data={budgetByMonth}>
+                                                <CartesianGrid strokeDasharray="3 3" stroke="#374151" />
+                                                <XAxis dataKey="month" stroke="#9CA3AF" />
+                                                <YAxis stroke="#9CA3AF" />
+                                                <Tooltip
+                                                    contentStyle={{ backgroundColor: '#1F2937', border: '1px solid #374151', borderRadius: '8px', color: '#F3F4F6' }}
+                                                    labelStyle={{ color: '#F3F4F6' }}
+                                                />
+                                                <Legend wrapperStyle={{ color: '#9CA3AF' }} />
+                                                <Bar dataKey="Budget" fill={COLORS[0]} />
+                                                <Bar dataKey="Actual" fill={COLORS[2]} />
+                                            </BarChart>
+                                        </ResponsiveContainer>
+                                    </div>
+                                </div>
+                            )}
+
                             {/* Pie Charts Side by Side */}
                             <div className="grid grid-cols-1 md:grid-cols-2 gap-8">
                                 <div className="bg-gray-800 p-6 rounded-xl shadow-sm border border-gray-700">